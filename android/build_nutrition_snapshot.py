@@ -0,0 +1,41 @@
+# build_nutrition_snapshot.py - Compile nutrition_data.json into a binary snapshot
+"""
+Compiles the nutrition dataset JSON into the versioned binary snapshot that the API
+mmaps at startup (columnar arrays, string table, prebuilt search indexes, pre-serialized
+records, range index and similarity tree).
+
+Usage:
+    python build_nutrition_snapshot.py [nutrition_data.json] [-o nutrition_data.snapshot]
+"""
+import argparse
+import json
+import logging
+import time
+
+from main import (build_nutrition_dataset, build_nutrition_store, file_sha256,
+                  load_nutrition_snapshot, nutrition_snapshot_path, write_nutrition_snapshot)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset", nargs="?", default="nutrition_data.json")
+    parser.add_argument("-o", "--output", help="Snapshot path (default: next to the dataset)")
+    args = parser.parse_args()
+
+    output = args.output or nutrition_snapshot_path(args.dataset)
+
+    started = time.perf_counter()
+    with open(args.dataset, 'r', encoding='utf-8') as f:
+        store = build_nutrition_store(json.load(f))
+    write_nutrition_snapshot(output, build_nutrition_dataset(store), file_sha256(args.dataset))
+    logging.info(f"💾 Wrote {output}: {len(store)} records in {time.perf_counter() - started:.2f} s")
+
+    # Verify the snapshot maps back cleanly before anyone deploys it
+    started = time.perf_counter()
+    if load_nutrition_snapshot(output, file_sha256(args.dataset)) is None:
+        raise SystemExit(f"❌ Snapshot {output} failed to load back")
+    logging.info(f"✅ Snapshot maps back in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
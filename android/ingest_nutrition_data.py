@@ -0,0 +1,97 @@
+# ingest_nutrition_data.py - Validate and load large nutrition datasets by streaming
+"""
+Streams a nutrition dataset (NDJSON, or a JSON array) record by record, validating the
+required fields and reporting rejected rows with their line numbers. The file is never
+read into memory whole, so regional datasets far larger than nutrition_data.json load
+without the memory spike of json.load.
+
+Usage:
+    python ingest_nutrition_data.py regional.ndjson                  # validate only
+    python ingest_nutrition_data.py regional.ndjson --snapshot       # also write regional.snapshot
+                                                                     # (the rows the server loads)
+    python ingest_nutrition_data.py regional.ndjson --url http://localhost:8000
+                                                                     # stream to a running API
+"""
+import argparse
+import logging
+import time
+
+import requests
+
+from main import (build_nutrition_dataset, file_sha256, ingest_nutrition_file,
+                  nutrition_snapshot_path, write_nutrition_snapshot)
+
+UPLOAD_CHUNK_BYTES = 1 << 16
+
+
+def print_rejects(report):
+    for reject in report["rejects"]:
+        print(f"line {reject['line']}: {reject['error']}")
+    unlisted = report["rejected"] - len(report["rejects"])
+    if unlisted > 0:
+        print(f"... and {unlisted} more rejected rows")
+
+
+def stream_to_server(path: str, url: str, dry_run: bool):
+    """POST the file to /nutrition/upload/stream in chunks (chunked transfer encoding)."""
+    def chunks():
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b''):
+                yield chunk
+
+    response = requests.post(
+        f"{url.rstrip('/')}/nutrition/upload/stream",
+        params={"dry_run": str(dry_run).lower()},
+        data=chunks(),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    body = response.json()
+    report = body.get("detail", body) if response.status_code >= 400 else body
+    if isinstance(report, dict) and "rejects" in report:
+        print_rejects(report)
+    if response.status_code >= 400:
+        raise SystemExit(f"❌ Upload failed ({response.status_code}): {report.get('message', report)}")
+    logging.info(f"✅ Server {body['status']}: {body['accepted']} accepted, {body['rejected']} rejected")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset")
+    parser.add_argument("--snapshot", nargs="?", const="", metavar="PATH",
+                        help="Write the binary snapshot the server would load (default: next to the dataset)")
+    parser.add_argument("--url", help="Stream the dataset to a running API instead of loading it locally")
+    parser.add_argument("--dry-run", action="store_true", help="With --url, only validate on the server")
+    parser.add_argument("--strict", action="store_true", help="Exit non-zero if any row is rejected")
+    args = parser.parse_args()
+
+    if args.url:
+        stream_to_server(args.dataset, args.url, args.dry_run)
+        return
+
+    started = time.perf_counter()
+    ingest = ingest_nutrition_file(args.dataset)
+    report = ingest.report()
+    print_rejects(report)
+    logging.info(f"📊 {report['accepted']} records accepted, {report['rejected']} rejected "
+                 f"in {time.perf_counter() - started:.2f} s")
+
+    if ingest.accepted == 0 or (args.strict and ingest.rejected):
+        raise SystemExit(1)
+
+    if args.snapshot is not None:
+        output = args.snapshot or nutrition_snapshot_path(args.dataset)
+        # The server trusts a snapshot whose checksum matches the source file and loads the file
+        # unvalidated, so the snapshot must hold exactly those rows, rejected ones included.
+        if ingest.rejected:
+            logging.warning(f"⚠️ Snapshot includes the {ingest.rejected} rejected rows, as the server would load them")
+            ingest = ingest_nutrition_file(args.dataset, validate=False)
+            if ingest.rejects:
+                raise SystemExit(f"❌ The server could not load this file: line {ingest.rejects[0]['line']}: "
+                                 f"{ingest.rejects[0]['error']}")
+        store = ingest.builder.build()
+        write_nutrition_snapshot(output, build_nutrition_dataset(store), file_sha256(args.dataset))
+        logging.info(f"💾 Wrote {output}: {len(store)} records")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,38 @@
 # fastapi_app.py - Corrected and Refined Version
 import os
 import json
+import sqlite3
 import logging
 import zipfile
 import requests
+import httpx
 import string
 import re
-from datetime import datetime
+import copy
+import codecs
+import asyncio
+import base64
+import heapq
+import itertools
+import mmap
+import hashlib
+import time
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
 from functools import lru_cache
-from concurrent.futures import ThreadPoolExecutor
-from typing import Optional, List, Dict, Any, Union
-import pandas as pd
-from fuzzywuzzy import fuzz, process
+from typing import Optional, List, Dict, Any, Union, Iterable
+import numpy as np
+import orjson
+from fuzzywuzzy import fuzz, utils as fuzz_utils
 
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from pydantic import BaseModel, Field, ValidationError
 from dotenv import load_dotenv
@@ -24,6 +41,9 @@ from dotenv import load_dotenv
 from langchain_chroma import Chroma
 from langchain_google_genai import GoogleGenerativeAIEmbeddings, GoogleGenerativeAI
 from langchain_core.callbacks.base import BaseCallbackHandler
+from langchain_core.caches import BaseCache
+from langchain_core.embeddings import Embeddings
+from langchain_core.outputs import Generation
 from langchain.prompts import PromptTemplate
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_community.chat_message_histories import ChatMessageHistory
@@ -33,16 +53,1867 @@ from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_core.prompt_values import StringPromptValue
 
 # --- Global Variables for Nutrition Dataset ---
-nutrition_data: List[Dict[str, Any]] = []
-nutrition_df: Optional[pd.DataFrame] = None
+# The current immutable store + index + tables, replaced as a whole by publish_nutrition_dataset
+nutrition_dataset: Optional["NutritionDataset"] = None
+
+NUTRITION_NUMERIC_COLUMNS = ['Calories (kcal)', 'Protein (g)', 'Carbs (g)', 'Sugar (g)',
+                             'Fat (g)', 'Fiber (g)', 'Sodium (mg)']
+
+# Diet flag rules, evaluated once per record when the store is built
+VEGAN_CATEGORIES = ['Breads & Roti', 'Rice & Grains', 'Legumes & Dal',
+                    'Vegetables', 'Fruits', 'Nuts & Seeds']
+NON_VEG_KEYWORDS = ['chicken', 'fish', 'mutton', 'beef', 'pork', 'egg']
+
+# --- Columnar Nutrition Store ---
+def _coerce_number(value: Any) -> float:
+    """Numeric coercion matching pd.to_numeric(errors='coerce'): anything unparseable becomes NaN."""
+    if value is None or isinstance(value, bool):
+        return float('nan')
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return float('nan')
+
+def _py_number(value: float) -> Optional[Union[int, float]]:
+    """float32 cell -> JSON-friendly Python number (None for NaN, int when whole, float32 noise trimmed)."""
+    if value != value:
+        return None
+    if value.is_integer():
+        return int(value)
+    return float(f"{value:.7g}")
+
+class NutritionStringTable:
+    """
+    Interned strings packed into one UTF-8 blob; code i spans blob[offsets[i]:offsets[i + 1]].
+    Strings appended after packing live in a small `extra` tuple until the next compaction.
+    """
+    def __init__(self, blob: bytes, offsets: np.ndarray, extra: tuple = ()):
+        self.blob = blob
+        self.offsets = offsets
+        self.extra = extra
+        self._packed = len(offsets) - 1
+
+    def __len__(self) -> int:
+        return self._packed + len(self.extra)
+
+    def __getitem__(self, code: int) -> Optional[str]:
+        if code < 0:
+            return None
+        if code >= self._packed:
+            return self.extra[code - self._packed]
+        return bytes(self.blob[self.offsets[code]:self.offsets[code + 1]]).decode('utf-8')
+
+    def tolist(self) -> List[str]:
+        """Every string in code order; an all-ASCII blob is decoded once and sliced."""
+        text = bytes(self.blob).decode('utf-8')
+        if len(text) != len(self.blob):
+            return [self[code] for code in range(len(self))]
+        bounds = self.offsets.tolist()
+        return [text[start:end] for start, end in zip(bounds, bounds[1:])] + list(self.extra)
+
+    def codes_containing(self, needles: List[str]) -> np.ndarray:
+        """
+        Sorted codes of the strings containing any of the lowercase ASCII needles, case-insensitively.
+        Scans the packed blob once per needle instead of decoding and lowercasing every string.
+        """
+        blob = bytes(self.blob).lower()
+        starts, ends = [], []
+        for needle in needles:
+            encoded = needle.encode('utf-8')
+            pos = blob.find(encoded)
+            while pos != -1:
+                starts.append(pos)
+                ends.append(pos + len(encoded) - 1)
+                pos = blob.find(encoded, pos + 1)
+        start_codes = np.searchsorted(self.offsets, starts, side='right') - 1
+        end_codes = np.searchsorted(self.offsets, ends, side='right') - 1
+        # A hit that runs across the boundary of two packed strings is no hit
+        codes = start_codes[start_codes == end_codes].tolist()
+        codes.extend(
+            self._packed + i for i, value in enumerate(self.extra)
+            if any(needle in value.lower() for needle in needles)
+        )
+        return np.unique(np.asarray(codes, dtype=np.int64))
+
+    def appended(self, strings: List[str]) -> "NutritionStringTable":
+        """A new table sharing this one's blob, with `strings` taking the next codes."""
+        return NutritionStringTable(self.blob, self.offsets, self.extra + tuple(strings))
+
+    @classmethod
+    def from_strings(cls, strings: List[str]) -> "NutritionStringTable":
+        encoded = [value.encode('utf-8') for value in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+        return cls(b''.join(encoded), offsets)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.blob) + self.offsets.nbytes + sum(len(value) for value in self.extra)
+
+class NutritionStore:
+    """
+    Compact columnar nutrition dataset: one float32 array per numeric column, one int32
+    string-table code array per text column (-1 for missing) and the derived diet flags.
+
+    Records are only materialized as dicts for the rows a response actually returns.
+    Rows are never removed in place: updates append rows and clear them in the `live`
+    mask, and len() counts live rows only.
+    """
+    def __init__(self, columns: List[str], numeric: Dict[str, np.ndarray], text: Dict[str, np.ndarray],
+                 strings: NutritionStringTable, is_vegan: np.ndarray, is_vegetarian: np.ndarray,
+                 live: Optional[np.ndarray] = None):
+        self.columns = columns
+        self.numeric = numeric
+        self.text = text
+        self.strings = strings
+        self.is_vegan = is_vegan
+        self.is_vegetarian = is_vegetarian
+        self.size = len(is_vegan)
+        self.live = live if live is not None else np.ones(self.size, dtype=bool)
+        self.live_count = int(self.live.sum())
+
+    def __len__(self) -> int:
+        return self.live_count
+
+    def numeric_column(self, col: str) -> np.ndarray:
+        """float32 values of a numeric column; all-NaN if the dataset lacks it."""
+        values = self.numeric.get(col)
+        return values if values is not None else np.full(self.size, np.nan, dtype=np.float32)
+
+    def text_codes(self, col: str) -> np.ndarray:
+        codes = self.text.get(col)
+        return codes if codes is not None else np.full(self.size, -1, dtype=np.int32)
+
+    def text_column(self, col: str) -> List[Optional[str]]:
+        """Decoded values of a text column, decoding each distinct string once."""
+        codes = self.text_codes(col)
+        decoded = {int(code): self.strings[int(code)] for code in np.unique(codes)}
+        return [decoded[code] for code in codes.tolist()]
+
+    def value_counts(self, col: str) -> Dict[Optional[str], int]:
+        """Live-row count per distinct value of a text column (None for missing)."""
+        codes, counts = np.unique(self.text_codes(col)[self.live], return_counts=True)
+        # Strings appended by updates aren't interned against the packed table, so aggregate by value
+        value_counts: Dict[Optional[str], int] = {}
+        for code, count in zip(codes, counts):
+            value = self.strings[int(code)]
+            value_counts[value] = value_counts.get(value, 0) + int(count)
+        return value_counts
+
+    def appended(self, records: List[Dict[str, Any]], dead_rows: List[int]) -> "NutritionStore":
+        """
+        Copy-on-write update: a new store with `records` appended and `dead_rows` hidden.
+        This store is left untouched for readers still holding it. Fixed-width columns are
+        extended with one memcpy each; all per-record work is proportional to the change.
+        """
+        delta = build_nutrition_store(records)
+        string_base = len(self.strings)
+        columns = self.columns + [col for col in delta.columns if col not in self.columns]
+
+        numeric, text = {}, {}
+        for col in columns:
+            if col in self.numeric or col in delta.numeric:
+                numeric[col] = np.concatenate([self.numeric_column(col), delta.numeric_column(col)])
+            else:
+                delta_codes = delta.text_codes(col)
+                shifted = np.where(delta_codes >= 0, delta_codes + string_base, -1).astype(np.int32)
+                text[col] = np.concatenate([self.text_codes(col), shifted])
+
+        live = np.concatenate([self.live, delta.live])
+        live[list(dead_rows)] = False
+        return NutritionStore(
+            columns=columns,
+            numeric=numeric,
+            text=text,
+            strings=self.strings.appended([delta.strings[code] for code in range(len(delta.strings))]),
+            is_vegan=np.concatenate([self.is_vegan, delta.is_vegan]),
+            is_vegetarian=np.concatenate([self.is_vegetarian, delta.is_vegetarian]),
+            live=live,
+        )
+
+    def compacted(self) -> "NutritionStore":
+        """A fresh store holding only the live rows, with the string table re-packed and re-interned."""
+        rows = np.flatnonzero(self.live)
+        gathered = {col: codes[rows] for col, codes in self.text.items()}
+        used = np.unique(np.concatenate([codes for codes in gathered.values()] + [np.empty(0, dtype=np.int32)]))
+        used = used[used >= 0]
+
+        interned: Dict[str, int] = {}
+        remap = np.full(max(len(self.strings), 1), -1, dtype=np.int32)
+        remap[used] = [interned.setdefault(self.strings[int(code)], len(interned)) for code in used]
+        return NutritionStore(
+            columns=list(self.columns),
+            numeric={col: values[rows] for col, values in self.numeric.items()},
+            text={col: np.where(codes >= 0, remap[codes], -1).astype(np.int32) for col, codes in gathered.items()},
+            strings=NutritionStringTable.from_strings(list(interned)),
+            is_vegan=self.is_vegan[rows],
+            is_vegetarian=self.is_vegetarian[rows],
+        )
+
+    def records(self, rows: List[int]) -> List[Dict[str, Any]]:
+        """Materialize the given rows as dicts in dataset column order, plus the diet flags."""
+        if len(rows) == 0:
+            return []
+        rows = np.asarray(rows, dtype=np.int64)
+        gathered = {}
+        for col in self.columns:
+            if col in self.numeric:
+                gathered[col] = [_py_number(value) for value in self.numeric[col][rows].astype(float).tolist()]
+            else:
+                gathered[col] = [self.strings[code] for code in self.text[col][rows].tolist()]
+        # The diet flags stay internal: records have the dataset's own fields only
+        return [{col: gathered[col][i] for col in self.columns} for i in range(len(rows))]
+
+    @property
+    def nbytes(self) -> int:
+        arrays = list(self.numeric.values()) + list(self.text.values()) + [self.is_vegan, self.is_vegetarian]
+        return sum(values.nbytes for values in arrays) + self.strings.nbytes
+
+class NutritionStoreBuilder:
+    """
+    Appends raw nutrition records one at a time into growable typed buffers, so a dataset
+    never has to exist as a DataFrame or a second list of dicts before it is compacted.
+    """
+    def __init__(self):
+        self.columns: List[str] = []
+        self._numeric: Dict[str, array] = {}
+        self._text: Dict[str, array] = {}
+        self._interned: Dict[str, int] = {}
+        self._vegan = array('b')
+        self._vegetarian = array('b')
+        self._vegan_categories = [category.lower() for category in VEGAN_CATEGORIES]
+        self.size = 0
+
+    def _intern(self, value: Any) -> int:
+        if value is None:
+            return -1
+        value = value if isinstance(value, str) else str(value)
+        code = self._interned.get(value)
+        if code is None:
+            code = self._interned[value] = len(self._interned)
+        return code
+
+    def _add_column(self, col: str):
+        # Columns first seen mid-stream are backfilled as missing for earlier rows
+        self.columns.append(col)
+        if col in NUTRITION_NUMERIC_COLUMNS:
+            self._numeric[col] = array('f', [float('nan')]) * self.size
+        else:
+            self._text[col] = array('i', [-1]) * self.size
+
+    def append(self, record: Dict[str, Any]):
+        for col in record:
+            if col not in self._numeric and col not in self._text:
+                self._add_column(col)
+        for col, values in self._numeric.items():
+            values.append(_coerce_number(record.get(col)))
+        for col, codes in self._text.items():
+            codes.append(self._intern(record.get(col)))
+
+        # Diet flags: vegan by category, vegetarian unless the name mentions meat, fish or egg
+        category, name = record.get('Category'), record.get('Dish Name')
+        category_lower = category.lower() if isinstance(category, str) else ""
+        name_lower = name.lower() if isinstance(name, str) else ""
+        self._vegan.append(any(vegan in category_lower for vegan in self._vegan_categories))
+        self._vegetarian.append(not any(keyword in name_lower for keyword in NON_VEG_KEYWORDS))
+        self.size += 1
+
+    def extend(self, records: List[Dict[str, Any]]) -> "NutritionStoreBuilder":
+        for record in records:
+            self.append(record)
+        return self
+
+    def build(self) -> NutritionStore:
+        return NutritionStore(
+            columns=list(self.columns),
+            numeric={col: np.frombuffer(values, dtype=np.float32).copy() for col, values in self._numeric.items()},
+            text={col: np.frombuffer(codes, dtype=np.int32).copy() for col, codes in self._text.items()},
+            strings=NutritionStringTable.from_strings(list(self._interned)),
+            is_vegan=np.frombuffer(self._vegan, dtype=np.int8).astype(bool),
+            is_vegetarian=np.frombuffer(self._vegetarian, dtype=np.int8).astype(bool),
+        )
+
+def build_nutrition_store(records: List[Dict[str, Any]]) -> NutritionStore:
+    """Compact a list of raw nutrition records into a NutritionStore."""
+    return NutritionStoreBuilder().extend(records).build()
+
+# --- Nutrition Search Index ---
+_TOKEN_RE = re.compile(r"\w+")
+
+# Fuzzy fallback: only the rows sharing the most character trigrams with the query are scored
+FUZZY_SCORE_THRESHOLD = 85
+FUZZY_CANDIDATE_POOL = 64
+
+def _fuzzy_process(text: str) -> str:
+    """Same normalization fuzz.token_set_ratio applies internally (ASCII, lowercase, alphanumerics)."""
+    return fuzz_utils.full_process(text, force_ascii=True)
+
+def _trigrams(processed_text: str) -> set:
+    """Character trigrams of each word, padded so short words and word boundaries still count."""
+    grams = set()
+    for word in processed_text.split():
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+_EMPTY_ROWS = np.empty(0, dtype=np.int32)
+
+class PostingsMap:
+    """
+    Immutable key -> row positions map in CSR form: key i owns rows[offsets[i]:offsets[i + 1]]
+    (sorted, distinct). Flat arrays let a prebuilt map be written to and mmapped from a snapshot.
+    Rows added by later updates sit in a small `extra` overlay until the next compaction.
+    """
+    def __init__(self, keys: List[str], offsets: np.ndarray, rows: np.ndarray,
+                 extra: Optional[Dict[str, np.ndarray]] = None, ids: Optional[Dict[str, int]] = None):
+        self.keys = keys
+        self.offsets = offsets
+        self.rows = rows
+        self.extra = extra or {}
+        self._ids = ids if ids is not None else dict(zip(keys, range(len(keys))))
+
+    @classmethod
+    def from_dict(cls, postings: Dict[str, List[int]]) -> "PostingsMap":
+        keys = list(postings)
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[key]) for key in keys])
+        rows = np.fromiter(itertools.chain.from_iterable(postings[key] for key in keys),
+                           dtype=np.int32, count=int(offsets[-1]))
+        return cls(keys, offsets, rows)
+
+    def __len__(self) -> int:
+        return len(self.keys) + sum(1 for key in self.extra if key not in self._ids)
+
+    def get(self, key: str) -> np.ndarray:
+        i = self._ids.get(key)
+        rows = _EMPTY_ROWS if i is None else self.rows[self.offsets[i]:self.offsets[i + 1]]
+        added = self.extra.get(key)
+        if added is None:
+            return rows
+        # Appended rows are always higher than existing ones, so this stays sorted
+        return np.concatenate([rows, added]) if rows.size else added
+
+    def union(self, predicate) -> np.ndarray:
+        """Sorted distinct rows of every key satisfying the predicate."""
+        parts = [
+            self.rows[self.offsets[i]:self.offsets[i + 1]]
+            for i, key in enumerate(self.keys) if predicate(key)
+        ]
+        parts.extend(rows for key, rows in self.extra.items() if predicate(key))
+        if not parts:
+            return _EMPTY_ROWS
+        return np.unique(np.concatenate(parts))
+
+    def with_additions(self, additions: Dict[str, List[int]]) -> "PostingsMap":
+        """A new map sharing this one's arrays, with rows appended under (new or existing) keys."""
+        extra = dict(self.extra)
+        for key, rows in additions.items():
+            added = np.asarray(rows, dtype=np.int32)
+            extra[key] = np.concatenate([extra[key], added]) if key in extra else added
+        return PostingsMap(self.keys, self.offsets, self.rows, extra, self._ids)
+
+def _key_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+class HashedPostingsMap:
+    """
+    PostingsMap for about one key per row (normalized dish names): keys are kept only as 64-bit
+    hashes in a sorted uint64 array, so no key string or dict entry is held per row. Two keys can
+    share a hash; callers verify the rows they get back. Appended rows sit in an `extra` overlay.
+    """
+    def __init__(self, hashes: np.ndarray, offsets: np.ndarray, rows: np.ndarray,
+                 extra: Optional[Dict[str, np.ndarray]] = None):
+        self.hashes = hashes
+        self.offsets = offsets
+        self.rows = rows
+        self.extra = extra or {}
+
+    @classmethod
+    def from_dict(cls, postings: Dict[str, List[int]]) -> "HashedPostingsMap":
+        merged: Dict[int, List[int]] = {}
+        for key, rows in postings.items():
+            merged.setdefault(_key_hash(key), []).extend(rows)
+        ordered = sorted(merged)
+        offsets = np.zeros(len(ordered) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(merged[key_hash]) for key_hash in ordered])
+        rows = np.fromiter(itertools.chain.from_iterable(sorted(merged[key_hash]) for key_hash in ordered),
+                           dtype=np.int32, count=int(offsets[-1]))
+        return cls(np.array(ordered, dtype=np.uint64), offsets, rows)
+
+    def __len__(self) -> int:
+        return len(self.hashes) + sum(1 for key in self.extra if not self._packed_rows(key).size)
+
+    def _packed_rows(self, key: str) -> np.ndarray:
+        key_hash = np.uint64(_key_hash(key))
+        i = int(np.searchsorted(self.hashes, key_hash))
+        if i < len(self.hashes) and self.hashes[i] == key_hash:
+            return self.rows[self.offsets[i]:self.offsets[i + 1]]
+        return _EMPTY_ROWS
+
+    def get(self, key: str) -> np.ndarray:
+        rows = self._packed_rows(key)
+        added = self.extra.get(key)
+        if added is None:
+            return rows
+        # Appended rows are always higher than existing ones, so this stays sorted
+        return np.concatenate([rows, added]) if rows.size else added
+
+    def with_additions(self, additions: Dict[str, List[int]]) -> "HashedPostingsMap":
+        """A new map sharing this one's arrays, with rows appended under (new or existing) keys."""
+        extra = dict(self.extra)
+        for key, rows in additions.items():
+            added = np.asarray(rows, dtype=np.int32)
+            extra[key] = np.concatenate([extra[key], added]) if key in extra else added
+        return HashedPostingsMap(self.hashes, self.offsets, self.rows, extra)
+
+class NutritionSearchIndex:
+    """
+    Lookup structures over the 'Dish Name' column, built once per dataset load.
+
+    Holds a normalized-name postings map for exact hits, an inverted token index
+    for "contains" matches and a character-trigram index over the searchable
+    text ("<dish name> <category>", lowercased) for the fuzzy fallback, so no
+    path has to rescan the whole dataset. Names are not copied into the index:
+    the few rows a query verifies or scores are read back from the store's
+    string table. Rows without a dish name have name_lengths == -1 and never
+    match; rows cleared in `live` are filtered out.
+    """
+    def __init__(self, strings: NutritionStringTable, name_codes: np.ndarray, category_codes: np.ndarray,
+                 name_lengths: np.ndarray, exact: HashedPostingsMap, tokens: PostingsMap, trigrams: PostingsMap,
+                 live: Optional[np.ndarray] = None):
+        self.strings = strings
+        self.name_codes = name_codes
+        self.category_codes = category_codes
+        self.name_lengths = name_lengths
+        self.exact = exact
+        self.tokens = tokens
+        self.trigrams = trigrams
+        self.live = live if live is not None else np.ones(len(name_lengths), dtype=bool)
+
+    @classmethod
+    def build(cls, store: NutritionStore) -> "NutritionSearchIndex":
+        name_lengths, exact, tokens, trigrams = cls._tokenize(store, range(store.size))
+        return cls(
+            strings=store.strings,
+            name_codes=store.text_codes('Dish Name'),
+            category_codes=store.text_codes('Category'),
+            name_lengths=np.array(name_lengths, dtype=np.int32),
+            exact=HashedPostingsMap.from_dict(exact),
+            tokens=PostingsMap.from_dict(tokens),
+            trigrams=PostingsMap.from_dict(trigrams),
+            live=store.live,
+        )
+
+    def appended(self, store: NutritionStore, new_rows: List[int]) -> "NutritionSearchIndex":
+        """A new index over `store`, which appended `new_rows` to this index's store; only those are tokenized."""
+        name_lengths, exact, tokens, trigrams = self._tokenize(store, new_rows)
+        return NutritionSearchIndex(
+            strings=store.strings,
+            name_codes=store.text_codes('Dish Name'),
+            category_codes=store.text_codes('Category'),
+            name_lengths=np.concatenate([self.name_lengths, np.array(name_lengths, dtype=np.int32)]),
+            exact=self.exact.with_additions(exact),
+            tokens=self.tokens.with_additions(tokens),
+            trigrams=self.trigrams.with_additions(trigrams),
+            live=store.live,
+        )
+
+    @staticmethod
+    def _tokenize(store: NutritionStore, rows: Iterable[int]) -> tuple:
+        name_lengths: List[int] = []
+        exact: Dict[str, List[int]] = {}
+        tokens: Dict[str, List[int]] = {}
+        trigrams: Dict[str, List[int]] = {}
+
+        strings = store.strings
+        name_codes = store.text_codes('Dish Name').tolist()
+        category_codes = store.text_codes('Category').tolist()
+        for row in rows:
+            name, category = strings[name_codes[row]], strings[category_codes[row]]
+            for gram in _trigrams(_fuzzy_process(f"{name or ''} {category or ''}")):
+                trigrams.setdefault(gram, []).append(row)
+            if name is None:
+                name_lengths.append(-1)
+                continue
+            name_lower = name.lower()
+            name_lengths.append(len(name))
+            # Keyed like nutrition_dish_key, so deltas and lookups agree on padded names
+            exact.setdefault(name_lower.strip(), []).append(row)
+            for token in dict.fromkeys(_TOKEN_RE.findall(name_lower)):
+                tokens.setdefault(token, []).append(row)
+
+        return name_lengths, exact, tokens, trigrams
+
+    def name_lower(self, row: int) -> str:
+        return (self.strings[int(self.name_codes[row])] or "").lower()
+
+    def fuzzy_text(self, row: int) -> str:
+        """The row's searchable text, normalized the way the fuzzy scorer compares it."""
+        name, category = self.strings[int(self.name_codes[row])], self.strings[int(self.category_codes[row])]
+        return _fuzzy_process(f"{name or ''} {category or ''}")
+
+    def exact_rows(self, query_lower: str) -> List[int]:
+        """Row positions whose stripped, lowercased dish name equals the query, in dataset order."""
+        rows = self.exact.get(query_lower)
+        return [row for row in rows[self.live[rows]].tolist() if self.name_lower(row).strip() == query_lower]
+
+    def token_rows(self, query_tokens: List[str]) -> List[int]:
+        """Row positions whose dish name has every one of `query_tokens` as a whole token, in dataset order."""
+        if not query_tokens:
+            return []
+        rows = self.tokens.get(query_tokens[0])
+        for token in query_tokens[1:]:
+            if rows.size == 0:
+                break
+            rows = np.intersect1d(rows, self.tokens.get(token), assume_unique=True)
+        return rows[self.live[rows]].tolist()
+
+    def contains_rows(self, query_lower: str) -> List[int]:
+        """
+        Row positions whose lowercased dish name contains the query, shortest name first.
+
+        A substring match implies the query's inner tokens are whole name tokens, its
+        first token is a suffix and its last token a prefix of a name token, so the
+        token index yields a candidate superset that is then verified directly.
+        """
+        query_tokens = _TOKEN_RE.findall(query_lower)
+
+        if not query_tokens:
+            candidates = np.flatnonzero(self.name_lengths >= 0)
+        elif len(query_tokens) == 1:
+            only = query_tokens[0]
+            candidates = self.tokens.union(lambda token: only in token)
+        else:
+            first, last = query_tokens[0], query_tokens[-1]
+            candidates = self.tokens.union(lambda token: token.endswith(first))
+            for inner in query_tokens[1:-1]:
+                if candidates.size == 0:
+                    break
+                candidates = np.intersect1d(candidates, self.tokens.get(inner), assume_unique=True)
+            if candidates.size:
+                candidates = np.intersect1d(candidates, self.tokens.union(lambda token: token.startswith(last)),
+                                            assume_unique=True)
+
+        candidates = candidates[self.live[candidates]]
+        matches = [row for row in candidates.tolist() if query_lower in self.name_lower(row)]
+        # Prefer shorter, more exact matches; ties keep dataset order
+        lengths = self.name_lengths
+        matches.sort(key=lambda row: (lengths[row], row))
+        return matches
+
+    def fuzzy_scores(self, query: str, pool: int = FUZZY_CANDIDATE_POOL) -> List[tuple]:
+        """
+        (row, score) pairs for the rows sharing the most trigrams with the query,
+        scored with fuzz.token_set_ratio and ordered best first.
+        """
+        processed_query = _fuzzy_process(query)
+        if not processed_query:
+            return []
+
+        postings = [self.trigrams.get(gram) for gram in _trigrams(processed_query)]
+        postings = [rows for rows in postings if rows.size]
+        if not postings:
+            return []
+
+        matched = np.concatenate(postings)
+        matched = matched[self.live[matched]]
+        if not matched.size:
+            return []
+
+        rows, overlap = np.unique(matched, return_counts=True)
+        candidates = rows[np.lexsort((rows, -overlap))[:pool]].tolist()
+        scored = [
+            (row, fuzz.token_set_ratio(processed_query, self.fuzzy_text(row),
+                                       force_ascii=False, full_process=False))
+            for row in candidates
+        ]
+        scored.sort(key=lambda pair: (-pair[1], pair[0]))
+        return scored
+
+    def fuzzy_rows(self, query: str, limit: int, threshold: int = FUZZY_SCORE_THRESHOLD) -> List[int]:
+        """Row positions of the best fuzzy matches scoring above the threshold."""
+        return [row for row, score in self.fuzzy_scores(query)[:limit] if score > threshold]
+
+    def best_fuzzy_rows(self, queries: List[str], threshold: int = FUZZY_SCORE_THRESHOLD,
+                        pool: int = FUZZY_CANDIDATE_POOL) -> List[Optional[int]]:
+        """
+        The best fuzzy match (or None) per query, like fuzzy_rows(query, limit=1) for each.
+        Candidate selection runs once for all queries: every distinct trigram's postings are read
+        once and the per-query overlap counts come from a single np.unique over (query, row) pairs.
+        Each query is then scored against its own candidate pool only.
+        """
+        processed = [_fuzzy_process(query) for query in queries]
+        postings: Dict[str, np.ndarray] = {}
+        query_ids, matched = [], []
+        for query_id, processed_query in enumerate(processed):
+            for gram in _trigrams(processed_query):
+                rows = postings.get(gram)
+                if rows is None:
+                    rows = self.trigrams.get(gram)
+                    rows = postings[gram] = rows[self.live[rows]]
+                if rows.size:
+                    matched.append(rows)
+                    query_ids.append(np.full(rows.size, query_id, dtype=np.int64))
+
+        best: List[Optional[int]] = [None] * len(queries)
+        if not matched:
+            return best
+
+        size = len(self.name_lengths)
+        pairs, overlap = np.unique(np.concatenate(query_ids) * size + np.concatenate(matched), return_counts=True)
+        pair_queries, pair_rows = pairs // size, pairs % size
+        # Per query: most shared trigrams first, ties in row order
+        order = np.lexsort((pair_rows, -overlap, pair_queries))
+        pair_queries, pair_rows = pair_queries[order], pair_rows[order]
+        bounds = np.searchsorted(pair_queries, np.arange(len(queries) + 1))
+
+        for query_id, processed_query in enumerate(processed):
+            candidates = pair_rows[bounds[query_id]:min(bounds[query_id + 1], bounds[query_id] + pool)].tolist()
+            scored = [
+                (row, fuzz.token_set_ratio(processed_query, self.fuzzy_text(row),
+                                           force_ascii=False, full_process=False))
+                for row in candidates
+            ]
+            if scored:
+                row, score = min(scored, key=lambda pair: (-pair[1], pair[0]))
+                if score > threshold:
+                    best[query_id] = row
+        return best
+
+# --- Regional Suggestion Tables ---
+REGIONAL_SUGGESTION_LIMIT = 10
+# Regions extract_regional_preference can produce; tables for these are built up front
+KNOWN_REGION_QUERIES = ["Bengali", "South Indian", "North Indian", "West Indian", "East Indian"]
+
+def _sort_key(values: np.ndarray, ascending: bool) -> np.ndarray:
+    """Numeric sort key that keeps NaN last in either direction, like pandas sort_values."""
+    return np.where(np.isnan(values), np.inf, values if ascending else -values)
+
+class RegionalSuggestionTables:
+    """
+    Ranked row-position arrays for get_regional_nutrition_suggestions, built once per dataset load.
+
+    Rows are pre-sorted for every goal and pre-filtered for every dietary type, and the
+    per-(region, dietary_type, goal) tables are sliced from those, so a call needs no
+    frame copy, keyword scan or sort. Rows appended by later updates are kept in a short
+    side list and merged into the (live-filtered) ranked prefix at query time.
+    `ranked` and `tables` can be passed in when they were read back from a snapshot.
+    """
+    def __init__(self, store: NutritionStore, ranked: Optional[Dict[tuple, np.ndarray]] = None,
+                 tables: Optional[Dict[tuple, np.ndarray]] = None):
+        self.store = store
+        self.live = store.live
+        self.extra_rows: List[int] = []
+        self._extra_regions: List[str] = []
+        self._base_size = store.size
+        self._base_has_dead_rows = False
+
+        self.ranked = ranked if ranked is not None else self._rank(store)
+
+        # Region codes index the store's string table; match on each distinct value once
+        self._region_codes = store.text_codes('Region')
+        self._region_values = {
+            int(code): store.strings[int(code)].lower() for code in np.unique(self._region_codes) if code >= 0
+        }
+
+        if tables is not None:
+            self.tables = tables
+            return
+        self.tables: Dict[tuple, np.ndarray] = {}
+        region_queries = set(self._region_values.values())
+        region_queries.update(r.lower() for r in KNOWN_REGION_QUERIES)
+        for region_lower in region_queries:
+            mask = self._region_mask(region_lower)
+            if mask is None:
+                continue
+            for key, ranked in self.ranked.items():
+                self.tables[(region_lower, *key)] = ranked[mask[ranked]]
+
+    @staticmethod
+    def _rank(store: NutritionStore) -> Dict[tuple, np.ndarray]:
+        calories = store.numeric_column('Calories (kcal)')
+        protein = store.numeric_column('Protein (g)')
+        fiber = store.numeric_column('Fiber (g)')
+        goal_orders = {
+            # Weight loss: low-calorie, high-fiber first
+            "weight loss": np.lexsort((_sort_key(fiber, False), _sort_key(calories, True))),
+            # Weight gain: high-calorie, high-protein first
+            "weight gain": np.lexsort((_sort_key(protein, False), _sort_key(calories, False))),
+            # General diet: balanced, high-fiber first
+            "diet": np.argsort(_sort_key(fiber, False), kind='stable'),
+        }
+        diet_masks = {
+            "vegan": store.is_vegan,
+            "vegetarian": store.is_vegetarian,
+            "any": None,
+        }
+        return {
+            (diet, goal): order if mask is None else order[mask[order]]
+            for diet, mask in diet_masks.items()
+            for goal, order in goal_orders.items()
+        }
+
+    def _region_mask(self, region_lower: str) -> Optional[np.ndarray]:
+        """Rows whose region contains the query (case-insensitive), or None if no region matches."""
+        codes = [code for code, value in self._region_values.items() if region_lower in value]
+        if not codes:
+            return None
+        mask = np.isin(self._region_codes, codes)
+        return mask if mask.any() else None
+
+    def ranked_rows(self, region: str, dietary_type: str, goal: str, limit: int = REGIONAL_SUGGESTION_LIMIT) -> List[int]:
+        diet_key = dietary_type if dietary_type in ("vegan", "vegetarian") else "any"
+        goal_key = goal if goal in ("weight loss", "weight gain") else "diet"
+        ranked = self.ranked[(diet_key, goal_key)]
+
+        # A region that matches nothing falls back to the whole dataset
+        if region and region != "Indian":
+            region_lower = region.lower()
+            table = self.tables.get((region_lower, diet_key, goal_key))
+            if table is None:
+                mask = self._region_mask(region_lower)
+                if mask is not None:
+                    table = ranked[mask[ranked]]
+            region_extra = [(row, value) for row, value in self._live_extras() if region_lower in value]
+            if self._region_matches_base(region_lower, table is not None) or region_extra:
+                return self._merge(
+                    table if table is not None else _EMPTY_ROWS,
+                    self._diet_filter(region_extra, diet_key), goal_key, limit
+                )
+
+        return self._merge(ranked, self._diet_filter(self._live_extras(), diet_key), goal_key, limit)
+
+    def appended(self, store: NutritionStore, new_rows: List[int]) -> "RegionalSuggestionTables":
+        """New tables for a store with `new_rows` appended; the ranked arrays are shared, not rebuilt."""
+        tables = copy.copy(self)
+        tables.store = store
+        tables.live = store.live
+        tables._base_has_dead_rows = not store.live[:self._base_size].all()
+        region_codes = store.text_codes('Region')
+        tables.extra_rows = self.extra_rows + list(new_rows)
+        tables._extra_regions = self._extra_regions + [
+            (store.strings[int(region_codes[row])] or '').lower() for row in new_rows
+        ]
+        return tables
+
+    def _region_matches_base(self, region_lower: str, table_found: bool) -> bool:
+        """Whether any live base row matches the region; only rescans once updates removed base rows."""
+        if not table_found or not self._base_has_dead_rows:
+            return table_found
+        mask = self._region_mask(region_lower)
+        return bool((mask & self.live[:self._base_size]).any())
+
+    def _live_extras(self) -> List[tuple]:
+        """(row, lowercased region) of the appended rows still live."""
+        return [(row, region) for row, region in zip(self.extra_rows, self._extra_regions) if self.live[row]]
+
+    def _diet_filter(self, extras: List[tuple], diet_key: str) -> List[int]:
+        flags = {"vegan": self.store.is_vegan, "vegetarian": self.store.is_vegetarian}.get(diet_key)
+        return [row for row, _ in extras if flags is None or flags[row]]
+
+    def _live_prefix(self, ranked: np.ndarray, limit: int) -> np.ndarray:
+        """First `limit` live rows of a ranked array, widening the scanned prefix only as needed."""
+        span = max(limit, 1)
+        while True:
+            prefix = ranked[:span]
+            prefix = prefix[self.live[prefix]]
+            if len(prefix) >= limit or span >= len(ranked):
+                return prefix[:limit]
+            span *= 2
+
+    def _merge(self, ranked: np.ndarray, extra_rows: List[int], goal_key: str, limit: int) -> List[int]:
+        rows = self._live_prefix(ranked, limit).tolist()
+        if not extra_rows:
+            return rows
+        return sorted(rows + extra_rows, key=self._goal_key(goal_key))[:limit]
+
+    def _goal_key(self, goal_key: str):
+        """Python sort key matching the lexsort order of the ranked arrays (NaN last, ties by row)."""
+        calories = self.store.numeric_column('Calories (kcal)')
+        protein = self.store.numeric_column('Protein (g)')
+        fiber = self.store.numeric_column('Fiber (g)')
+
+        def value(column: np.ndarray, row: int, ascending: bool) -> float:
+            v = float(column[row])
+            if v != v:
+                return float('inf')
+            return v if ascending else -v
+
+        if goal_key == "weight loss":
+            return lambda row: (value(calories, row, True), value(fiber, row, False), row)
+        if goal_key == "weight gain":
+            return lambda row: (value(calories, row, False), value(protein, row, False), row)
+        return lambda row: (value(fiber, row, False), row)
+
+# --- Nutrient Similarity Index ---
+SIMILARITY_LEAF_SIZE = 32
+# Filtered candidate sets up to this size are scanned directly rather than through the tree
+SIMILARITY_SCAN_THRESHOLD = 2048
+SIMILAR_DISHES_LIMIT = 5
+MAX_SIMILAR_DISHES = 50
+
+class NutrientKDTree:
+    """
+    Static KD-tree over row vectors, split on the widest dimension at the median. Points are stored
+    reordered so every leaf is a contiguous slice scanned in one vectorized step, and a row mask
+    filters candidates during the search. Ties are broken by row, like a sorted scan.
+    """
+    def __init__(self, points: np.ndarray, rows: np.ndarray, leaf_size: int = SIMILARITY_LEAF_SIZE):
+        self.leaf_size = leaf_size
+        self._dims: List[int] = []
+        self._splits: List[float] = []
+        self._children: List[tuple] = []
+        self._spans: List[tuple] = []
+        order = np.arange(len(rows))
+        self._root = self._build(points, order, 0, len(order)) if len(order) else -1
+        self.points = points[order]
+        self.rows = rows[order]
+
+    @classmethod
+    def from_arrays(cls, points: np.ndarray, rows: np.ndarray, dims: np.ndarray, splits: np.ndarray,
+                    children: np.ndarray, spans: np.ndarray, leaf_size: int = SIMILARITY_LEAF_SIZE) -> "NutrientKDTree":
+        """A tree from the arrays of arrays(), e.g. read back from a snapshot; nothing is re-split."""
+        tree = cls.__new__(cls)
+        tree.leaf_size = leaf_size
+        tree._dims = dims.tolist()
+        tree._splits = splits.tolist()
+        tree._children = [tuple(pair) for pair in children.tolist()]
+        tree._spans = [tuple(pair) for pair in spans.tolist()]
+        tree._root = 0 if tree._dims else -1
+        tree.points = points
+        tree.rows = rows
+        return tree
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """The node layout as flat arrays (the root is node 0)."""
+        return {
+            "dims": np.array(self._dims, dtype=np.int32),
+            "splits": np.array(self._splits, dtype=np.float64),
+            "children": np.array(self._children, dtype=np.int32).reshape(-1, 2),
+            "spans": np.array(self._spans, dtype=np.int64).reshape(-1, 2),
+        }
+
+    def _build(self, points: np.ndarray, order: np.ndarray, start: int, end: int) -> int:
+        node = len(self._dims)
+        self._dims.append(-1)
+        self._splits.append(0.0)
+        self._children.append((-1, -1))
+        self._spans.append((start, end))
+        if end - start <= self.leaf_size:
+            return node
+
+        subset = points[order[start:end]]
+        spread = subset.max(axis=0) - subset.min(axis=0)
+        dim = int(np.argmax(spread))
+        if spread[dim] == 0:
+            return node
+        mid = (end - start) // 2
+        order[start:end] = order[start:end][np.argpartition(subset[:, dim], mid)]
+
+        self._dims[node] = dim
+        self._splits[node] = float(points[order[start + mid], dim])
+        left = self._build(points, order, start, start + mid)
+        right = self._build(points, order, start + mid, end)
+        self._children[node] = (left, right)
+        return node
+
+    def query(self, point: np.ndarray, k: int, mask: np.ndarray) -> List[tuple]:
+        """Up to k (squared distance, row) pairs nearest to point among rows where mask is True."""
+        if self._root < 0 or k <= 0:
+            return []
+        heap: List[tuple] = []  # (-distance, -row): heap[0] is the current worst neighbour
+        stack = [(self._root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if len(heap) == k and bound > -heap[0][0]:
+                continue
+
+            dim = self._dims[node]
+            if dim < 0:
+                start, end = self._spans[node]
+                keep = mask[self.rows[start:end]]
+                if not keep.any():
+                    continue
+                distances = ((self.points[start:end][keep] - point) ** 2).sum(axis=1)
+                for distance, row in zip(distances.tolist(), self.rows[start:end][keep].tolist()):
+                    item = (-distance, -row)
+                    if len(heap) < k:
+                        heapq.heappush(heap, item)
+                    elif item > heap[0]:
+                        heapq.heapreplace(heap, item)
+                continue
+
+            diff = float(point[dim]) - self._splits[node]
+            left, right = self._children[node]
+            near, far = (left, right) if diff < 0 else (right, left)
+            stack.append((far, max(bound, diff * diff)))
+            stack.append((near, bound))
+
+        return sorted((-distance, -row) for distance, row in heap)
+
+def _nearest_by_scan(vectors: np.ndarray, rows: np.ndarray, point: np.ndarray, k: int) -> List[tuple]:
+    distances = ((vectors[rows] - point) ** 2).sum(axis=1)
+    order = np.lexsort((rows, distances))[:k]
+    return list(zip(distances[order].tolist(), rows[order].tolist()))
+
+class NutritionSimilarityIndex:
+    """
+    Nearest neighbours over per-serving nutrient vectors (NUTRITION_NUMERIC_COLUMNS), z-scored so
+    every nutrient weighs the same; missing values sit at the mean. Base rows live in a KD-tree,
+    rows appended by updates are scanned directly until the next compaction rebuilds the tree.
+    """
+    def __init__(self, vectors: np.ndarray, mean: np.ndarray, scale: np.ndarray, tree: NutrientKDTree, tree_size: int):
+        self.vectors = vectors
+        self.mean = mean
+        self.scale = scale
+        self.tree = tree
+        self.tree_size = tree_size
+
+    @staticmethod
+    def _raw_matrix(store: NutritionStore, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        columns = [store.numeric_column(col) for col in NUTRITION_NUMERIC_COLUMNS]
+        if rows is not None:
+            columns = [values[rows] for values in columns]
+        return np.stack(columns, axis=1).astype(np.float64)
+
+    @classmethod
+    def build(cls, store: NutritionStore) -> "NutritionSimilarityIndex":
+        raw = cls._raw_matrix(store)
+        live = raw[store.live]
+        present = ~np.isnan(live)
+        counts = np.maximum(present.sum(axis=0), 1)
+        mean = np.where(present, live, 0.0).sum(axis=0) / counts
+        deviation = np.where(present, live - mean, 0.0)
+        scale = np.sqrt((deviation ** 2).sum(axis=0) / counts)
+        scale[scale == 0] = 1.0
+
+        vectors = np.nan_to_num((raw - mean) / scale).astype(np.float32)
+        tree = NutrientKDTree(vectors, np.arange(store.size))
+        return cls(vectors, mean, scale, tree, store.size)
+
+    def appended(self, store: NutritionStore, new_rows: List[int]) -> "NutritionSimilarityIndex":
+        """New index covering appended rows, normalized with the base statistics; the tree is shared."""
+        added = (self._raw_matrix(store, np.asarray(new_rows, dtype=np.int64)) - self.mean) / self.scale
+        vectors = np.concatenate([self.vectors, np.nan_to_num(added).astype(np.float32)])
+        return NutritionSimilarityIndex(vectors, self.mean, self.scale, self.tree, self.tree_size)
+
+    def nearest(self, row: int, k: int, mask: np.ndarray) -> List[tuple]:
+        """Up to k (distance, row) pairs nearest to `row` among rows where mask is True, closest first."""
+        point = self.vectors[row]
+        candidates = np.flatnonzero(mask)
+        if len(candidates) <= SIMILARITY_SCAN_THRESHOLD:
+            found = _nearest_by_scan(self.vectors, candidates, point, k)
+        else:
+            found = self.tree.query(point, k, mask[:self.tree_size])
+            extra = candidates[candidates >= self.tree_size]
+            if len(extra):
+                found = sorted(found + _nearest_by_scan(self.vectors, extra, point, k))[:k]
+        return [(float(np.sqrt(distance)), row) for distance, row in found]
+
+# --- Nutrient Range Index ---
+# Short names accepted by range queries, next to the column names themselves
+NUTRITION_QUERY_FIELDS = {
+    "calories": 'Calories (kcal)',
+    "protein": 'Protein (g)',
+    "carbs": 'Carbs (g)',
+    "sugar": 'Sugar (g)',
+    "fat": 'Fat (g)',
+    "fiber": 'Fiber (g)',
+    "sodium": 'Sodium (mg)',
+}
+NUTRITION_QUERY_LIMIT = 20
+MAX_NUTRITION_QUERY_LIMIT = 200
+NUTRITION_QUERY_WALK_CHUNK = 256
+
+def nutrition_query_column(field: str) -> Optional[str]:
+    """Numeric column for a query field, given as a short name ('protein') or the column name."""
+    if field in NUTRITION_NUMERIC_COLUMNS:
+        return field
+    return NUTRITION_QUERY_FIELDS.get(field.strip().lower())
+
+class NutritionRangeIndex:
+    """
+    Sorted column indexes for range queries. Per numeric column it keeps the rows that have a value,
+    ordered by (value, row), next to their sorted values, so a [min, max] predicate is two binary
+    searches giving one contiguous run of rows. Category and Region get the same treatment by string
+    code, so a text filter is a few runs too. The strict diet masks are kept alongside.
+
+    Rows appended by updates are not in the sorted runs; queries check them directly until compaction
+    rebuilds the index. Dead rows are dropped through the store's live mask.
+    """
+    TEXT_COLUMNS = ('Category', 'Region')
+
+    def __init__(self, orders: Dict[str, np.ndarray], sorted_values: Dict[str, np.ndarray],
+                 missing: Dict[str, np.ndarray], distinct: Dict[str, np.ndarray],
+                 diet: Dict[str, np.ndarray], base_size: int):
+        self.orders = orders  # numeric and text columns alike
+        self.sorted_values = sorted_values
+        self.missing = missing
+        self.distinct = distinct
+        self.diet = diet
+        self.base_size = base_size
+
+    @classmethod
+    def build(cls, store: NutritionStore) -> "NutritionRangeIndex":
+        orders, sorted_values, missing = {}, {}, {}
+        for col in NUTRITION_NUMERIC_COLUMNS:
+            values = store.numeric_column(col)
+            order = np.argsort(values, kind='stable').astype(np.int32)  # NaN last, each run in row order
+            present = int((~np.isnan(values)).sum())
+            orders[col] = order[:present]
+            sorted_values[col] = values[order[:present]]
+            missing[col] = order[present:]
+
+        distinct = {}
+        for col in cls.TEXT_COLUMNS:
+            codes = store.text_codes(col)
+            orders[col] = np.argsort(codes, kind='stable').astype(np.int32)
+            sorted_values[col] = codes[orders[col]]
+            distinct[col] = np.unique(sorted_values[col])
+        diet = {diet_key: _diet_mask(store, diet_key) for diet_key in ("vegan", "vegetarian")}
+        return cls(orders, sorted_values, missing, distinct, diet, store.size)
+
+    def appended(self, store: NutritionStore, new_rows: List[int]) -> "NutritionRangeIndex":
+        """New index covering appended rows; the sorted runs are shared with this one."""
+        rows = np.asarray(new_rows, dtype=np.int64)
+        distinct = {
+            col: np.union1d(codes, store.text_codes(col)[rows]) for col, codes in self.distinct.items()
+        }
+        diet = {
+            diet_key: np.concatenate([mask, _diet_mask(store, diet_key, rows)]) for diet_key, mask in self.diet.items()
+        }
+        return NutritionRangeIndex(self.orders, self.sorted_values, self.missing, distinct, diet, self.base_size)
+
+    def run(self, col: str, low: Optional[float] = None, high: Optional[float] = None) -> np.ndarray:
+        """Base rows with low <= value <= high (either bound optional), ordered by (value, row)."""
+        values = self.sorted_values[col]
+        start = 0 if low is None else int(np.searchsorted(values, low, side='left'))
+        end = len(values) if high is None else int(np.searchsorted(values, high, side='right'))
+        return self.orders[col][start:max(start, end)]
+
+    def code_rows(self, col: str, codes: List[int]) -> np.ndarray:
+        """Base rows whose text column holds one of the string codes."""
+        return np.concatenate([self.run(col, code, code) for code in codes] + [np.empty(0, dtype=np.int32)])
+
+    def matching_codes(self, store: NutritionStore, col: str, predicate) -> List[int]:
+        """String-table codes of the column's distinct values that satisfy the predicate."""
+        return [int(code) for code in self.distinct[col] if code >= 0 and predicate(store.strings[int(code)])]
+
+    def diet_mask(self, dietary_type: str) -> Optional[np.ndarray]:
+        """Strict vegan/vegetarian mask over all rows (see _diet_mask); None when the diet allows everything."""
+        return self.diet.get(dietary_type)
+
+# --- Nutrition Facets ---
+NUTRITION_FACET_COLUMNS = ('Category', 'Region')
+
+class NutritionFacets:
+    """
+    Live-row counts per Category and Region value, and each value's live rows in dataset order, so
+    category listings and browse pages never rescan the store. Rows are grouped by lowercased value,
+    as category filters match case-insensitively. Updates patch only the values they touch.
+    """
+    def __init__(self, counts: Dict[str, Dict[str, int]], rows: Dict[str, Dict[str, np.ndarray]]):
+        self.counts = counts
+        self.rows = rows
+
+    @classmethod
+    def build(cls, store: NutritionStore) -> "NutritionFacets":
+        counts, rows = {}, {}
+        live_rows = np.flatnonzero(store.live).astype(np.int32)
+        for col in NUTRITION_FACET_COLUMNS:
+            counts[col], rows[col] = {}, {}
+            codes = store.text_codes(col)[live_rows]
+            order = np.argsort(codes, kind='stable')
+            groups = np.split(live_rows[order], np.flatnonzero(np.diff(codes[order])) + 1)
+            for group in groups:
+                value = store.strings[int(store.text_codes(col)[group[0]])] if len(group) else None
+                if value is None:
+                    continue
+                counts[col][value] = counts[col].get(value, 0) + len(group)
+                key = value.lower()
+                # Strings appended by updates aren't interned, so one value can span several codes
+                rows[col][key] = np.sort(np.concatenate([rows[col][key], group])) if key in rows[col] else group
+        return cls(counts, rows)
+
+    def appended(self, store: NutritionStore, new_rows: List[int], dead_rows: List[int]) -> "NutritionFacets":
+        """New facets after `dead_rows` died and `new_rows` were appended; untouched values are shared."""
+        counts, rows = {}, {}
+        for col in NUTRITION_FACET_COLUMNS:
+            codes = store.text_codes(col)
+            counts[col], rows[col] = dict(self.counts[col]), dict(self.rows[col])
+            touched = set()
+            for row in dead_rows:
+                value = store.strings[int(codes[row])]
+                if value is not None:
+                    counts[col][value] -= 1
+                    if not counts[col][value]:
+                        del counts[col][value]
+                    touched.add(value.lower())
+
+            added: Dict[str, List[int]] = {}
+            for row in new_rows:
+                value = store.strings[int(codes[row])]
+                if value is not None:
+                    counts[col][value] = counts[col].get(value, 0) + 1
+                    added.setdefault(value.lower(), []).append(row)
+                    touched.add(value.lower())
+
+            for key in touched:
+                kept = rows[col].get(key, np.empty(0, dtype=np.int32))
+                merged = np.concatenate([kept[store.live[kept]], np.asarray(added.get(key, []), dtype=np.int32)])
+                if len(merged):
+                    rows[col][key] = merged
+                else:
+                    rows[col].pop(key, None)
+        return NutritionFacets(counts, rows)
+
+    def value_rows(self, col: str, value: str) -> np.ndarray:
+        """Live rows whose `col` equals value (case-insensitive), in dataset order."""
+        return self.rows[col].get(value.lower(), np.empty(0, dtype=np.int32))
+
+    def matching_rows(self, col: str, predicate) -> np.ndarray:
+        """Live rows whose lowercased `col` value satisfies the predicate, in dataset order."""
+        groups = [rows for key, rows in self.rows[col].items() if predicate(key)]
+        if len(groups) == 1:
+            return groups[0]
+        return np.unique(np.concatenate(groups + [np.empty(0, dtype=np.int32)]))
+
+# --- Pre-serialized Records ---
+class NutritionRecordJSON:
+    """
+    Every row's record serialized once with orjson, packed into one blob; row i spans
+    blob[offsets[i]:offsets[i + 1]]. List responses join these byte slices instead of re-encoding
+    dicts per request. Rows appended by updates live in an `extra` tuple until the next compaction.
+    """
+    BATCH_ROWS = 4096
+
+    def __init__(self, blob: bytes, offsets: np.ndarray, extra: tuple = ()):
+        self.blob = blob
+        self.offsets = offsets
+        self.extra = extra
+        self._packed = len(offsets) - 1
+
+    @classmethod
+    def build(cls, store: NutritionStore) -> "NutritionRecordJSON":
+        encoded = []
+        for start in range(0, store.size, cls.BATCH_ROWS):
+            rows = list(range(start, min(start + cls.BATCH_ROWS, store.size)))
+            encoded.extend(orjson.dumps(record) for record in store.records(rows))
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(b''.join(encoded), offsets)
+
+    def appended(self, store: NutritionStore, new_rows: List[int]) -> "NutritionRecordJSON":
+        """A new instance sharing this one's blob, with the appended rows' records encoded."""
+        extra = tuple(orjson.dumps(record) for record in store.records(new_rows))
+        return NutritionRecordJSON(self.blob, self.offsets, self.extra + extra)
+
+    def __getitem__(self, row: int) -> bytes:
+        if row >= self._packed:
+            return self.extra[row - self._packed]
+        return self.blob[int(self.offsets[row]):int(self.offsets[row + 1])]
+
+    def array(self, rows: List[int]) -> bytes:
+        """JSON array of the rows' records."""
+        # Gather all slice bounds in one pass; appended rows are clamped here and read from `extra`
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[np.minimum(rows, self._packed)].tolist()
+        ends = self.offsets[np.minimum(rows + 1, self._packed)].tolist()
+        blob, extra, packed = self.blob, self.extra, self._packed
+        return b'[' + b','.join([
+            blob[start:end] if row < packed else extra[row - packed]
+            for row, start, end in zip(rows.tolist(), starts, ends)
+        ]) + b']'
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.blob) + self.offsets.nbytes + sum(len(value) for value in self.extra)
+
+class SerializedRows:
+    """Placeholder in a NutritionJSONResponse payload for the records of `rows`, as a JSON array."""
+    def __init__(self, dataset: "NutritionDataset", rows: List[int]):
+        self.dataset = dataset
+        self.rows = rows
+
+def encode_nutrition_payload(payload: Any) -> bytes:
+    """orjson encoding that splices SerializedRows in from the pre-serialized records."""
+    if isinstance(payload, SerializedRows):
+        return payload.dataset.record_json.array(payload.rows)
+    if isinstance(payload, dict):
+        return b'{' + b','.join(
+            [orjson.dumps(str(key)) + b':' + encode_nutrition_payload(value) for key, value in payload.items()]
+        ) + b'}'
+    if isinstance(payload, (list, tuple)):
+        return b'[' + b','.join([encode_nutrition_payload(value) for value in payload]) + b']'
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+class NutritionJSONResponse(Response):
+    """
+    JSON response for nutrition endpoints. Return it directly, so FastAPI skips jsonable_encoder:
+    record lists come from NutritionRecordJSON and everything else goes through orjson.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return encode_nutrition_payload(content)
+
+# --- Nutrition Result Cache ---
+NUTRITION_CACHE_MAX_ENTRIES = 2048
+NUTRITION_CACHE_TTL_SECONDS = 3600
+
+class NutritionResultCache:
+    """
+    Thread-safe bounded LRU cache with a TTL for nutrition lookup results.
+    Callers include the dataset version in their keys, so a reload invalidates everything at once.
+    """
+    def __init__(self, max_entries: int = NUTRITION_CACHE_MAX_ENTRIES, ttl_seconds: float = NUTRITION_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+nutrition_result_cache = NutritionResultCache()
+
+def build_nutrition_search_index(store: NutritionStore) -> NutritionSearchIndex:
+    return NutritionSearchIndex.build(store)
+
+# --- Versioned Nutrition Dataset ---
+NUTRITION_REQUIRED_FIELDS = ["Dish Name", "Category", "Calories (kcal)", "Protein (g)"]
+# Appended rows are folded back into freshly built arrays once they outgrow this share of the base
+NUTRITION_COMPACT_MIN_ROWS = 512
+NUTRITION_COMPACT_FRACTION = 0.1
+# Updates remembered per dataset for /nutrition/sync; clients further behind get a full sync
+NUTRITION_SYNC_LOG_MAX = 1000
+
+_nutrition_versions = itertools.count(1)
+# Serializes writers (read-modify-publish); readers never take it
+nutrition_write_lock = threading.RLock()
+_nutrition_compaction_guard = threading.Lock()
+
+class NutritionDataset:
+    """
+    One immutable, versioned view of the nutrition data: store, search index, suggestion tables,
+    similarity index, range index, facets and pre-serialized records.
+
+    Updates build a new dataset (copy-on-write) and publish it with a single reference swap, so a
+    request that captured `nutrition_dataset` once reads one consistent version throughout.
+    Result-cache keys include the version, so stale entries are never served.
+    """
+    def __init__(self, store: NutritionStore, index: NutritionSearchIndex, tables: RegionalSuggestionTables,
+                 similarity: NutritionSimilarityIndex, ranges: NutritionRangeIndex, facets: NutritionFacets,
+                 record_json: NutritionRecordJSON, content_tag: str, sync_log: tuple,
+                 appended_rows: int = 0, generation: Optional[int] = None):
+        self.store = store
+        self.index = index
+        self.tables = tables
+        self.similarity = similarity
+        self.ranges = ranges
+        self.facets = facets
+        self.record_json = record_json
+        # Content identity, stable across processes for the same data: a hash of the serialized records,
+        # chained through each update. `version` is per-process and only orders datasets within it.
+        self.content_tag = content_tag
+        # ((content_tag, dish keys changed to reach it), ...), oldest first, ending with this dataset
+        self.sync_log = sync_log
+        self.appended_rows = appended_rows
+        self.version = next(_nutrition_versions)
+        # Version of the last full build; row numbers stay valid until the next one (reload or compaction)
+        self.generation = generation if generation is not None else self.version
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def records(self, rows: List[int]) -> List[Dict[str, Any]]:
+        return self.store.records(rows)
+
+    @property
+    def needs_compaction(self) -> bool:
+        base_rows = self.store.size - self.appended_rows
+        return self.appended_rows > max(NUTRITION_COMPACT_MIN_ROWS, NUTRITION_COMPACT_FRACTION * base_rows)
+
+def build_nutrition_dataset(store: NutritionStore, index: Optional[NutritionSearchIndex] = None,
+                            record_json: Optional[NutritionRecordJSON] = None,
+                            ranges: Optional[NutritionRangeIndex] = None,
+                            similarity: Optional[NutritionSimilarityIndex] = None,
+                            tables: Optional[RegionalSuggestionTables] = None, content_tag: Optional[str] = None,
+                            repacks: Optional[NutritionDataset] = None) -> NutritionDataset:
+    """
+    Build the search index, suggestion tables and other derived structures for a store. Structures
+    passed in (read back from a snapshot) are used as they are. `repacks` is the dataset a compaction
+    rebuilt this one from: same content, so its content tag and sync log carry over.
+    """
+    if index is None:
+        index = build_nutrition_search_index(store)
+        logging.info(f"🔎 Built nutrition search index: {len(index.exact)} names, "
+                     f"{len(index.tokens)} tokens, {len(index.trigrams)} trigrams")
+    record_json = record_json or NutritionRecordJSON.build(store)
+    if repacks is not None:
+        content_tag, sync_log = repacks.content_tag, repacks.sync_log
+    else:
+        content_tag = content_tag or hashlib.sha256(record_json.blob).hexdigest()[:16]
+        sync_log = ((content_tag, frozenset()),)
+    return NutritionDataset(store, index, tables or RegionalSuggestionTables(store),
+                            similarity or NutritionSimilarityIndex.build(store),
+                            ranges or NutritionRangeIndex.build(store), NutritionFacets.build(store), record_json,
+                            content_tag, sync_log)
+
+def publish_nutrition_dataset(dataset: NutritionDataset):
+    """Make `dataset` the one every new request reads. Readers holding the old one are unaffected."""
+    global nutrition_dataset
+    with nutrition_write_lock:
+        nutrition_dataset = dataset
+    # Entries are keyed by version and can't be served any more; this only frees the memory
+    nutrition_result_cache.clear()
+
+def nutrition_dish_key(name: Any) -> str:
+    """Identity of a dish for upserts and deletes: its name, case- and whitespace-insensitive."""
+    return str(name).strip().lower()
+
+def apply_nutrition_changes(dataset: NutritionDataset, upserts: List[Dict[str, Any]],
+                            deletes: List[str]) -> tuple:
+    """
+    Build the next dataset from `dataset` plus a delta, leaving `dataset` untouched.
+    Upserts replace every live row with the same dish key (the last duplicate wins); deletes hide them.
+    Only the changed records are parsed and tokenized. Returns (new dataset, summary).
+    """
+    index = dataset.index
+    dead_rows = set()
+    deleted, not_found = 0, []
+    changed_keys = set()
+    for name in deletes:
+        rows = index.exact_rows(nutrition_dish_key(name))
+        if rows:
+            deleted += len(set(rows) - dead_rows)
+            dead_rows.update(rows)
+            changed_keys.add(nutrition_dish_key(name))
+        else:
+            not_found.append(name)
+
+    latest = {nutrition_dish_key(record["Dish Name"]): record for record in upserts}
+    for key in latest:
+        dead_rows.update(index.exact_rows(key))
+    upserts = list(latest.values())
+    changed_keys.update(latest)
+
+    start_row = dataset.store.size
+    dead_rows = sorted(dead_rows)
+    store = dataset.store.appended(upserts, dead_rows)
+    new_rows = list(range(start_row, store.size))
+
+    record_json = dataset.record_json.appended(store, new_rows)
+    digest = hashlib.sha256(dataset.content_tag.encode('utf-8'))
+    digest.update(orjson.dumps(sorted(changed_keys)))
+    for row in new_rows:
+        digest.update(record_json[row])
+    content_tag = digest.hexdigest()[:16]
+
+    updated = NutritionDataset(
+        store,
+        index.appended(store, new_rows),
+        dataset.tables.appended(store, new_rows),
+        dataset.similarity.appended(store, new_rows),
+        dataset.ranges.appended(store, new_rows),
+        dataset.facets.appended(store, new_rows, dead_rows),
+        record_json,
+        content_tag,
+        dataset.sync_log[-(NUTRITION_SYNC_LOG_MAX - 1):] + ((content_tag, frozenset(changed_keys)),),
+        appended_rows=dataset.appended_rows + len(new_rows),
+        generation=dataset.generation,
+    )
+    return updated, {"upserted": len(upserts), "deleted": deleted, "not_found": not_found}
+
+def compact_nutrition_dataset(dataset: NutritionDataset) -> NutritionDataset:
+    """Rebuild fresh arrays, index and tables from the live rows, dropping every overlay."""
+    return build_nutrition_dataset(dataset.store.compacted(), repacks=dataset)
+
+def schedule_nutrition_compaction(dataset: NutritionDataset):
+    """
+    Compact in a background thread once appended rows outgrow the base. The first pass runs without
+    blocking writers and is dropped if an update lands meanwhile; the retry then holds the write lock
+    (readers never wait on it).
+    """
+    if not dataset.needs_compaction or not _nutrition_compaction_guard.acquire(blocking=False):
+        return
+
+    def compact():
+        try:
+            started = time.perf_counter()
+            compacted = compact_nutrition_dataset(dataset)
+            with nutrition_write_lock:
+                if nutrition_dataset is not dataset:
+                    if nutrition_dataset is None or not nutrition_dataset.needs_compaction:
+                        return
+                    compacted = compact_nutrition_dataset(nutrition_dataset)
+                publish_nutrition_dataset(compacted)
+            logging.info(f"🧹 Compacted nutrition dataset to {len(compacted)} records "
+                         f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        except Exception as e:
+            logging.error(f"❌ Error compacting nutrition dataset: {e}")
+        finally:
+            _nutrition_compaction_guard.release()
+
+    threading.Thread(target=compact, name="nutrition-compaction", daemon=True).start()
+
+# --- Binary Nutrition Snapshot ---
+# Layout: magic | uint32 header length | JSON header | 64-byte aligned raw arrays.
+# The header records each array's dtype, length and offset so the arrays can be
+# mmapped in place, plus the SHA-256 of the source JSON to detect staleness.
+NUTRITION_SNAPSHOT_MAGIC = b"AAHARSNP"
+NUTRITION_SNAPSHOT_FORMAT_VERSION = 4
+_SNAPSHOT_ALIGNMENT = 64
+
+def nutrition_snapshot_path(json_path: str) -> str:
+    """Default snapshot location for a dataset JSON file: nutrition_data.json -> nutrition_data.snapshot"""
+    return f"{os.path.splitext(json_path)[0]}.snapshot"
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _put_string_table(arrays: Dict[str, np.ndarray], name: str, table: NutritionStringTable):
+    arrays[f"{name}/blob"] = np.frombuffer(table.blob, dtype=np.uint8)
+    arrays[f"{name}/offsets"] = table.offsets
+
+def _get_string_table(arrays: Dict[str, np.ndarray], name: str) -> NutritionStringTable:
+    return NutritionStringTable(arrays[f"{name}/blob"], arrays[f"{name}/offsets"])
+
+def _put_postings(arrays: Dict[str, np.ndarray], name: str, postings: PostingsMap):
+    _put_string_table(arrays, f"{name}/keys", NutritionStringTable.from_strings(postings.keys))
+    arrays[f"{name}/offsets"] = postings.offsets
+    arrays[f"{name}/rows"] = postings.rows
+
+def _get_postings(arrays: Dict[str, np.ndarray], name: str) -> PostingsMap:
+    keys = _get_string_table(arrays, f"{name}/keys").tolist()
+    return PostingsMap(keys, arrays[f"{name}/offsets"], arrays[f"{name}/rows"])
+
+def write_nutrition_snapshot(path: str, dataset: NutritionDataset, source_checksum: str):
+    """
+    Write the dataset's store, search index, pre-serialized records, range index and similarity
+    tree as a binary snapshot, so a cold start only maps them back.
+    Written to a temp file and renamed, so concurrent workers never see a partial file.
+    Only freshly built (or compacted) datasets can be written: overlays are not part of the format.
+    """
+    store, index = dataset.store, dataset.index
+    if dataset.appended_rows or store.live_count != store.size or store.strings.extra or index.exact.extra:
+        raise ValueError("Only freshly built nutrition datasets can be written as snapshots")
+    arrays: Dict[str, np.ndarray] = {}
+    for col, values in store.numeric.items():
+        arrays[f"numeric/{col}"] = values
+    for col, codes in store.text.items():
+        arrays[f"text/{col}"] = codes
+    _put_string_table(arrays, "strings", store.strings)
+    arrays["flags/is_vegan"] = store.is_vegan
+    arrays["flags/is_vegetarian"] = store.is_vegetarian
+
+    arrays["index/name_lengths"] = index.name_lengths
+    arrays["index/exact/hashes"] = index.exact.hashes
+    arrays["index/exact/offsets"] = index.exact.offsets
+    arrays["index/exact/rows"] = index.exact.rows
+    _put_postings(arrays, "index/tokens", index.tokens)
+    _put_postings(arrays, "index/trigrams", index.trigrams)
+
+    arrays["records/blob"] = np.frombuffer(dataset.record_json.blob, dtype=np.uint8)
+    arrays["records/offsets"] = dataset.record_json.offsets
+
+    ranges = dataset.ranges
+    for col, order in ranges.orders.items():
+        arrays[f"ranges/orders/{col}"] = order
+        arrays[f"ranges/sorted/{col}"] = ranges.sorted_values[col]
+    for col, rows in ranges.missing.items():
+        arrays[f"ranges/missing/{col}"] = rows
+    for col, codes in ranges.distinct.items():
+        arrays[f"ranges/distinct/{col}"] = codes
+    for diet_key, mask in ranges.diet.items():
+        arrays[f"ranges/diet/{diet_key}"] = mask
+
+    for (diet, goal), ranked in dataset.tables.ranked.items():
+        arrays[f"regional/ranked/{diet}/{goal}"] = ranked
+    for (region_lower, diet, goal), table in dataset.tables.tables.items():
+        arrays[f"regional/tables/{diet}/{goal}/{region_lower}"] = table
+
+    similarity = dataset.similarity
+    arrays["similarity/vectors"] = similarity.vectors
+    arrays["similarity/mean"] = similarity.mean
+    arrays["similarity/scale"] = similarity.scale
+    arrays["similarity/tree/rows"] = similarity.tree.rows
+    for name, values in similarity.tree.arrays().items():
+        arrays[f"similarity/tree/{name}"] = values
+
+    layout = {}
+    offset = 0
+    for name, values in arrays.items():
+        values = np.ascontiguousarray(values)
+        arrays[name] = values
+        layout[name] = {"dtype": values.dtype.str, "count": int(values.size), "offset": offset}
+        offset += -(-values.nbytes // _SNAPSHOT_ALIGNMENT) * _SNAPSHOT_ALIGNMENT
+
+    header = json.dumps({
+        "format_version": NUTRITION_SNAPSHOT_FORMAT_VERSION,
+        "source_sha256": source_checksum,
+        "rows": len(store),
+        "columns": store.columns,
+        "content_tag": dataset.content_tag,
+        "created": datetime.now().isoformat(),
+        "arrays": layout,
+    }).encode('utf-8')
+    prefix_len = len(NUTRITION_SNAPSHOT_MAGIC) + 4 + len(header)
+    data_start = -(-prefix_len // _SNAPSHOT_ALIGNMENT) * _SNAPSHOT_ALIGNMENT
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(NUTRITION_SNAPSHOT_MAGIC)
+        f.write(len(header).to_bytes(4, 'little'))
+        f.write(header)
+        for name, values in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(values.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+def load_nutrition_snapshot(path: str, source_checksum: Optional[str] = None) -> Optional[NutritionDataset]:
+    """
+    mmap a snapshot and return its dataset, or None if it is missing, unreadable, from another
+    format version, or (when source_checksum is given) built from different JSON.
+    Arrays are read-only views over the mapping; only the small suggestion tables and facets are rebuilt.
+    """
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic_len = len(NUTRITION_SNAPSHOT_MAGIC)
+        if mapped[:magic_len] != NUTRITION_SNAPSHOT_MAGIC:
+            logging.warning(f"⚠️ '{path}' is not a nutrition snapshot. Ignoring it.")
+            return None
+        header_len = int.from_bytes(mapped[magic_len:magic_len + 4], 'little')
+        header = json.loads(mapped[magic_len + 4:magic_len + 4 + header_len].decode('utf-8'))
+
+        if header.get("format_version") != NUTRITION_SNAPSHOT_FORMAT_VERSION:
+            logging.info(f"Nutrition snapshot '{path}' has format {header.get('format_version')}, expected {NUTRITION_SNAPSHOT_FORMAT_VERSION}.")
+            return None
+        if source_checksum is not None and header.get("source_sha256") != source_checksum:
+            logging.info(f"Nutrition snapshot '{path}' is stale (source checksum changed).")
+            return None
+
+        data_start = -(-(magic_len + 4 + header_len) // _SNAPSHOT_ALIGNMENT) * _SNAPSHOT_ALIGNMENT
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            if spec["count"] == 0:
+                arrays[name] = np.empty(0, dtype=dtype)
+            else:
+                arrays[name] = np.frombuffer(mapped, dtype=dtype, count=spec["count"], offset=data_start + spec["offset"])
+
+        columns = header["columns"]
+        store = NutritionStore(
+            columns=columns,
+            numeric={col: arrays[f"numeric/{col}"] for col in columns if f"numeric/{col}" in arrays},
+            text={col: arrays[f"text/{col}"] for col in columns if f"text/{col}" in arrays},
+            strings=_get_string_table(arrays, "strings"),
+            is_vegan=arrays["flags/is_vegan"],
+            is_vegetarian=arrays["flags/is_vegetarian"],
+        )
+        index = NutritionSearchIndex(
+            strings=store.strings,
+            name_codes=store.text_codes('Dish Name'),
+            category_codes=store.text_codes('Category'),
+            name_lengths=arrays["index/name_lengths"],
+            exact=HashedPostingsMap(arrays["index/exact/hashes"], arrays["index/exact/offsets"],
+                                    arrays["index/exact/rows"]),
+            tokens=_get_postings(arrays, "index/tokens"),
+            trigrams=_get_postings(arrays, "index/trigrams"),
+        )
+        # A memoryview slices into the mapping without copying, and joins like bytes
+        record_json = NutritionRecordJSON(memoryview(arrays["records/blob"]), arrays["records/offsets"])
+
+        def arrays_under(prefix: str) -> Dict[str, np.ndarray]:
+            return {name[len(prefix):]: values for name, values in arrays.items() if name.startswith(prefix)}
+        ranges = NutritionRangeIndex(
+            arrays_under("ranges/orders/"), arrays_under("ranges/sorted/"), arrays_under("ranges/missing/"),
+            arrays_under("ranges/distinct/"), arrays_under("ranges/diet/"), store.size,
+        )
+
+        vectors = arrays["similarity/vectors"].reshape(-1, len(NUTRITION_NUMERIC_COLUMNS))
+        tree_rows = arrays["similarity/tree/rows"]
+        tree = NutrientKDTree.from_arrays(
+            vectors[tree_rows], tree_rows, arrays["similarity/tree/dims"], arrays["similarity/tree/splits"],
+            arrays["similarity/tree/children"].reshape(-1, 2), arrays["similarity/tree/spans"].reshape(-1, 2),
+        )
+        similarity = NutritionSimilarityIndex(vectors, arrays["similarity/mean"], arrays["similarity/scale"],
+                                              tree, store.size)
+
+        ranked = {tuple(name.split("/", 1)): values for name, values in arrays_under("regional/ranked/").items()}
+        region_tables = {}
+        for name, values in arrays_under("regional/tables/").items():
+            diet, goal, region_lower = name.split("/", 2)  # the region is last: it may contain '/'
+            region_tables[(region_lower, diet, goal)] = values
+        tables = RegionalSuggestionTables(store, ranked, region_tables)
+        return build_nutrition_dataset(store, index=index, record_json=record_json, ranges=ranges,
+                                       similarity=similarity, tables=tables, content_tag=header["content_tag"])
+    except Exception as e:
+        logging.warning(f"⚠️ Could not load nutrition snapshot '{path}': {e}")
+        return None
+
+# --- Streaming Nutrition Ingestion ---
+# Characters a single NDJSON line or array element may span before the stream is rejected
+MAX_STREAM_RECORD_CHARS = 1 << 20
+# Every rejected row is counted, but only this many are listed back
+MAX_REPORTED_REJECTS = 100
+NUTRITION_REQUIRED_NUMERIC_FIELDS = ["Calories (kcal)", "Protein (g)"]
+
+_JSON_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+
+class NutritionStreamDecoder:
+    """
+    Incremental decoder for nutrition uploads fed in arbitrary byte chunks: NDJSON (one record, or
+    one array of records, per line) or a single top-level JSON array. Input that starts with '[' is
+    read as an array; once it closes, whatever follows is read as NDJSON lines, so arrays one per line
+    work too. At most one line or array element is buffered at a time. feed() and close() return
+    (line_number, value, error) triples.
+    """
+    def __init__(self):
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._line = 1              # line number of self._buffer[0]
+        self._mode: Optional[str] = None  # "ndjson" or "array", decided by the first character; "ndjson" after the array
+        self._expect_value = True   # array mode: next token is an element rather than ',' or ']'
+        self._elements = 0
+        self._skipping_line = False  # ndjson mode: dropping the rest of an oversized line
+        self._done = False
+
+    def feed(self, chunk: bytes) -> List[tuple]:
+        if self._done:
+            return []
+        self._buffer += self._utf8.decode(chunk)
+        return self._drain(final=False)
+
+    def close(self) -> List[tuple]:
+        if self._done:
+            return []
+        self._buffer += self._utf8.decode(b"", final=True)
+        items = self._drain(final=True)
+        if self._mode == "array" and not self._done:
+            items.append((self._line, None, "unexpected end of input: the JSON array is not closed"))
+        self._done = True
+        return items
+
+    def _drain(self, final: bool) -> List[tuple]:
+        if self._mode is None:
+            start = _JSON_WHITESPACE_RE.match(self._buffer).end()
+            if start == len(self._buffer):
+                return []
+            self._mode = "array" if self._buffer[start] == "[" else "ndjson"
+            if self._mode == "array":
+                self._line += self._buffer.count("\n", 0, start)
+                self._buffer = self._buffer[start + 1:]
+        return self._drain_array(final) if self._mode == "array" else self._drain_lines(final)
+
+    def _drain_lines(self, final: bool) -> List[tuple]:
+        lines = self._buffer.split("\n")
+        self._buffer = "" if final else lines.pop()
+        items = []
+        for text in lines:
+            line = self._line
+            self._line += 1
+            if self._skipping_line:
+                self._skipping_line = False
+                continue
+            if text.strip():
+                try:
+                    items.append((line, json.loads(text), None))
+                except json.JSONDecodeError as e:
+                    items.append((line, None, f"invalid JSON: {e.msg} (column {e.colno})"))
+
+        if len(self._buffer) > MAX_STREAM_RECORD_CHARS and not self._skipping_line:
+            items.append((self._line, None, f"line exceeds {MAX_STREAM_RECORD_CHARS} characters"))
+            self._skipping_line = True
+        if self._skipping_line:
+            self._buffer = ""
+        return items
+
+    def _drain_array(self, final: bool) -> List[tuple]:
+        buffer, pos, items = self._buffer, 0, []
+        closed = False
+        while not self._done and not closed:
+            end = _JSON_WHITESPACE_RE.match(buffer, pos).end()
+            self._line += buffer.count("\n", pos, end)
+            pos = end
+            if pos == len(buffer):
+                break
+
+            if not self._expect_value:
+                if buffer[pos] not in ",]":
+                    items.append((self._line, None, "invalid JSON: expected ',' or ']' between array elements"))
+                    self._done = True
+                    break
+                closed = buffer[pos] == "]"
+                self._expect_value = True
+                pos += 1
+                continue
+
+            if buffer[pos] == "]" and self._elements == 0:
+                closed = True
+                pos += 1
+                break
+            try:
+                value, end = self._json.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                # Most likely an element cut off by the chunk boundary; wait for more input
+                if not final and len(buffer) - pos <= MAX_STREAM_RECORD_CHARS:
+                    break
+                items.append((self._line, None, f"invalid JSON: {e.msg}"))
+                self._done = True
+                break
+            if end == len(buffer) and not final:
+                break  # a trailing number may continue in the next chunk
+
+            items.append((self._line, value, None))
+            self._line += buffer.count("\n", pos, end)
+            self._elements += 1
+            self._expect_value = False
+            pos = end
+
+        self._buffer = buffer[pos:]
+        if closed:
+            # The rest of the closing line must be blank; later lines are NDJSON (e.g. one array per line)
+            self._mode = "ndjson"
+            items.extend(self._drain_lines(final))
+        return items
+
+def validate_nutrition_record(record: Any) -> Optional[str]:
+    """Why a decoded upload record can't be loaded, or None if it can."""
+    if not isinstance(record, dict):
+        return f"expected a JSON object, got {type(record).__name__}"
+    missing = [field for field in NUTRITION_REQUIRED_FIELDS if field not in record]
+    if missing:
+        return f"missing required fields: {missing}"
+    name = record["Dish Name"]
+    if not isinstance(name, str) or not name.strip():
+        return "'Dish Name' must be a non-empty string"
+    for field in NUTRITION_REQUIRED_NUMERIC_FIELDS:
+        value = _coerce_number(record[field])
+        if value != value:
+            return f"'{field}' is not a number: {record[field]!r}"
+    return None
+
+class NutritionIngest:
+    """
+    Appends decoded upload records straight into a NutritionStoreBuilder, one at a time.
+    Invalid records are skipped, counted and reported with the line they started on.
+    """
+    def __init__(self, validate: bool = True):
+        self.builder = NutritionStoreBuilder()
+        self.validate = validate
+        self.rejected = 0
+        self.rejects: List[Dict[str, Any]] = []
+
+    @property
+    def accepted(self) -> int:
+        return self.builder.size
+
+    def add(self, items: List[tuple]):
+        for line, value, error in items:
+            if error is not None:
+                self._reject(line, error)
+            elif isinstance(value, list):
+                for record in value:
+                    self._add_record(line, record)
+            else:
+                self._add_record(line, value)
+
+    def _add_record(self, line: int, record: Any):
+        if self.validate:
+            error = validate_nutrition_record(record)
+        else:
+            error = None if isinstance(record, dict) else f"expected a JSON object, got {type(record).__name__}"
+        if error is not None:
+            self._reject(line, error)
+        else:
+            self.builder.append(record)
+
+    def _reject(self, line: int, error: str):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append({"line": line, "error": error})
+
+    def report(self) -> Dict[str, Any]:
+        return {"accepted": self.accepted, "rejected": self.rejected, "rejects": self.rejects}
+
+def ingest_nutrition_file(path: str, validate: bool = True, chunk_size: int = 1 << 16) -> NutritionIngest:
+    """Stream a JSON array or NDJSON file into a NutritionIngest without reading it whole."""
+    decoder = NutritionStreamDecoder()
+    ingest = NutritionIngest(validate=validate)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            ingest.add(decoder.feed(chunk))
+    ingest.add(decoder.close())
+    return ingest
 
 # --- Nutrition Dataset Loading ---
 def load_nutrition_dataset(file_path: str = "nutrition_data.json"):
     """
-    Load the nutrition dataset from JSON file and prepare it for efficient querying.
-    """
-    global nutrition_data, nutrition_df
+    Load the nutrition dataset and prepare it for efficient querying.
 
+    Prefers the binary snapshot next to the JSON file (mmapped, indexes prebuilt) and only
+    parses the JSON when the snapshot is missing or its checksum no longer matches, in which
+    case a fresh snapshot is written for the next cold start. The JSON (an array, or NDJSON)
+    is streamed record by record into the columnar store.
+    """
     try:
         # Check if file exists
         if not os.path.exists(file_path):
@@ -50,29 +1921,35 @@ def load_nutrition_dataset(file_path: str = "nutrition_data.json"):
             create_fallback_nutrition_data()
             return
 
-        with open(file_path, 'r', encoding='utf-8') as f:
-            nutrition_data = json.load(f)
-
-        # Convert to pandas DataFrame for easier querying
-        nutrition_df = pd.DataFrame(nutrition_data)
+        started = time.perf_counter()
+        checksum = file_sha256(file_path)
+        snapshot_path = nutrition_snapshot_path(file_path)
+        snapshot = load_nutrition_snapshot(snapshot_path, checksum)
+        if snapshot is not None:
+            publish_nutrition_dataset(snapshot)
+            logging.info(f"✅ Loaded {len(snapshot)} nutrition records from snapshot {snapshot_path} "
+                         f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+            return
 
-        # Clean and standardize data
-        if not nutrition_df.empty:
-            # Convert numeric columns to proper types
-            numeric_columns = ['Calories (kcal)', 'Protein (g)', 'Carbs (g)', 'Sugar (g)',
-                               'Fat (g)', 'Fiber (g)', 'Sodium (mg)']
+        # Stream into the columnar store; the file is never parsed into one big list of dicts.
+        # Records aren't validated here, matching what the dataset always loaded, but bad JSON is fatal.
+        ingest = ingest_nutrition_file(file_path, validate=False)
+        if ingest.rejects:
+            first = ingest.rejects[0]
+            raise ValueError(f"line {first['line']}: {first['error']}")
 
-            for col in numeric_columns:
-                if col in nutrition_df.columns:
-                    nutrition_df[col] = pd.to_numeric(nutrition_df[col], errors='coerce')
+        dataset = build_nutrition_dataset(ingest.builder.build())
+        publish_nutrition_dataset(dataset)
 
-            # Create searchable text for fuzzy matching
-            nutrition_df['searchable_text'] = (
-                nutrition_df['Dish Name'].astype(str).str.lower() + ' ' +
-                nutrition_df['Category'].astype(str).str.lower()
-            )
+        logging.info(f"✅ Loaded {len(dataset)} nutrition records from {file_path} "
+                     f"({dataset.store.nbytes / 1024:.0f} KiB columnar) "
+                     f"in {(time.perf_counter() - started) * 1000:.0f} ms")
 
-        logging.info(f"✅ Loaded {len(nutrition_data)} nutrition records from {file_path}")
+        try:
+            write_nutrition_snapshot(snapshot_path, dataset, checksum)
+            logging.info(f"💾 Wrote nutrition snapshot {snapshot_path}")
+        except OSError as e:
+            logging.warning(f"⚠️ Could not write nutrition snapshot '{snapshot_path}': {e}")
 
     except json.JSONDecodeError as e:
         logging.error(f"❌ JSON parsing error in nutrition dataset: {e}")
@@ -85,8 +1962,6 @@ def create_fallback_nutrition_data():
     """
     Create basic fallback nutrition data if the JSON file is not available.
     """
-    global nutrition_data, nutrition_df
-
     fallback_data = [
         {
             "Category": "Breads & Roti",
@@ -132,15 +2007,7 @@ def create_fallback_nutrition_data():
         }
     ]
 
-    nutrition_data = fallback_data
-    nutrition_df = pd.DataFrame(fallback_data)
-
-    # Add searchable text
-    if not nutrition_df.empty:
-        nutrition_df['searchable_text'] = (
-            nutrition_df['Dish Name'].astype(str).str.lower() + ' ' +
-            nutrition_df['Category'].astype(str).str.lower()
-        )
+    publish_nutrition_dataset(build_nutrition_dataset(build_nutrition_store(fallback_data)))
 
     logging.info(f"✅ Created fallback nutrition dataset with {len(fallback_data)} records")
 
@@ -148,38 +2015,45 @@ def search_nutrition_data(query: str, limit: int = 5) -> List[Dict[str, Any]]:
     """
     Search the nutrition dataset using fuzzy matching for food items with improved accuracy.
     """
-    if nutrition_df is None or nutrition_df.empty:
-        return []
+    dataset, rows = search_nutrition_rows(query, limit)
+    return dataset.records(rows) if dataset is not None else []
 
+def search_nutrition_rows(query: str, limit: int = 5) -> tuple:
+    """
+    (dataset, matching rows) for a search on the current dataset, so endpoints can serve the
+    pre-serialized records. Rows are cached per (normalized query, limit, dataset version).
+    """
+    dataset = nutrition_dataset
+    if dataset is None:
+        return None, []
     query_lower = query.lower().strip()
+    cache_key = ("search", query_lower, limit, dataset.version)
 
-    # 1. High-priority: Exact match on 'Dish Name'
-    exact_matches = nutrition_df[nutrition_df['Dish Name'].str.lower() == query_lower]
-    if not exact_matches.empty:
-        return exact_matches.head(limit).to_dict('records')
+    rows = nutrition_result_cache.get(cache_key)
+    if rows is None:
+        rows = tuple(_search_nutrition_rows_uncached(dataset, query_lower, limit))
+        nutrition_result_cache.put(cache_key, rows)
+    return dataset, list(rows)
 
-    # 2. Secondary priority: Contains match on 'Dish Name'
-    contains_matches = nutrition_df[
-        nutrition_df['Dish Name'].str.lower().str.contains(query_lower, na=False, regex=False)
-    ]
-    if not contains_matches.empty:
-        # Sort by length to prefer shorter, more exact matches
-        contains_matches = contains_matches.copy()
-        contains_matches['match_len'] = contains_matches['Dish Name'].str.len()
-        return contains_matches.sort_values('match_len').head(limit).drop(columns=['match_len']).to_dict('records')
+def _search_nutrition_rows_uncached(dataset: NutritionDataset, query_lower: str, limit: int) -> List[int]:
+    index = dataset.index
 
-    # 3. Fuzzy matching on 'searchable_text' with a high threshold
-    try:
-        choices = nutrition_df['searchable_text'].tolist()
-        # Use a more robust scorer and a higher threshold to avoid incorrect matches
-        matches = process.extract(query_lower, choices, limit=limit, scorer=fuzz.token_set_ratio)
+    # 1. High-priority: Exact match on 'Dish Name' (hash lookup)
+    exact_rows = index.exact_rows(query_lower)
+    if exact_rows:
+        return exact_rows[:limit]
 
-        # Filter matches with a high similarity score (e.g., > 85)
-        good_matches = [match for match in matches if match[1] > 85]
+    # 2. Secondary priority: Contains match on 'Dish Name' (token index, shortest first)
+    contains_rows = index.contains_rows(query_lower)
+    if contains_rows:
+        return contains_rows[:limit]
 
-        if good_matches:
-            matched_indices = [choices.index(match[0]) for match in good_matches]
-            return nutrition_df.iloc[matched_indices].to_dict('records')
+    # 3. Fuzzy matching on 'searchable_text' with a high threshold,
+    #    scoring only the trigram-prefiltered candidates
+    try:
+        fuzzy_rows = index.fuzzy_rows(query_lower, limit=limit)
+        if fuzzy_rows:
+            return fuzzy_rows
 
     except Exception as e:
         logging.error(f"Error in fuzzy matching: {e}")
@@ -187,54 +2061,611 @@ def search_nutrition_data(query: str, limit: int = 5) -> List[Dict[str, Any]]:
     # If all other methods fail, return an empty list. Avoids overly broad category matches.
     return []
 
+def resolve_dish_rows(dataset: Optional[NutritionDataset], dish_names: List[str]) -> List[tuple]:
+    """
+    Resolve many dish names to their single best row of `dataset` in one pass.
+    Returns (row, match_type) per name, where match_type is 'exact', 'contains', 'fuzzy' or 'not_found'.
+    """
+    if dataset is None:
+        return [(None, "not_found") for _ in dish_names]
+    index = dataset.index
+
+    # Shared normalization: repeated names in a menu or meal log are resolved once
+    normalized = [str(name).lower().strip() for name in dish_names]
+    best: Dict[str, tuple] = {}
+    misses: List[str] = []
+
+    for query_lower in dict.fromkeys(normalized):
+        exact_rows = index.exact_rows(query_lower)
+        if exact_rows:
+            best[query_lower] = (exact_rows[0], "exact")
+            continue
+        contains_rows = index.contains_rows(query_lower)
+        if contains_rows:
+            best[query_lower] = (contains_rows[0], "contains")
+            continue
+        misses.append(query_lower)
+
+    try:
+        fuzzy_rows = index.best_fuzzy_rows(misses) if misses else []
+    except Exception as e:
+        logging.error(f"Error in fuzzy matching: {e}")
+        fuzzy_rows = [None] * len(misses)
+    for query_lower, row in zip(misses, fuzzy_rows):
+        best[query_lower] = (row, "fuzzy") if row is not None else (None, "not_found")
+
+    return [best[query_lower] for query_lower in normalized]
+
+def records_for_rows(dataset: Optional[NutritionDataset], rows: List[Optional[int]]) -> List[Optional[Dict[str, Any]]]:
+    """Materialize records for row positions in one batch; None rows stay None."""
+    if dataset is None:
+        return [None for _ in rows]
+
+    unique_rows = list(dict.fromkeys(row for row in rows if row is not None))
+    records = dict(zip(unique_rows, dataset.records(unique_rows)))
+    return [records[row] if row is not None else None for row in rows]
+
+def resolve_dishes(dish_names: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Batched equivalent of search_nutrition_data(name, limit=1)[0] for each name; None where nothing matched.
+    """
+    dataset = nutrition_dataset
+    return records_for_rows(dataset, [row for row, _ in resolve_dish_rows(dataset, dish_names)])
+
+def nutrient_matrix(dataset: NutritionDataset, rows: List[int]) -> np.ndarray:
+    """(len(rows), len(NUTRITION_NUMERIC_COLUMNS)) float64 matrix for the rows, missing values as 0."""
+    rows = np.asarray(rows, dtype=np.int64)
+    matrix = np.empty((len(rows), len(NUTRITION_NUMERIC_COLUMNS)), dtype=np.float64)
+    for i, col in enumerate(NUTRITION_NUMERIC_COLUMNS):
+        matrix[:, i] = dataset.store.numeric_column(col)[rows]
+    return np.nan_to_num(matrix, nan=0.0)
+
+def nutrient_totals(dataset: NutritionDataset, rows: List[int]) -> Dict[str, float]:
+    """Summed numeric columns over the rows in one vectorized pass; a repeated row counts every time."""
+    return _totals_dict(nutrient_matrix(dataset, rows).sum(axis=0))
+
+def _totals_dict(values: np.ndarray) -> Dict[str, float]:
+    return {col: round(float(value), 2) for col, value in zip(NUTRITION_NUMERIC_COLUMNS, values)}
+
 
 def get_regional_nutrition_suggestions(region: str, dietary_type: str, goal: str) -> List[Dict[str, Any]]:
     """
     Get nutrition suggestions based on region, dietary preferences, and goals.
     """
-    if nutrition_df is None or nutrition_df.empty:
-        return []
+    dataset, rows = regional_suggestion_rows(region, dietary_type, goal)
+    return dataset.records(rows) if dataset is not None else []
+
+def regional_suggestion_rows(region: str, dietary_type: str, goal: str) -> tuple:
+    """
+    (dataset, suggested rows) on the current dataset.
+    Rows are cached per (region, dietary_type, goal, dataset version).
+    """
+    dataset = nutrition_dataset
+    if dataset is None:
+        return None, []
+    cache_key = ("regional", region, dietary_type, goal, dataset.version)
+
+    rows = nutrition_result_cache.get(cache_key)
+    if rows is None:
+        rows = tuple(dataset.tables.ranked_rows(region, dietary_type, goal, limit=REGIONAL_SUGGESTION_LIMIT))
+        nutrition_result_cache.put(cache_key, rows)
+    return dataset, list(rows)
+
+# --- Meal Plan Optimizer ---
+# Each slot picks one dish per course; a course lists the categories it may draw from
+DEFAULT_MEAL_SLOTS = [
+    {"name": "breakfast", "calorie_share": 0.25, "courses": [
+        ["Breakfast Items", "Snacks & Street Food", "Breads & Roti", "Regional Specialties (South)"],
+        ["Beverages"],
+    ]},
+    {"name": "lunch", "calorie_share": 0.35, "courses": [
+        ["Breads & Roti", "Rice Dishes"],
+        ["Vegetarian Curries", "Non-Vegetarian Curries", "Kebabs & Tikkas"],
+        ["Lentils (Dal)", "Salads"],
+    ]},
+    {"name": "snack", "calorie_share": 0.10, "courses": [
+        ["Snacks & Street Food", "Dry Snacks (Namkeen)", "Salads", "Soups", "Beverages"],
+    ]},
+    {"name": "dinner", "calorie_share": 0.30, "courses": [
+        ["Breads & Roti", "Rice Dishes"],
+        ["Vegetarian Curries", "Non-Vegetarian Curries", "Lentils (Dal)"],
+        ["Soups", "Salads"],
+    ]},
+]
+# Day defaults per goal: kcal, then the share of kcal from protein / carbs / fat
+MEAL_PLAN_GOAL_DEFAULTS = {
+    "weight loss": (1600, 0.30, 0.40, 0.30),
+    "weight gain": (2600, 0.25, 0.50, 0.25),
+    "diet": (2000, 0.20, 0.50, 0.30),
+}
+MEAL_PLAN_NUTRIENTS = ['Calories (kcal)', 'Protein (g)', 'Carbs (g)', 'Fat (g)']
+# Weights of each nutrient's squared relative error when scoring a combination
+MEAL_PLAN_WEIGHTS = np.array([1.0, 0.5, 0.25, 0.25])
+# Bounded search: at most this many dish combinations are scored per slot
+MEAL_PLAN_MAX_COMBINATIONS = 50000
+MAX_MEAL_PLAN_SLOTS = 6
+MAX_COURSES_PER_SLOT = 3
+# Strict diet masks for dish picks (meal plans, similar dishes, /nutrition/query), on top of NON_VEG_KEYWORDS.
+# Dish-name words that always mean meat or seafood
+MEAL_PLAN_NON_VEG_KEYWORDS = ['prawn', 'shrimp', 'crab', 'squid', 'lobster', 'seafood', 'kozhi', 'meen',
+                              'maach', 'machh', 'ilish', 'hilsa', 'pomfret', 'bombil', 'gosht', 'lamb',
+                              'meat', 'liver', 'kaleji', 'nihari', 'haleem', 'duck', 'murg', 'mangsho', 'bheja',
+                              'chingri', 'macher', 'non-veg', 'nonveg', 'tangdi', 'boti', 'turkey']
+# Dish styles that are meat unless the name says otherwise ("Veg Seekh Kebab", "Soya Keema", "Paneer Tikka")
+MEAL_PLAN_MEAT_STYLE_KEYWORDS = ['keema', 'kheema', 'kebab', 'kabab', 'seekh', 'galouti', 'reshmi', 'shami',
+                                 'kakori', 'gilafi', 'kalmi', 'burra', 'barra', 'pasanda', 'chapli', 'tikka',
+                                 'chaap', 'kofta', 'cutlet', 'biryani', 'yakhni', 'nargisi', 'omelette']
+MEAL_PLAN_VEG_MARKERS = ['veg', 'paneer', 'soya', 'tofu', 'mushroom', 'cheese', 'dahi', 'malai', 'chhena',
+                         'jackfruit', 'kathal', 'millet', 'palak', 'lauki', 'cabbage', 'beetroot', 'poha',
+                         'sooji', 'rava', 'corn', 'hara bhara', 'chana', 'rajma', 'besan']
+# Dish-name words for dairy, honey and dough usually made with milk or curd: not vegan
+MEAL_PLAN_NON_VEGAN_KEYWORDS = ['paneer', 'ghee', 'butter', 'dahi', 'curd', 'malai', 'cheese', 'milk', 'cream',
+                                'khoya', 'khoa', 'mawa', 'lassi', 'chaas', 'raita', 'kadhi', 'makhani', 'rabri',
+                                'rabdi', 'kheer', 'kulfi', 'shrikhand', 'basundi', 'rasmalai', 'rasgulla',
+                                'sandesh', 'chhena', 'chenna', 'yogurt', 'honey', 'naan', 'kulcha', 'bhatura',
+                                'chai', 'coffee', 'payasam', 'halwa', 'chocolate', 'custard', 'pudding',
+                                'payokh', 'french toast']
+# Categories a vegan pick never comes from (milk- and ghee-based sweets, platters served with curd)
+MEAL_PLAN_NON_VEGAN_CATEGORY_KEYWORDS = ['sweets', 'thali']
+# Below this many regional dishes a course draws from every region
+MIN_REGIONAL_CANDIDATES = 3
+
+def meal_plan_targets(goal: str, calories: Optional[float] = None, protein_g: Optional[float] = None,
+                      carbs_g: Optional[float] = None, fat_g: Optional[float] = None) -> Dict[str, float]:
+    """Day targets for MEAL_PLAN_NUTRIENTS; anything not given is derived from the goal's defaults."""
+    default_calories, protein_share, carbs_share, fat_share = MEAL_PLAN_GOAL_DEFAULTS.get(
+        goal, MEAL_PLAN_GOAL_DEFAULTS["diet"]
+    )
+    calories = calories or default_calories
+    return {
+        'Calories (kcal)': float(calories),
+        'Protein (g)': float(protein_g) if protein_g is not None else calories * protein_share / 4,
+        'Carbs (g)': float(carbs_g) if carbs_g is not None else calories * carbs_share / 4,
+        'Fat (g)': float(fat_g) if fat_g is not None else calories * fat_share / 9,
+    }
 
-    # Filter by region if specified
-    filtered_df = nutrition_df.copy()
+def _diet_mask(store: NutritionStore, dietary_type: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Which rows (all, or `rows`) a vegan or vegetarian diet allows, strict enough to serve as a dish pick:
+    a dish with a meat style in its name only passes if the name also marks it vegetarian, and vegan
+    is vegetarian minus dairy. Unlike the store's diet flags, this errs on the side of leaving dishes out.
+    Computed once per dataset into NutritionRangeIndex; use dataset.ranges.diet_mask() there.
+    """
+    select = slice(None) if rows is None else rows
+    allowed = np.ones(store.size if rows is None else len(rows), dtype=bool)
+    if dietary_type not in ("vegan", "vegetarian"):
+        return allowed
+
+    strings = store.strings
+    categories = store.text_codes('Category')[select]
+    names = store.text_codes('Dish Name')[select]
+    allowed &= store.is_vegetarian[select]
+    allowed &= ~np.isin(categories, strings.codes_containing(["non-veg"]))
+    allowed &= ~np.isin(names, strings.codes_containing(MEAL_PLAN_NON_VEG_KEYWORDS))
+    meat_styles = np.setdiff1d(strings.codes_containing(MEAL_PLAN_MEAT_STYLE_KEYWORDS),
+                               strings.codes_containing(MEAL_PLAN_VEG_MARKERS))
+    allowed &= ~np.isin(names, meat_styles)
+    if dietary_type == "vegan":
+        allowed &= ~np.isin(names, strings.codes_containing(MEAL_PLAN_NON_VEGAN_KEYWORDS))
+        allowed &= ~np.isin(categories, strings.codes_containing(MEAL_PLAN_NON_VEGAN_CATEGORY_KEYWORDS))
+    return allowed
 
+def optimize_meal_plan(dataset: NutritionDataset, targets: Dict[str, float], dietary_type: str = "any",
+                       region: str = "Indian", slots: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Deterministic day plan. For each slot, picks the one-dish-per-course combination whose calories
+    and macros come closest (weighted squared relative error) to the slot's share of the day targets.
+    Each course draws from the dishes nearest its calorie budget, sized so a slot scores at most
+    MEAL_PLAN_MAX_COMBINATIONS combinations in one vectorized pass. No dish repeats within a day.
+    """
+    store = dataset.store
+    slots = slots or DEFAULT_MEAL_SLOTS
+    total_share = sum(slot["calorie_share"] for slot in slots)
+    day_target = np.array([targets[col] for col in MEAL_PLAN_NUTRIENTS])
+
+    values = np.stack([store.numeric_column(col) for col in MEAL_PLAN_NUTRIENTS], axis=1).astype(np.float64)
+    eligible = store.live & (values[:, 0] > 0)  # NaN calories compare False
+    diet_mask = dataset.ranges.diet_mask(dietary_type)
+    if diet_mask is not None:
+        eligible &= diet_mask
+    values = np.nan_to_num(values, nan=0.0)
+
+    region_mask = None
     if region and region != "Indian":
-        region_matches = filtered_df[
-            filtered_df['Region'].str.lower().str.contains(region.lower(), na=False, regex=False)
-        ]
-        if not region_matches.empty:
-            filtered_df = region_matches
+        region_codes = dataset.ranges.matching_codes(store, 'Region', lambda value: region.lower() in value.lower())
+        if region_codes:
+            region_mask = np.isin(store.text_codes('Region'), region_codes)
+
+    category_codes = store.text_codes('Category')
+    used = np.zeros(store.size, dtype=bool)
+    planned_slots, planned_rows = [], []
+
+    for slot in slots:
+        slot_target = day_target * slot["calorie_share"] / total_share
+        courses = slot["courses"][:MAX_COURSES_PER_SLOT]
+        pool_size = max(2, int(MEAL_PLAN_MAX_COMBINATIONS ** (1 / max(len(courses), 1))))
+        course_budget = slot_target[0] / max(len(courses), 1)
+
+        pools, unfilled = [], []
+        for course, categories in enumerate(courses):
+            wanted = {category.lower() for category in categories}
+            in_course = eligible & ~used & np.isin(
+                category_codes, dataset.ranges.matching_codes(store, 'Category', lambda value: value.lower() in wanted)
+            )
+            candidates = in_course
+            if region_mask is not None and (in_course & region_mask).sum() >= MIN_REGIONAL_CANDIDATES:
+                candidates = in_course & region_mask
+            rows = np.flatnonzero(candidates)
+            if not len(rows):
+                unfilled.append(categories)
+                continue
+            # Nearest to the course's calorie budget first; ties by dataset order
+            order = np.lexsort((rows, np.abs(values[rows, 0] - course_budget)))
+            pools.append((course, rows[order[:pool_size]]))
+
+        chosen: List[tuple] = []
+        if pools:
+            grids = [grid.ravel() for grid in np.meshgrid(*[np.arange(len(rows)) for _, rows in pools], indexing='ij')]
+            picked = [rows[grid] for (_, rows), grid in zip(pools, grids)]
+            sums = sum(values[rows] for rows in picked)
+            error = ((((sums - slot_target) / np.maximum(slot_target, 1.0)) ** 2) * MEAL_PLAN_WEIGHTS).sum(axis=1)
+            # Courses sharing categories must not pick the same dish
+            for i in range(len(picked)):
+                for j in range(i + 1, len(picked)):
+                    error[picked[i] == picked[j]] = np.inf
+            best = int(np.argmin(error))
+            if np.isfinite(error[best]):
+                chosen = [(course, int(rows[best])) for (course, _), rows in zip(pools, picked)]
+
+        for _, row in chosen:
+            used[row] = True
+        slot_rows = [row for _, row in chosen]
+        planned_rows.extend(slot_rows)
+        planned_slots.append({
+            "slot": slot["name"],
+            "targets": {col: round(float(value), 1) for col, value in zip(MEAL_PLAN_NUTRIENTS, slot_target)},
+            "dishes": [
+                {"course": course + 1, **record}
+                for (course, _), record in zip(chosen, dataset.records(slot_rows))
+            ],
+            "totals": nutrient_totals(dataset, slot_rows),
+            "unfilled_courses": unfilled,
+        })
+
+    totals = nutrient_totals(dataset, planned_rows)
+    return {
+        "targets": {col: round(value, 1) for col, value in targets.items()},
+        "totals": totals,
+        "deviation_pct": {
+            col: round((totals[col] - targets[col]) / targets[col] * 100, 1) if targets[col] else None
+            for col in MEAL_PLAN_NUTRIENTS
+        },
+        "dietary_type": dietary_type,
+        "region": region,
+        "slots": planned_slots,
+    }
 
-    # Filter by dietary type
-    if dietary_type == "vegan":
-        # Exclude dairy and animal products
-        vegan_categories = ['Breads & Roti', 'Rice & Grains', 'Legumes & Dal',
-                            'Vegetables', 'Fruits', 'Nuts & Seeds']
-        filtered_df = filtered_df[
-            filtered_df['Category'].str.contains('|'.join(vegan_categories), case=False, na=False)
-        ]
-    elif dietary_type == "vegetarian":
-        # Include vegetarian items, exclude meat/fish
-        non_veg_keywords = ['chicken', 'fish', 'mutton', 'beef', 'pork', 'egg']
-        for keyword in non_veg_keywords:
-            filtered_df = filtered_df[
-                ~filtered_df['Dish Name'].str.lower().str.contains(keyword, na=False, regex=False)
-            ]
+def get_meal_plan(targets: Dict[str, float], dietary_type: str = "any", region: str = "Indian",
+                  slots: Optional[List[Dict[str, Any]]] = None) -> Optional[Dict[str, Any]]:
+    """Cached optimize_meal_plan on the current dataset; None when no dataset is loaded."""
+    dataset = nutrition_dataset
+    if dataset is None:
+        return None
+    cache_key = ("meal_plan", json.dumps([targets, dietary_type, region, slots], sort_keys=True), dataset.version)
+
+    cached = nutrition_result_cache.get(cache_key)
+    if cached is not None:
+        return copy.deepcopy(cached)
+
+    plan = optimize_meal_plan(dataset, targets, dietary_type, region, slots)
+    nutrition_result_cache.put(cache_key, copy.deepcopy(plan))
+    return plan
+
+def format_meal_plan(plan: Dict[str, Any]) -> str:
+    """Markdown rendering of an optimized meal plan, figures exactly as computed."""
+    lines = []
+    for slot in plan["slots"]:
+        slot_totals = slot["totals"]
+        lines.append(f"**{slot['slot'].title()}** ({slot_totals['Calories (kcal)']:g} kcal)")
+        for dish in slot["dishes"]:
+            lines.append(
+                f"- {dish.get('Dish Name')} ({dish.get('Serving Size') or '1 serving'}): "
+                f"{dish.get('Calories (kcal)')} kcal, P {dish.get('Protein (g)')}g, "
+                f"C {dish.get('Carbs (g)')}g, F {dish.get('Fat (g)')}g"
+            )
+        if not slot["dishes"]:
+            lines.append("- No matching dishes in the database")
+        lines.append("")
+
+    totals, targets = plan["totals"], plan["targets"]
+    lines.append("| Nutrient | Plan | Target |")
+    lines.append("|---|---|---|")
+    for col in MEAL_PLAN_NUTRIENTS:
+        lines.append(f"| {col} | {totals[col]:g} | {targets[col]:g} |")
+    return "\n".join(lines)
+
+# --- Similar Dishes ---
+def find_similar_dishes(dataset: NutritionDataset, dish_name: str, limit: int = SIMILAR_DISHES_LIMIT,
+                        category: Optional[str] = None, same_category: bool = True, region: Optional[str] = None,
+                        dietary_type: str = "any", lighter: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Dishes whose per-serving nutrient profile is closest to `dish_name`, from the similarity index.
+    Candidates are restricted to `category` (or the dish's own category when `same_category`), a region,
+    a diet, and with `lighter` to fewer calories than the dish. None when the dish is not found.
+    """
+    (row, match_type), = resolve_dish_rows(dataset, [dish_name])
+    if row is None:
+        return None
+    store = dataset.store
+    source = dataset.records([row])[0]
+
+    candidates = store.live.copy()
+    diet_mask = dataset.ranges.diet_mask(dietary_type)
+    if diet_mask is not None:
+        candidates &= diet_mask
+    # Other rows of the same dish are duplicates, not alternatives
+    candidates[dataset.index.exact_rows(nutrition_dish_key(source.get('Dish Name') or ''))] = False
+    candidates[row] = False
+
+    wanted_category = category or (source.get('Category') if same_category else None)
+    if wanted_category:
+        candidates &= np.isin(store.text_codes('Category'), dataset.ranges.matching_codes(
+            store, 'Category', lambda value: value.lower() == wanted_category.lower()
+        ))
+    if region and region != "Indian":
+        candidates &= np.isin(store.text_codes('Region'), dataset.ranges.matching_codes(
+            store, 'Region', lambda value: region.lower() in value.lower()
+        ))
+    if lighter:
+        calories = store.numeric_column('Calories (kcal)')
+        candidates &= calories < calories[row]  # NaN compares False
+
+    neighbours = dataset.similarity.nearest(row, limit, candidates)
+    records = dataset.records([neighbour for _, neighbour in neighbours])
+    return {
+        "dish": source,
+        "match_type": match_type,
+        "filters": {
+            "category": wanted_category,
+            "region": region,
+            "dietary_type": dietary_type,
+            "lighter": lighter,
+        },
+        "similar": [
+            {**record, "distance": round(distance, 3)}
+            for (distance, _), record in zip(neighbours, records)
+        ],
+    }
+
+def get_similar_dishes(dish_name: str, **filters) -> Optional[Dict[str, Any]]:
+    """
+    Cached find_similar_dishes on the current dataset.
+    Raises LookupError when no dataset is loaded; returns None when the dish is not found.
+    """
+    dataset = nutrition_dataset
+    if dataset is None:
+        raise LookupError("Nutrition database not loaded")
+    cache_key = ("similar", json.dumps([dish_name.lower().strip(), filters], sort_keys=True), dataset.version)
+
+    cached = nutrition_result_cache.get(cache_key)
+    if cached is not None:
+        return copy.deepcopy(cached)
+
+    result = find_similar_dishes(dataset, dish_name, **filters)
+    if result is not None:
+        nutrition_result_cache.put(cache_key, copy.deepcopy(result))
+    return result
+
+def format_similar_dishes(result: Dict[str, Any]) -> str:
+    """Markdown list of similar dishes, figures exactly as stored."""
+    dish = result["dish"]
+    kind = "Lighter alternatives" if result["filters"]["lighter"] else "Dishes with a similar nutrient profile"
+    lines = [
+        f"{kind} to **{dish.get('Dish Name')}** ({dish.get('Calories (kcal)')} kcal, "
+        f"P {dish.get('Protein (g)')}g, C {dish.get('Carbs (g)')}g, F {dish.get('Fat (g)')}g):",
+        "",
+    ]
+    for similar in result["similar"]:
+        lines.append(
+            f"- {similar.get('Dish Name')} ({similar.get('Region')}, {similar.get('Serving Size') or '1 serving'}): "
+            f"{similar.get('Calories (kcal)')} kcal, P {similar.get('Protein (g)')}g, "
+            f"C {similar.get('Carbs (g)')}g, F {similar.get('Fat (g)')}g, Fiber {similar.get('Fiber (g)')}g"
+        )
+    if not result["similar"]:
+        lines.append("- No matching dishes in the database")
+    return "\n".join(lines)
+
+# --- Nutrient Range Queries ---
+def _first_matches(sequences: List[np.ndarray], accept, k: int) -> np.ndarray:
+    """The first k rows of the ordered sequences that pass accept(rows), checked in growing chunks."""
+    found, count = [], 0
+    chunk = max(NUTRITION_QUERY_WALK_CHUNK, 4 * k)
+    for sequence in sequences:
+        start = 0
+        while start < len(sequence) and count < k:
+            part = sequence[start:start + chunk]
+            part = part[accept(part)]
+            found.append(part)
+            count += len(part)
+            start += chunk
+            chunk *= 2
+    return np.concatenate(found + [np.empty(0, dtype=np.int32)])[:k]
+
+def _codes_in(codes: np.ndarray, wanted: List[int]) -> np.ndarray:
+    """np.isin for string codes; a filter matches a handful of codes, so compare them directly."""
+    if len(wanted) > 8:
+        return np.isin(codes, wanted)
+    matched = np.zeros(len(codes), dtype=bool)
+    for code in wanted:
+        matched |= codes == code
+    return matched
+
+def query_nutrition(dataset: NutritionDataset, ranges: Dict[str, tuple], category: Optional[str] = None,
+                    region: Optional[str] = None, dietary_type: str = "any", sort_by: Optional[str] = None,
+                    descending: bool = False, limit: int = NUTRITION_QUERY_LIMIT) -> Dict[str, Any]:
+    """
+    Live dishes whose numeric columns fall within `ranges` ({column: (min, max)}, inclusive, either bound
+    optional) and that match the category (exact, case-insensitive), region (substring) and diet filters.
+    Ordered by (sort_by, row), reversed when descending, with rows missing sort_by last; sort_by defaults
+    to the first ranged column, else dataset order.
+
+    Candidates come from the narrowest run in the range index (a numeric range, or the category/region
+    rows) and the other predicates are checked on those rows only, so the cost follows that run rather
+    than the dataset. When the narrowest run is the sort column's own, it is walked in order and the
+    walk stops at `limit` matches; otherwise the first `limit` are selected by partition, not a sort.
+    """
+    store, index = dataset.store, dataset.ranges
+    sort_by = sort_by or next(iter(ranges), None)
+
+    text_filters = {}
+    if category:
+        text_filters['Category'] = index.matching_codes(
+            store, 'Category', lambda value: value.lower() == category.lower()
+        )
+    if region and region != "Indian":
+        text_filters['Region'] = index.matching_codes(store, 'Region', lambda value: region.lower() in value.lower())
+    diet_mask = index.diet_mask(dietary_type)
+
+    def accept(rows: np.ndarray) -> np.ndarray:
+        ok = store.live[rows]
+        for col, (low, high) in ranges.items():
+            values = store.numeric_column(col)[rows]
+            ok &= ~np.isnan(values)
+            if low is not None:
+                ok &= values >= low
+            if high is not None:
+                ok &= values <= high
+        for col, codes in text_filters.items():
+            ok &= _codes_in(store.text_codes(col)[rows], codes)
+        if diet_mask is not None:
+            ok &= diet_mask[rows]
+        return ok
+
+    def first(rows: np.ndarray, k: int) -> np.ndarray:
+        """The first k of the matched rows in query order."""
+        if sort_by is None:
+            return np.sort(rows)[:k]
+        values = store.numeric_column(sort_by)[rows].astype(np.float64)
+        missing = np.isnan(values)
+        key = np.where(missing, np.inf, -values if descending else values)
+        if len(rows) > k:
+            # Only keys up to the k-th smallest can make the cut; ties at the boundary are ordered below
+            keep = key <= np.partition(key, k - 1)[k - 1]
+            rows, key, missing = rows[keep], key[keep], missing[keep]
+        tiebreak = np.where(missing, rows, -rows) if descending else rows
+        return rows[np.lexsort((tiebreak, key))][:k]
+
+    wanted = limit + 1  # one extra tells whether there are more
+    appended_rows = np.arange(index.base_size, store.size, dtype=np.int32)
+    runs = {col: index.run(col, low, high) for col, (low, high) in ranges.items()}
+    runs.update({col: index.code_rows(col, codes) for col, codes in text_filters.items()})
+    narrowest = min(runs, key=lambda col: len(runs[col])) if runs else None
+
+    if narrowest is None and sort_by is None:
+        rows = _first_matches([np.arange(store.size, dtype=np.int32)], accept, wanted)
+    elif narrowest is None or narrowest == sort_by:
+        run = runs[sort_by] if sort_by in runs else index.run(sort_by)
+        sequences = [run[::-1] if descending else run]
+        if sort_by not in runs:
+            sequences.append(index.missing[sort_by])
+        rows = _first_matches(sequences, accept, wanted)
+        matched_appended = appended_rows[accept(appended_rows)]
+        if len(matched_appended):
+            rows = first(np.concatenate([rows, matched_appended]), wanted)
+    else:
+        candidates = np.concatenate([runs[narrowest], appended_rows])
+        rows = first(candidates[accept(candidates)], wanted)
+
+    return {
+        "results": dataset.records(rows[:limit].tolist()),
+        "count": min(len(rows), limit),
+        "has_more": len(rows) > limit,
+        "sort_by": sort_by,
+        "descending": descending,
+    }
+
+# --- Browse Pagination ---
+BROWSE_PAGE_SIZE = 50
+MAX_BROWSE_PAGE_SIZE = 200
+
+def encode_browse_cursor(generation: int, filters: List[str], last_row: int) -> str:
+    """Opaque cursor: the dataset generation, the filters being paged and the last row served."""
+    payload = json.dumps([generation, filters, last_row], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
 
-    # Sort by goal
-    if goal == "weight loss":
-        # Prefer low-calorie, high-fiber foods
-        filtered_df = filtered_df.sort_values(['Calories (kcal)', 'Fiber (g)'],
-                                              ascending=[True, False])
-    elif goal == "weight gain":
-        # Prefer high-calorie, high-protein foods
-        filtered_df = filtered_df.sort_values(['Calories (kcal)', 'Protein (g)'],
-                                              ascending=[False, False])
+def decode_browse_cursor(cursor: str) -> tuple:
+    """(generation, filters, last_row) from encode_browse_cursor; ValueError for anything else."""
+    try:
+        payload = base64.urlsafe_b64decode((cursor + '=' * (-len(cursor) % 4)).encode('ascii'))
+        generation, filters, last_row = json.loads(payload)
+    except Exception as e:
+        raise ValueError("Malformed cursor") from e
+    if not (isinstance(generation, int) and isinstance(filters, list) and isinstance(last_row, int)):
+        raise ValueError("Malformed cursor")
+    return generation, filters, last_row
+
+def browse_rows(dataset: NutritionDataset, category: Optional[str], region: Optional[str],
+                after_row: int, limit: int) -> tuple:
+    """
+    The next `limit` live rows after `after_row` in dataset order, matching the category exactly and
+    the region as a substring (both case-insensitive; "Indian" means every region, as elsewhere).
+    Returns (rows, has_more, total matching). Reads only the facets' row lists, so a page costs
+    O(page) rather than a scan.
+    """
+    store, facets = dataset.store, dataset.facets
+    if region == "Indian":
+        region = None
+    if category or region:
+        groups = []
+        if category:
+            groups.append(facets.value_rows('Category', category))
+        if region:
+            groups.append(facets.matching_rows('Region', lambda value: region.lower() in value))
+        rows = groups[0] if len(groups) == 1 else np.intersect1d(*groups, assume_unique=True)
+        start = int(np.searchsorted(rows, after_row, side='right'))
+        page = rows[start:start + limit + 1]
+        total = len(rows)
     else:
-        # General diet - balanced approach
-        filtered_df = filtered_df.sort_values('Fiber (g)', ascending=False)
+        found, start, span = [], after_row + 1, 2 * (limit + 1)
+        while start < store.size and sum(len(part) for part in found) <= limit:
+            found.append(np.flatnonzero(store.live[start:start + span]) + start)
+            start += span
+            span *= 2
+        page = np.concatenate(found + [np.empty(0, dtype=np.int64)])[:limit + 1]
+        total = len(store)
+    return page[:limit], len(page) > limit, total
+
+# --- Delta Sync ---
+def nutrition_sync_payload(dataset: NutritionDataset, since: Optional[str]) -> Dict[str, Any]:
+    """
+    Changes from content version `since` to `dataset`, in a compact tabular form: `columns` once, then
+    `upserts` as value arrays and `deletes` as dish keys (lowercased names). Clients drop every local
+    record whose dish key is upserted or deleted, then add the upserts. When `since` is missing, or
+    too old or unknown to the sync log (e.g. the data was reloaded), `full` is true and `upserts`
+    holds every record, replacing the local copy.
+    """
+    tags = [tag for tag, _ in dataset.sync_log]
+    store = dataset.store
+    if since in tags:
+        changed = set().union(*(keys for _, keys in dataset.sync_log[tags.index(since) + 1:]))
+        rows, deletes = [], []
+        for key in sorted(changed):
+            key_rows = dataset.index.exact_rows(key)
+            rows.extend(key_rows)
+            if not key_rows:
+                deletes.append(key)
+        full = False
+    else:
+        rows, deletes, full = np.flatnonzero(store.live).tolist(), [], True
 
-    return filtered_df.head(10).to_dict('records')
+    return {
+        "version": dataset.content_tag,
+        "since": since,
+        "full": full,
+        "columns": store.columns,
+        "upserts": [[record[col] for col in store.columns] for record in dataset.records(rows)],
+        "deletes": deletes,
+    }
 
 def format_nutrition_info(nutrition_record: Dict[str, Any]) -> str:
     """
@@ -292,6 +2723,336 @@ class SafeTracer(BaseCallbackHandler):
         except Exception as e:
             logging.error(f"❌ Error in on_chain_end callback: {e}")
 
+# --- Prompt Completion Cache ---
+PROMPT_CACHE_PATH = os.getenv("PROMPT_CACHE_PATH", "/tmp/aahar_prompt_cache.sqlite3")
+PROMPT_CACHE_TTL_SECONDS = float(os.getenv("PROMPT_CACHE_TTL_SECONDS", "86400"))
+PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "5000"))
+PROMPT_CACHE_MEMORY_ENTRIES = 256
+# Expired and least recently used rows are pruned every this many writes
+PROMPT_CACHE_PRUNE_EVERY = 100
+
+class PromptCompletionCache(BaseCache):
+    """
+    Content-addressed LLM completion cache: an in-memory LRU in front of a SQLite table, keyed on
+    sha256(model parameters + prompt). The model parameters LangChain passes in (`llm_string`)
+    include the model name and temperature. SQLite in WAL mode lets every uvicorn worker on the
+    host share one cache file. Attached to an LLM through its `cache` field, it covers direct
+    ainvoke calls and chains alike.
+    """
+    def __init__(self, path: str = PROMPT_CACHE_PATH, ttl_seconds: float = PROMPT_CACHE_TTL_SECONDS,
+                 max_entries: int = PROMPT_CACHE_MAX_ENTRIES, memory_entries: int = PROMPT_CACHE_MEMORY_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._memory = NutritionResultCache(max_entries=memory_entries, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        try:
+            self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, created_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+                "prompt_bytes INTEGER NOT NULL, generations TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed_at)")
+        except sqlite3.Error as e:
+            logging.warning(f"⚠️ Prompt cache database {path} unavailable, caching in memory only: {e}")
+            self._db = None
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def _saved(self, value: tuple):
+        # Prompt not sent plus completion not generated
+        self.bytes_saved += value[0] + sum(len(generation.text.encode('utf-8')) for generation in value[1])
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[List[Generation]]:
+        key = self._key(prompt, llm_string)
+        value = self._memory.get((key,))
+        if value is not None:
+            with self._lock:
+                self.memory_hits += 1
+                self._saved(value)
+            return list(value[1])
+
+        row = None
+        if self._db is not None:
+            now = time.time()
+            try:
+                with self._lock:
+                    row = self._db.execute(
+                        "SELECT prompt_bytes, generations FROM completions WHERE key = ? AND created_at > ?",
+                        (key, now - self.ttl_seconds)
+                    ).fetchone()
+                    if row is not None:
+                        self._db.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+            except sqlite3.Error as e:
+                logging.warning(f"⚠️ Prompt cache read failed: {e}")
+                row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            value = (row[0], tuple(Generation(**generation) for generation in json.loads(row[1])))
+            self.disk_hits += 1
+            self._saved(value)
+        self._memory.put((key,), value)
+        return list(value[1])
+
+    def update(self, prompt: str, llm_string: str, return_val: List[Generation]):
+        key = self._key(prompt, llm_string)
+        prompt_bytes = len(prompt.encode('utf-8'))
+        self._memory.put((key,), (prompt_bytes, tuple(return_val)))
+        if self._db is None:
+            return
+        generations = json.dumps([{"text": g.text, "generation_info": g.generation_info} for g in return_val])
+        now = time.time()
+        try:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO completions (key, created_at, accessed_at, prompt_bytes, generations) "
+                    "VALUES (?, ?, ?, ?, ?)", (key, now, now, prompt_bytes, generations)
+                )
+                self._writes += 1
+                if self._writes % PROMPT_CACHE_PRUNE_EVERY == 0:
+                    self._prune(now)
+        except sqlite3.Error as e:
+            logging.warning(f"⚠️ Prompt cache write failed: {e}")
+
+    def _prune(self, now: float):
+        """Drop expired rows, then the least recently used beyond max_entries. Caller holds the lock."""
+        self._db.execute("DELETE FROM completions WHERE created_at <= ?", (now - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM completions WHERE key IN "
+            "(SELECT key FROM completions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+        )
+
+    def clear(self, **kwargs):
+        self._memory.clear()
+        if self._db is not None:
+            with self._lock:
+                self._db.execute("DELETE FROM completions")
+
+    def stats(self) -> Dict[str, Any]:
+        entries = None
+        if self._db is not None:
+            try:
+                with self._lock:
+                    entries = self._db.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            except sqlite3.Error:
+                pass
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "path": self.path if self._db is not None else None,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+            }
+
+# --- Query Embedding Cache ---
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "/tmp/aahar_embedding_cache.sqlite3")
+EMBEDDING_CACHE_MEMORY_ENTRIES = 4096
+# Embeddings of a text never change for a given model; the TTL only bounds how long a stale model lingers
+EMBEDDING_CACHE_TTL_SECONDS = 30 * 86400
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+# Expired and least recently used rows are pruned every this many writes
+EMBEDDING_CACHE_PRUNE_EVERY = 500
+# A cache miss waits this long for concurrent misses to join its request; at most this many per request
+EMBEDDING_BATCH_WINDOW_SECONDS = 0.005
+EMBEDDING_MAX_BATCH = 64
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Wraps the embedding function given to Chroma so repeated retrieval queries skip the embedding
+    round-trip. Query embeddings are cached by model and normalized text (case and whitespace folded)
+    in an in-memory LRU in front of a SQLite table shared by the workers on the host.
+    Concurrent misses are coalesced: identical texts share one request, and distinct texts arriving
+    within EMBEDDING_BATCH_WINDOW_SECONDS go out as one batched call. Document embedding (indexing)
+    passes straight through.
+    """
+    def __init__(self, base: Embeddings, path: Optional[str] = EMBEDDING_CACHE_PATH,
+                 ttl_seconds: float = EMBEDDING_CACHE_TTL_SECONDS, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+                 memory_entries: int = EMBEDDING_CACHE_MEMORY_ENTRIES):
+        self.base = base
+        self.path = path
+        self.model = str(getattr(base, "model", type(base).__name__))
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._memory = NutritionResultCache(max_entries=memory_entries, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._inflight: Dict[str, Future] = {}
+        self._queue: List[tuple] = []
+        self._batching = False
+        self.stats_counter: Counter = Counter()
+        self._db = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, created_at REAL NOT NULL, "
+                    "vector BLOB NOT NULL, accessed_at REAL NOT NULL DEFAULT 0)"
+                )
+                columns = {row[1] for row in self._db.execute("PRAGMA table_info(query_embeddings)")}
+                if "accessed_at" not in columns:  # cache files written before rows were pruned
+                    self._db.execute("ALTER TABLE query_embeddings ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS query_embeddings_accessed ON query_embeddings (accessed_at)"
+                )
+            except sqlite3.Error as e:
+                logging.warning(f"⚠️ Embedding cache database {path} unavailable, caching in memory only: {e}")
+                self._db = None
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats_counter[name] += n
+
+    def _key(self, text: str) -> str:
+        normalized = " ".join(text.lower().split())
+        return hashlib.sha256(f"{self.model}\n{normalized}".encode('utf-8')).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self._memory.get((key,))
+        if vector is not None:
+            self._count("memory_hits")
+            return list(vector)
+        vector = self._disk_get(key)
+        if vector is not None:
+            self._count("disk_hits")
+            self._memory.put((key,), vector)
+            return list(vector)
+        return list(self._embed_coalesced(key, text))
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        if self._db is None:
+            return None
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT vector FROM query_embeddings WHERE key = ? AND created_at > ?",
+                    (key, now - self.ttl_seconds)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE query_embeddings SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logging.warning(f"⚠️ Embedding cache read failed: {e}")
+            return None
+        return tuple(np.frombuffer(row[0], dtype=np.float32).tolist()) if row else None
+
+    def _store(self, key: str, vector: tuple):
+        self._memory.put((key,), vector)
+        if self._db is None:
+            return
+        now = time.time()
+        try:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, created_at, vector, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, now, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                )
+                self._writes += 1
+                if self._writes % EMBEDDING_CACHE_PRUNE_EVERY == 0:
+                    self._prune(now)
+        except sqlite3.Error as e:
+            logging.warning(f"⚠️ Embedding cache write failed: {e}")
+
+    def _prune(self, now: float):
+        """Drop expired rows, then the least recently used beyond max_entries. Caller holds the lock."""
+        self._db.execute("DELETE FROM query_embeddings WHERE created_at <= ?", (now - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM query_embeddings WHERE key IN "
+            "(SELECT key FROM query_embeddings ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+        )
+
+    def _embed_coalesced(self, key: str, text: str) -> tuple:
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats_counter["coalesced"] += 1
+                lead = False
+            else:
+                self.stats_counter["misses"] += 1
+                future = Future()
+                self._inflight[key] = future
+                self._queue.append((key, text, future))
+                lead = not self._batching
+                self._batching = self._batching or lead
+        if lead:
+            # This caller sends the batches, including misses that arrive while it waits
+            time.sleep(EMBEDDING_BATCH_WINDOW_SECONDS)
+            self._drain()
+        return future.result()
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                batch, self._queue = self._queue[:EMBEDDING_MAX_BATCH], self._queue[EMBEDDING_MAX_BATCH:]
+                if not batch:
+                    self._batching = False
+                    return
+            try:
+                vectors = self._embed_batch([text for _, text, _ in batch])
+                self._count("batches")
+                self._count("batched_texts", len(batch))
+                for (key, _, future), vector in zip(batch, vectors):
+                    vector = tuple(float(value) for value in vector)
+                    self._store(key, vector)
+                    future.set_result(vector)
+            except Exception as e:
+                self._count("errors")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                with self._lock:
+                    for key, _, _ in batch:
+                        self._inflight.pop(key, None)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) == 1:
+            return [self.base.embed_query(texts[0])]
+        if isinstance(self.base, GoogleGenerativeAIEmbeddings):
+            # One batch request, with the query task type so the vectors match embed_query's
+            return self.base.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+        return self.base.embed_documents(texts)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self.stats_counter)
+        hits = counts.get("memory_hits", 0) + counts.get("disk_hits", 0)
+        lookups = hits + counts.get("misses", 0) + counts.get("coalesced", 0)
+        batches = counts.get("batches", 0)
+        return {
+            "model": self.model,
+            "path": self.path if self._db is not None else None,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            **counts,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "avg_batch_size": round(counts.get("batched_texts", 0) / batches, 2) if batches else 0.0,
+        }
+
 # --- Consolidated: Vector Database Setup & Download ---
 def download_and_extract_db_for_app():
     """
@@ -332,19 +3093,26 @@ def download_and_extract_db_for_app():
 
 def setup_vector_database(chroma_db_directory: str = "/tmp/chroma_db", in_memory: bool = False):
     """
-    Initializes Chroma vector database using Gemini embeddings.
+    Initializes Chroma vector database using Gemini embeddings, behind the query embedding cache.
+    EMBEDDINGS_BACKEND=local uses the offline LocalHashingEmbedder instead (tests; its vectors
+    don't match a database built with Gemini embeddings, so pair it with in_memory=True).
     """
     try:
-        logging.info("🔧 Initializing Gemini Embeddings...")
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise EnvironmentError("GEMINI_API_KEY not set in environment variables.")
-
-        embedding = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=api_key
-        )
-        logging.info("✅ Gemini Embeddings loaded.")
+        if os.getenv("EMBEDDINGS_BACKEND", "gemini").strip().lower() == "local":
+            logging.info("🔧 Using local hashing embeddings (offline).")
+            base_embedding = LocalHashingEmbedder()
+        else:
+            logging.info("🔧 Initializing Gemini Embeddings...")
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise EnvironmentError("GEMINI_API_KEY not set in environment variables.")
+
+            base_embedding = GoogleGenerativeAIEmbeddings(
+                model="models/embedding-001",
+                google_api_key=api_key
+            )
+            logging.info("✅ Gemini Embeddings loaded.")
+        embedding = CachedQueryEmbeddings(base_embedding)
 
         persist_path = None if in_memory else chroma_db_directory
 
@@ -367,65 +3135,242 @@ def setup_vector_database(chroma_db_directory: str = "/tmp/chroma_db", in_memory
         raise
 
 # --- Consolidated: Groq Integration ---
-def cached_groq_answers(query: str, groq_api_key: str, dietary_type: str, goal: str, region: str) -> dict:
+GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_MODEL_MAP = {
+    "llama": "llama3-70b-8192",
+    "gemma": "gemma2-9b-it",
+    "mixtral": "mixtral-8x7b-32768",
+    "llama_instant": "llama-3.1-8b-instant"
+}
+GROQ_MODEL_LABELS = {
+    "llama": "LLaMA",
+    "gemma": "Gemma",
+    "mixtral": "Mixtral",
+    "llama_instant": "LLaMA Instant"
+}
+# Seconds to wait for each model's answer; the small models should be quick or not at all
+GROQ_MODEL_TIMEOUTS = {
+    "llama": 20.0,
+    "gemma": 12.0,
+    "mixtral": 20.0,
+    "llama_instant": 8.0
+}
+GROQ_PRIMARY_MODELS = ["llama", "gemma", "mixtral"]
+GROQ_CACHE_TTL_SECONDS = 3600
+
+# Quorum fan-out: answer once GROQ_QUORUM models have succeeded or GROQ_DEADLINE_SECONDS have passed.
+# The merge prompt treats missing models as "N/A". GROQ_QUORUM=3 waits for every model (up to the deadline).
+GROQ_QUORUM = int(os.getenv("GROQ_QUORUM", "2"))
+GROQ_DEADLINE_SECONDS = float(os.getenv("GROQ_DEADLINE_SECONDS", "10"))
+# Backup model asked when the quorum is still short after GROQ_HEDGE_AFTER_SECONDS, or can no longer
+# be reached from the models in flight. An empty GROQ_HEDGE_MODEL disables hedging.
+GROQ_HEDGE_MODEL = os.getenv("GROQ_HEDGE_MODEL", "llama_instant")
+GROQ_HEDGE_AFTER_SECONDS = float(os.getenv("GROQ_HEDGE_AFTER_SECONDS", "4"))
+# A model that failed this many times in a row, or whose typical latency is past the deadline,
+# is skipped until GROQ_MODEL_COOLDOWN_SECONDS after its last call; then one request probes it again.
+GROQ_MODEL_MAX_FAILURES = 3
+GROQ_MODEL_COOLDOWN_SECONDS = 60
+GROQ_LATENCY_EWMA_ALPHA = 0.2
+
+class GroqModelHealth:
+    """Per-model call counts, error counts and smoothed latency, deciding which models are worth querying."""
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model_name: str) -> Dict[str, Any]:
+        return self._stats.setdefault(model_name, {
+            "calls": 0, "errors": 0, "consecutive_failures": 0, "skipped": 0,
+            "latency_ewma": None, "last_call_at": 0.0,
+        })
+
+    def record(self, model_name: str, latency: float, ok: bool):
+        with self._lock:
+            stats = self._model(model_name)
+            stats["calls"] += 1
+            stats["last_call_at"] = time.monotonic()
+            if ok:
+                stats["consecutive_failures"] = 0
+                previous = stats["latency_ewma"]
+                stats["latency_ewma"] = latency if previous is None else (
+                    GROQ_LATENCY_EWMA_ALPHA * latency + (1 - GROQ_LATENCY_EWMA_ALPHA) * previous)
+            else:
+                stats["errors"] += 1
+                stats["consecutive_failures"] += 1
+
+    def available(self, model_name: str) -> bool:
+        with self._lock:
+            stats = self._model(model_name)
+            unhealthy = (stats["consecutive_failures"] >= GROQ_MODEL_MAX_FAILURES
+                         or (stats["latency_ewma"] or 0.0) > GROQ_DEADLINE_SECONDS)
+            if unhealthy and time.monotonic() - stats["last_call_at"] < GROQ_MODEL_COOLDOWN_SECONDS:
+                stats["skipped"] += 1
+                return False
+            if unhealthy:
+                # Let exactly one probe through per cooldown
+                stats["last_call_at"] = time.monotonic()
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                model_name: {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "consecutive_failures": stats["consecutive_failures"],
+                    "skipped": stats["skipped"],
+                    "latency_ewma_ms": round(stats["latency_ewma"] * 1000, 1) if stats["latency_ewma"] is not None else None,
+                }
+                for model_name, stats in self._stats.items()
+            }
+
+groq_model_health = GroqModelHealth()
+# Stragglers past the quorum keep running to fill the cache; held here so they aren't garbage collected
+_groq_background_tasks: set = set()
+
+# Successful answers only, per model: a failed model is retried on the next request
+groq_answer_cache = NutritionResultCache(max_entries=1024, ttl_seconds=GROQ_CACHE_TTL_SECONDS)
+_groq_client: Optional[httpx.AsyncClient] = None
+_groq_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_groq_client() -> httpx.AsyncClient:
+    """Shared keep-alive connection pool for Groq calls, created on the running event loop."""
+    global _groq_client, _groq_client_loop
+    loop = asyncio.get_running_loop()
+    if _groq_client is None or _groq_client_loop is not loop:
+        _groq_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60),
+            timeout=httpx.Timeout(max(GROQ_MODEL_TIMEOUTS.values()), connect=5.0),
+        )
+        _groq_client_loop = loop
+    return _groq_client
+
+async def close_groq_client():
+    global _groq_client, _groq_client_loop
+    if _groq_client is not None:
+        await _groq_client.aclose()
+        _groq_client, _groq_client_loop = None, None
+
+async def groq_diet_answer(model_name: str, query: str, groq_api_key: str, dietary_type: str,
+                           goal: str, region: str) -> tuple:
+    """(answer, ok) from one Groq model; failures come back as an error string with ok False."""
+    actual_model_name = GROQ_MODEL_MAP.get(model_name.lower(), model_name)
+    prompt_content = (
+        f"User query: '{query}'. "
+        f"Provide a concise, practical {dietary_type} diet suggestion or food item "
+        f"for {goal}, tailored for a {region} Indian context. "
+        f"Focus on readily available ingredients. Be brief and to the point."
+    )
+    payload = {
+        "model": actual_model_name,
+        "messages": [{"role": "user", "content": prompt_content}],
+        "temperature": 0.5,
+        "max_tokens": 250
+    }
+    try:
+        response = await get_groq_client().post(
+            GROQ_API_URL,
+            headers={"Authorization": f"Bearer {groq_api_key}", "Content-Type": "application/json"},
+            json=payload,
+            timeout=GROQ_MODEL_TIMEOUTS.get(model_name, 30.0),
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        if data and data.get('choices') and data['choices'][0].get('message'):
+            return data['choices'][0]['message']['content'], True
+
+        return f"No suggestion from {actual_model_name}.", False
+
+    except Exception as e:
+        logging.error(f"Error from {model_name}: {e!r}")
+        return f"Error from {model_name}: {e!r}", False
+
+async def _tracked_groq_answer(model_name: str, query: str, groq_api_key: str, dietary_type: str,
+                               goal: str, region: str, cache_key: tuple) -> tuple:
+    """groq_diet_answer that records latency and errors, and caches a successful answer."""
+    started = time.monotonic()
+    answer, ok = await groq_diet_answer(model_name, query, groq_api_key, dietary_type, goal, region)
+    groq_model_health.record(model_name, time.monotonic() - started, ok)
+    if ok:
+        groq_answer_cache.put(cache_key + (model_name,), answer)
+    return answer, ok
+
+async def cached_groq_answers(query: str, groq_api_key: str, dietary_type: str, goal: str, region: str) -> dict:
     """
-    Fetches diet suggestions from multiple Groq models in parallel.
+    Fetches diet suggestions from the Groq models concurrently over a pooled async client.
+    Answers are cached per (query, dietary_type, goal, region, model) for GROQ_CACHE_TTL_SECONDS.
+    Returns as soon as GROQ_QUORUM models have answered or GROQ_DEADLINE_SECONDS have passed,
+    hedging to GROQ_HEDGE_MODEL when the quorum is slow or out of reach; models without an answer
+    by then are "N/A". Keys are the models that were asked (plus the hedge model, if used).
     """
     logging.info(f"Fetching Groq answers for query: '{query}', pref: '{dietary_type}', goal: '{goal}', region: '{region}'")
-    models = ["llama", "gemma", "mixtral"]
-    results = {}
+    models = GROQ_PRIMARY_MODELS
     if not groq_api_key:
         logging.warning("GROQ_API_KEY not available. Skipping Groq calls.")
         return {k: "Groq API key not available." for k in models}
 
-    def _groq_diet_answer_single(model_name: str):
-        try:
-            url = "https://api.groq.com/openai/v1/chat/completions"
-            headers = {"Authorization": f"Bearer {groq_api_key}", "Content-Type": "application/json"}
-            groq_model_map = {
-                "llama": "llama3-70b-8192",
-                "gemma": "gemma2-9b-it",
-                "mixtral": "mixtral-8x7b-32768"
-            }
-            actual_model_name = groq_model_map.get(model_name.lower(), model_name)
-
-            prompt_content = (
-                f"User query: '{query}'. "
-                f"Provide a concise, practical {dietary_type} diet suggestion or food item "
-                f"for {goal}, tailored for a {region} Indian context. "
-                f"Focus on readily available ingredients. Be brief and to the point."
-            )
-            payload = {
-                "model": actual_model_name,
-                "messages": [{"role": "user", "content": prompt_content}],
-                "temperature": 0.5,
-                "max_tokens": 250
-            }
-
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-
-            if data and data.get('choices') and data['choices'][0].get('message'):
-                return data['choices'][0]['message']['content']
-
-            return f"No suggestion from {actual_model_name}."
-
-        except Exception as e:
-            logging.error(f"Error from {model_name}: {e}")
-            return f"Error from {model_name}: {e}"
-
-    with ThreadPoolExecutor(max_workers=len(models)) as executor:
-        future_to_model = {executor.submit(_groq_diet_answer_single, name): name for name in models}
-        for future in future_to_model:
-            model_name = future_to_model[future]
-            try:
-                results[model_name] = future.result()
-            except Exception as e:
-                logging.error(f"ThreadPool error for {model_name}: {e}")
-                results[model_name] = f"Failed to get result: {e}"
+    cache_key = ("groq", " ".join(query.lower().split()), dietary_type, goal, region)
+    results = {model_name: "N/A" for model_name in models}
+    answered = 0
+    tasks: Dict[asyncio.Task, str] = {}
+    for model_name in models:
+        cached = groq_answer_cache.get(cache_key + (model_name,))
+        if cached is not None:
+            results[model_name] = cached
+            answered += 1
+        elif groq_model_health.available(model_name):
+            tasks[asyncio.create_task(_tracked_groq_answer(
+                model_name, query, groq_api_key, dietary_type, goal, region, cache_key))] = model_name
+        else:
+            results[model_name] = "N/A (model temporarily skipped)"
+    needed = min(GROQ_QUORUM, len(models))
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline, hedge_at = started + GROQ_DEADLINE_SECONDS, started + GROQ_HEDGE_AFTER_SECONDS
+    hedge_model = GROQ_HEDGE_MODEL if GROQ_HEDGE_MODEL in GROQ_MODEL_MAP and GROQ_HEDGE_MODEL not in models else None
+    pending = set(tasks)
+    while answered < needed:
+        now = loop.time()
+        if now >= deadline:
+            break
+        if hedge_model and (now >= hedge_at or answered + len(pending) < needed):
+            cached = groq_answer_cache.get(cache_key + (hedge_model,))
+            if cached is not None:
+                results[hedge_model] = cached
+                answered += 1
+            elif groq_model_health.available(hedge_model):
+                logging.info(f"🛡️ Hedging Groq request to {hedge_model} ({answered}/{needed} answers so far)")
+                task = asyncio.create_task(_tracked_groq_answer(
+                    hedge_model, query, groq_api_key, dietary_type, goal, region, cache_key))
+                tasks[task] = hedge_model
+                pending.add(task)
+                results[hedge_model] = "N/A"
+            hedge_model = None
+            continue
+        if not pending:
+            break
+        wake_at = min(deadline, hedge_at) if hedge_model else deadline
+        done, pending = await asyncio.wait(pending, timeout=max(wake_at - now, 0), return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            answer, ok = task.result()
+            results[tasks[task]] = answer
+            answered += ok
+
+    for task in pending:
+        _groq_background_tasks.add(task)
+        task.add_done_callback(_groq_background_tasks.discard)
+    logging.info(f"⚡ Groq: {answered}/{len(results)} answers in {loop.time() - started:.2f} s"
+                 + (f", not waiting for {sorted(tasks[task] for task in pending)}" if pending else ""))
     return results
 
+def format_groq_suggestions(groq_suggestions: dict) -> str:
+    """Lines for the merge prompt's additional-suggestions section, one per model."""
+    suggestions = {model_name: "N/A" for model_name in GROQ_PRIMARY_MODELS}
+    suggestions.update(groq_suggestions)
+    return "\n".join(f"- {GROQ_MODEL_LABELS.get(name, name)}: {answer}" for name, answer in suggestions.items())
+
 # --- Consolidated: LangChain Chain Definitions ---
 llm_chains_session_store = {}
 
@@ -479,7 +3424,9 @@ def setup_qa_chain(llm_gemini: GoogleGenerativeAI, db: Chroma, rag_prompt: Promp
 
         def retrieve_and_log_context(input_dict):
             """Helper to retrieve documents and log their content."""
-            docs = retriever.invoke(input_dict["query"])
+            docs = take_speculative_result("retrieval", input_dict["query"])
+            if docs is None:
+                docs = retriever.invoke(input_dict["query"])
             if not docs:
                 logging.warning(f"No documents retrieved for query: '{input_dict['query']}'")
             context_str = "\n\n".join(doc.page_content for doc in docs)
@@ -494,7 +3441,9 @@ def setup_qa_chain(llm_gemini: GoogleGenerativeAI, db: Chroma, rag_prompt: Promp
             region = input_dict.get("region", "Indian")
 
             # Search for specific foods mentioned in the query
-            nutrition_matches = search_nutrition_data(query, limit=3)
+            nutrition_matches = take_speculative_result("nutrition", query)
+            if nutrition_matches is None:
+                nutrition_matches = search_nutrition_data(query, limit=3)
 
             # Get regional suggestions
             regional_suggestions = get_regional_nutrition_suggestions(region, dietary_type, goal)
@@ -714,7 +3663,9 @@ async def tool_lookup_nutrition_facts(food_item: str) -> str:
     await asyncio.sleep(0.5)
 
     # Search the nutrition database first
-    nutrition_matches = search_nutrition_data(food_item, limit=3)
+    nutrition_matches = take_speculative_result("nutrition", food_item, wait=False)
+    if nutrition_matches is None:
+        nutrition_matches = search_nutrition_data(food_item, limit=3)
 
     if nutrition_matches:
         result = f"**Detailed Nutrition Information for '{food_item}':**\n\n"
@@ -767,15 +3718,56 @@ async def tool_get_nutrition_comparison(food_items: List[str]) -> str:
 
     comparison_result = "**Nutrition Comparison:**\n\n"
 
-    for food_item in food_items[:5]: # Limit to 5 items
-        matches = search_nutrition_data(food_item, limit=1)
-        if matches:
-            comparison_result += format_nutrition_info(matches[0]) + "\n" + "="*50 + "\n"
+    food_items = food_items[:5] # Limit to 5 items
+    for food_item, match in zip(food_items, resolve_dishes(food_items)):
+        if match:
+            comparison_result += format_nutrition_info(match) + "\n" + "="*50 + "\n"
         else:
             comparison_result += f"**{food_item}:** Nutrition data not available\n" + "="*50 + "\n"
 
     return comparison_result
 
+async def tool_plan_meals(tool_input: Dict[str, Any]) -> str:
+    """Day meal plan computed by the local optimizer; every figure comes from the database."""
+    logging.info(f"Executing tool: plan_meals with {tool_input}")
+
+    def target(key: str) -> Optional[float]:
+        value = _coerce_number(tool_input.get(key))
+        return value if value > 0 else None  # NaN compares False
+
+    targets = meal_plan_targets(
+        tool_input.get("goal", "diet"),
+        target("calories"), target("protein_g"), target("carbs_g"), target("fat_g")
+    )
+    plan = get_meal_plan(targets, tool_input.get("dietary_type", "any"), tool_input.get("region", "Indian"))
+    if plan is None:
+        return "The nutrition database is not available right now, so I can't build a meal plan."
+    return format_meal_plan(plan)
+
+async def tool_find_similar_dishes(tool_input: Dict[str, Any]) -> str:
+    """Nutritionally similar dishes (or lighter swaps) from the similarity index; no LLM call."""
+    logging.info(f"Executing tool: find_similar_dishes with {tool_input}")
+    dish = str(tool_input.get("dish") or "").strip()
+    if not dish:
+        return "Please tell me which dish you'd like alternatives for."
+
+    lighter = tool_input.get("lighter", False)
+    if isinstance(lighter, str):
+        lighter = lighter.strip().lower() in ("true", "yes", "1")
+    try:
+        result = get_similar_dishes(
+            dish,
+            same_category=True,
+            region=tool_input.get("region"),
+            dietary_type=tool_input.get("dietary_type", "any"),
+            lighter=bool(lighter),
+        )
+    except LookupError:
+        return "The nutrition database is not available right now, so I can't look for similar dishes."
+    if result is None:
+        return f"I couldn't find '{dish}' in the nutrition database."
+    return format_similar_dishes(result)
+
 # --- Agentic Orchestration Models ---
 class AgentAction(BaseModel):
     """Represents the action the AI Agent decides to take."""
@@ -784,6 +3776,322 @@ class AgentAction(BaseModel):
     tool_input: Optional[Dict[str, Any]] = Field(None, description="Parameters for the selected tool.")
     final_answer: Optional[str] = Field(None, description="The final answer to the user's request.")
 
+# --- Local Intent Router ---
+# Obvious greetings, identity questions and single-dish nutrition lookups are dispatched without the
+# orchestrator LLM call. LOCAL_ROUTER_ENABLED=false sends every query to the orchestrator again.
+LOCAL_ROUTER_ENABLED = os.getenv("LOCAL_ROUTER_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+LOCAL_ROUTER_THRESHOLD = float(os.getenv("LOCAL_ROUTER_THRESHOLD", "0.85"))
+
+GREETING_PHRASES = {
+    "hi", "hii", "hiii", "hello", "helo", "hey", "heya", "hey there", "hi there", "hello there", "namaste",
+    "namaskar", "namaskaram", "vanakkam", "good morning", "good afternoon", "good evening", "greetings", "yo", "hola",
+}
+IDENTITY_PHRASES = {
+    "who are you", "what are you", "what is your name", "whats your name", "who made you", "who created you",
+    "who built you", "who developed you", "introduce yourself", "tell me about yourself", "are you a bot",
+    "are you an ai", "what is aahar", "who is aahar",
+}
+# Greeting and identity phrases may be followed by these ("hi aahar", "who are you bro")
+ROUTER_TRAILING_WORDS = ("aahar", "there", "bot", "buddy", "bro", "friend", "please")
+
+NUTRIENT_WORDS = (r"(?:calories|calorie|kcal|protein|proteins|carbs|carbohydrates|fat|fats|fiber|fibre|sugar|sodium|"
+                  r"nutrition facts|nutritional value|nutritional info|nutrition info|nutrition|nutrients|macros)")
+NUTRITION_LOOKUP_PATTERNS = [
+    # "calories in roti", "how much protein in a dosa", "nutrition facts of paneer tikka"
+    re.compile(rf"^(?:what (?:is|are) (?:the )?|how (?:many|much) |tell me (?:the )?|show (?:me )?(?:the )?)?"
+               rf"{NUTRIENT_WORDS}(?: are| is| count| content)? (?:in|of|for) (?:a |an |the |one |1 )?(?P<food>.+)$"),
+    # "how many calories does a samosa have"
+    re.compile(rf"^how (?:many|much) {NUTRIENT_WORDS} (?:does|do|is|are) (?:there in )?(?:a |an |the |one |1 )?"
+               rf"(?P<food>.+?)(?: have| has| contain| contains)?$"),
+    # "roti calories", "paneer tikka nutrition"
+    re.compile(rf"^(?P<food>.+?) {NUTRIENT_WORDS}$"),
+]
+# Dish text that is really several dishes, a comparison or a plan request: leave those to the orchestrator
+NON_LOOKUP_WORDS = re.compile(r"\b(?:vs|versus|and|or|compare|compared|comparison|with|diet|plan|recipe|meal|week|day)\b")
+# Words that don't name a dish on their own ("low fat", "more protein", "calories in it", "veg protein")
+ROUTER_FOOD_STOPWORDS = {
+    "a", "an", "the", "one", "some", "any", "my", "your", "much", "many", "low", "high", "no", "less", "more",
+    "rich", "free", "zero", "extra", "it", "that", "this", "these", "those", "them", "veg", "vegetarian", "vegan",
+    "non", "nonveg", "healthy", "good", "best", "food", "foods", "dish", "dishes", "total", "daily",
+}
+
+local_router_stats: Counter = Counter()
+
+def classify_query_intent(query: str) -> Optional[tuple]:
+    """
+    (tool_name, tool_input, confidence, reason) for queries the rules recognise, else None.
+    Greetings and identity questions must match a known phrase exactly; nutrition lookups must name
+    a dish from the database. Only an exact dish name, or dish-name tokens that all match whole
+    tokens with at least one real word among them, score above LOCAL_ROUTER_THRESHOLD.
+    """
+    cleaned = " ".join(clean_query(query).split())
+    if not cleaned:
+        return None
+
+    phrase = cleaned
+    for word in ROUTER_TRAILING_WORDS:
+        phrase = phrase.removesuffix(f" {word}")
+    if phrase in GREETING_PHRASES:
+        return "handle_greeting", {}, 1.0, f"greeting phrase '{phrase}'"
+    if phrase in IDENTITY_PHRASES:
+        return "handle_identity", {}, 1.0, f"identity phrase '{phrase}'"
+
+    dataset = nutrition_dataset
+    if dataset is None:
+        return None
+    for pattern in NUTRITION_LOOKUP_PATTERNS:
+        match = pattern.match(cleaned)
+        if not match:
+            continue
+        food = match.group("food").strip()
+        if dataset.index.exact_rows(nutrition_dish_key(food)):
+            return "lookup_nutrition_facts", {"food_item": food}, 0.95, f"exact dish name '{food}'"
+        if NON_LOOKUP_WORDS.search(food):
+            return None
+        food_tokens = _TOKEN_RE.findall(food)
+        if all(token in ROUTER_FOOD_STOPWORDS for token in food_tokens):
+            return None
+        if dataset.index.token_rows(food_tokens):
+            return "lookup_nutrition_facts", {"food_item": food}, 0.9, f"dish names with the words '{food}'"
+        if dataset.index.contains_rows(food):
+            return "lookup_nutrition_facts", {"food_item": food}, 0.75, f"dish names containing '{food}'"
+        _, rows = search_nutrition_rows(food, limit=1)
+        if rows:
+            return "lookup_nutrition_facts", {"food_item": food}, 0.6, f"fuzzy dish match for '{food}'"
+        return None
+    return None
+
+def route_query_locally(query: str) -> Optional[AgentAction]:
+    """
+    The first agent action for `query` when the local classifier is confident enough to skip the
+    orchestrator LLM, else None. Every decision is logged and counted (see /health).
+    """
+    if not LOCAL_ROUTER_ENABLED:
+        local_router_stats["disabled"] += 1
+        return None
+    intent = classify_query_intent(query)
+    if intent is None:
+        local_router_stats["no_match"] += 1
+        return None
+
+    tool_name, tool_input, confidence, reason = intent
+    if confidence < LOCAL_ROUTER_THRESHOLD:
+        local_router_stats["below_threshold"] += 1
+        logging.info(f"🧭 Local route skipped: {tool_name} ({reason}, confidence {confidence:.2f} "
+                     f"< {LOCAL_ROUTER_THRESHOLD:.2f}); asking the orchestrator")
+        return None
+    local_router_stats[f"routed:{tool_name}"] += 1
+    logging.info(f"🧭 Local route: {tool_name} ({reason}, confidence {confidence:.2f}), orchestrator skipped")
+    return AgentAction(thought=f"Routed locally: {reason}.", tool_name=tool_name, tool_input=tool_input)
+
+# --- Semantic Answer Cache ---
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+CHAT_CACHE_THRESHOLD = float(os.getenv("CHAT_CACHE_THRESHOLD", "0.9"))
+CHAT_CACHE_TTL_SECONDS = float(os.getenv("CHAT_CACHE_TTL_SECONDS", "21600"))
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1000"))
+
+# Answers from these tools depend only on the query, its parameters and the nutrition data.
+# reformat_diet_plan (session history) and get_weather_based_suggestion (live weather) are never cached.
+CHAT_CACHEABLE_TOOLS = {
+    "lookup_nutrition_facts", "get_nutrition_comparison", "fetch_recipe", "plan_meals", "find_similar_dishes",
+}
+# These read the session history too, so their answers are cached, and served, only on a session's first turn
+CHAT_FIRST_TURN_CACHEABLE_TOOLS = {"generate_diet_plan"}
+# Queries that refer back to the conversation can't be answered from another user's turn
+SESSION_REFERENCE_PATTERN = re.compile(
+    r"\b(?:previous|above|earlier|again|reformat|rewrite|those|these|last (?:one|answer|reply|plan|time)|"
+    r"same (?:one|plan|thing|again))\b")
+# Pronouns that refer back unless the query names a dish itself ("is this dosa healthy" is fine, "make it veg" isn't)
+SESSION_PRONOUN_PATTERN = re.compile(r"\b(?:it|this|that|same|them)\b")
+
+CHAT_QUERY_STOPWORDS = {
+    "a", "an", "the", "for", "to", "of", "in", "on", "me", "i", "im", "want", "need", "please", "can", "you",
+    "give", "suggest", "suggestion", "suggestions", "some", "my", "with", "and", "what", "is", "are", "should",
+    "eat", "food", "foods", "good", "best", "healthy", "indian",
+}
+CHAT_QUERY_SYNONYMS = {
+    "veg": "vegetarian", "veggie": "vegetarian", "nonveg": "nonvegetarian", "plan": "diet", "chart": "diet",
+    "menu": "diet", "meals": "diet", "meal": "diet", "lose": "loss", "losing": "loss", "reduce": "loss",
+    "gaining": "gain", "build": "gain", "muscles": "muscle", "recipes": "recipe",
+}
+
+def normalize_chat_query(query: str) -> str:
+    """Canonical word form of a chat query for embedding: synonyms folded, filler words dropped, order ignored."""
+    text = clean_query(query).replace("non veg", "nonveg")
+    words = {CHAT_QUERY_SYNONYMS.get(word, word) for word in text.split()}
+    return " ".join(sorted(words - CHAT_QUERY_STOPWORDS))
+
+class LocalHashingEmbedder(Embeddings):
+    """
+    Offline text embedder: signed feature hashing of words and character trigrams, L2-normalized.
+    A LangChain Embeddings, so a model-backed embedder can be swapped in (and it can stand in for
+    one, e.g. EMBEDDINGS_BACKEND=local); runs without network access (tests, local development).
+    """
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+
+    def _features(self, text: str) -> List[str]:
+        features = []
+        for word in text.split():
+            features.append(f"w:{word}")
+            padded = f"#{word}#"
+            features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self._features(text):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+            # Whole words count as much as all of a word's trigrams together
+            weight = 1.0 if feature.startswith("w:") else 0.25
+            vector[digest % self.dimensions] += weight if digest >> 63 else -weight
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+class SemanticAnswerCache:
+    """
+    Bounded LRU cache with a TTL mapping (query embedding, answer parameters) to a generated /chat
+    answer. A lookup hits when a stored query with exactly the same parameters has cosine similarity
+    of at least `threshold`, so paraphrases share one generated answer.
+    Until an embedder is set (at startup), every lookup misses and nothing is stored.
+    """
+    def __init__(self, embedder: Optional[Embeddings] = None, threshold: float = CHAT_CACHE_THRESHOLD, ttl_seconds: float = CHAT_CACHE_TTL_SECONDS,
+                 max_entries: int = CHAT_CACHE_MAX_ENTRIES):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # entry id -> (params, stored_at, unit vector, answer, tool); params -> ids of its entries
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._by_params: Dict[tuple, set] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embedder.embed_query(normalize_chat_query(query)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, entry_id: int):
+        params = self._entries.pop(entry_id)[0]
+        ids = self._by_params[params]
+        ids.discard(entry_id)
+        if not ids:
+            del self._by_params[params]
+
+    def lookup(self, query: str, params: tuple, exclude_tools: Iterable[str] = ()) -> Optional[str]:
+        """
+        The cached answer for a paraphrase of `query` with the same parameters, or None.
+        Answers produced by `exclude_tools` are skipped.
+        """
+        if self.embedder is None:
+            return None
+        try:
+            vector = self._embed(query)
+        except Exception as e:
+            logging.warning(f"⚠️ Semantic cache lookup skipped, embedding failed: {e}")
+            return None
+        with self._lock:
+            now = time.monotonic()
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_params.get(params, ())):
+                _, stored_at, stored_vector, _, tool = self._entries[entry_id]
+                if now - stored_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    self.expirations += 1
+                    continue
+                if tool in exclude_tools:
+                    continue
+                score = float(stored_vector @ vector)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            logging.info(f"🧠 Semantic cache hit (similarity {best_score:.3f})")
+            return self._entries[best_id][3]
+
+    def store(self, query: str, params: tuple, answer: str, tool: Optional[str] = None):
+        """Cache `answer` for `query` and `params`; `tool` is the tool that produced it."""
+        if self.embedder is None:
+            return
+        try:
+            vector = self._embed(query)
+        except Exception as e:
+            logging.warning(f"⚠️ Answer not cached, embedding failed: {e}")
+            return
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (params, time.monotonic(), vector, answer, tool)
+            self._by_params.setdefault(params, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_params.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": CHAT_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+# Startup points this at the query embeddings (Gemini behind the embedding cache, or the
+# LocalHashingEmbedder with EMBEDDINGS_BACKEND=local), so paraphrases are judged by a real model
+chat_answer_cache = SemanticAnswerCache()
+
+def chat_query_dishes(query: str) -> tuple:
+    """The words of `query` that occur in dish names, sorted: "rava masala dosa" and "masala dosa" differ."""
+    dataset = nutrition_dataset
+    if dataset is None:
+        return ()
+    words = {CHAT_QUERY_SYNONYMS.get(word, word) for word in _TOKEN_RE.findall(clean_query(query))}
+    words -= CHAT_QUERY_STOPWORDS | ROUTER_FOOD_STOPWORDS | {"like"}
+    return tuple(sorted(word for word in words if dataset.index.tokens.get(word).size))
+
+def chat_cache_params(query: str) -> Optional[tuple]:
+    """
+    Parameters a cached answer must match exactly: dietary type, goal, region, table format, the dishes
+    the query names and the nutrition data it was generated from. None when the query must bypass the cache.
+    """
+    cleaned = clean_query(query)
+    if not CHAT_CACHE_ENABLED or SESSION_REFERENCE_PATTERN.search(cleaned):
+        return None
+    dishes = chat_query_dishes(query)
+    if not dishes and SESSION_PRONOUN_PATTERN.search(cleaned):
+        return None
+    dataset = nutrition_dataset
+    return (
+        extract_diet_preference(query),
+        extract_diet_goal(query),
+        extract_regional_preference(query),
+        contains_table_request(query),
+        dishes,
+        dataset.content_tag if dataset is not None else None,
+    )
+
 # --- Enhanced Orchestrator Prompt ---
 ORCHESTRATOR_PROMPT_TEMPLATE = """
 You are AAHAR, an intelligent AI agent specialized in Indian diet and nutrition with access to a comprehensive nutrition database.
@@ -805,6 +4113,10 @@ Available Tools:
     - Input: `food_items` (list of food names)
 8. **get_weather_based_suggestion**: Weather-appropriate food suggestions
     - Input: `city`
+9. **plan_meals**: Build a full day's meal plan that meets calorie/macro targets, computed exactly from the database
+    - Input: `calories`, `protein_g`, `carbs_g`, `fat_g` (all optional), `dietary_type`, `goal`, `region`
+10. **find_similar_dishes**: Find dishes with a similar nutrient profile, or lighter swaps for a dish
+    - Input: `dish`, `lighter` (true for lighter/healthier alternatives), `dietary_type`, `region`
 
 **Current State:**
 Chat History: {chat_history}
@@ -814,7 +4126,9 @@ Agent Scratchpad: {agent_scratchpad}
 **Decision Making:**
 - If user asks for nutrition facts or comparisons, use lookup_nutrition_facts or get_nutrition_comparison
 - If user asks for recipes, use fetch_recipe (will include nutrition data)
-- For diet plans, use generate_diet_plan (enhanced with nutrition database)
+- For a day's meal plan, or whenever the user gives calorie or macro targets, use plan_meals
+- For "something like X" or a lighter/healthier alternative to a dish, use find_similar_dishes
+- For general diet advice, use generate_diet_plan (enhanced with nutrition database)
 - For weather-based suggestions, use get_weather_based_suggestion
 - If you've executed a tool that answers the user's query, set final_answer and stop
 - Always provide nutritionally accurate information using the database
@@ -827,6 +4141,19 @@ ORCHESTRATOR_PROMPT = PromptTemplate(
     input_variables=["chat_history", "query", "agent_scratchpad"]
 )
 
+MEAL_PLAN_INTRO_PROMPT = PromptTemplate(
+    input_variables=["query", "meal_plan"],
+    template="""
+You are AAHAR, an Indian diet and nutrition assistant. The meal plan below was computed from our nutrition database
+for the user's request: "{query}"
+
+{meal_plan}
+
+Write a warm 2-3 sentence introduction to this plan and one practical tip. Do not repeat the plan, do not list dishes
+and do not state any numbers: the plan is shown to the user exactly as computed, right after your text.
+"""
+)
+
 # --- Weather Tool ---
 def get_weather(city: str) -> Optional[Dict[str, Any]]:
     """Fetch current weather data for a given city using OpenWeatherMap."""
@@ -881,13 +4208,50 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 app.add_middleware(SessionMiddleware, secret_key=FASTAPI_SECRET_KEY)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+def nutrition_etag(dataset: "NutritionDataset") -> str:
+    """
+    Validator for every /nutrition/* GET served from `dataset`. The content tag keeps it from matching
+    other data after a restart (versions restart at 1); the version covers per-process fields in
+    bodies, such as dataset_version and browse cursors. Weak, since gzip changes the bytes.
+    """
+    return f'W/"{dataset.content_tag}.{dataset.version}"'
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison against an If-None-Match header value."""
+    opaque = etag.removeprefix('W/')
+    candidates = [value.strip() for value in if_none_match.split(',')]
+    return any(value == '*' or value.removeprefix('W/') == opaque for value in candidates)
+
+@app.middleware("http")
+async def nutrition_conditional_get(request: Request, call_next):
+    """
+    ETag / 304 Not Modified for the read-only /nutrition/* GET endpoints, whose responses depend only
+    on the URL and the dataset. A matching If-None-Match is answered without running the endpoint.
+    """
+    dataset = nutrition_dataset
+    if request.method not in ("GET", "HEAD") or not request.url.path.startswith("/nutrition/") or dataset is None:
+        return await call_next(request)
+
+    headers = {"ETag": nutrition_etag(dataset), "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
 
 # Global variables for initialized components
 llm_gemini: Optional[GoogleGenerativeAI] = None
+prompt_completion_cache: Optional[PromptCompletionCache] = None
 llm_orchestrator: Optional[GoogleGenerativeAI] = None
 db: Optional[Chroma] = None
+query_embeddings: Optional[CachedQueryEmbeddings] = None
+rag_retriever: Optional[Any] = None
 rag_prompt: Optional[PromptTemplate] = None
 qa_chain: Optional[Any] = None
 conversational_qa_chain: Optional[Any] = None
@@ -899,7 +4263,7 @@ weather_suggestion_prompt: Optional[PromptTemplate] = None
 @app.on_event("startup")
 async def startup_event():
     """Enhanced startup with nutrition dataset loading."""
-    global llm_gemini, llm_orchestrator, db, rag_prompt, qa_chain, conversational_qa_chain, \
+    global llm_gemini, prompt_completion_cache, llm_orchestrator, db, query_embeddings, rag_retriever, rag_prompt, qa_chain, conversational_qa_chain, \
            merge_prompt_default, merge_prompt_table, orchestrator_chain, weather_suggestion_prompt
 
     try:
@@ -910,10 +4274,13 @@ async def startup_event():
         if not GEMINI_API_KEY:
             raise EnvironmentError("GEMINI_API_KEY is not set.")
 
+        # Merge, weather, meal-analysis and RAG prompts repeat across users: serve repeats from the cache
+        prompt_completion_cache = PromptCompletionCache()
         llm_gemini = GoogleGenerativeAI(
             model="gemini-2.0-flash",
             google_api_key=GEMINI_API_KEY,
-            temperature=0.5
+            temperature=0.5,
+            cache=prompt_completion_cache
         )
         llm_orchestrator = GoogleGenerativeAI(
             model="gemini-2.0-flash",
@@ -927,7 +4294,9 @@ async def startup_event():
 
     try:
         download_and_extract_db_for_app()
-        db, _ = setup_vector_database(chroma_db_directory="/tmp/chroma_db")
+        db, query_embeddings = setup_vector_database(chroma_db_directory="/tmp/chroma_db")
+        chat_answer_cache.embedder = query_embeddings
+        rag_retriever = db.as_retriever(search_kwargs={"k": 5})
         logging.info("✅ Vector DB initialized.")
     except Exception as e:
         logging.error(f"❌ Vector DB init error: {e}", exc_info=True)
@@ -998,6 +4367,183 @@ async def startup_event():
         logging.error(f"❌ Component setup error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Component initialization failed.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close pooled HTTP connections."""
+    await close_groq_client()
+
+# --- Speculative Prefetch ---
+# While the orchestrator LLM decides, the context the usual tools need is fetched from the raw query:
+# Chroma retrieval (RAG chain) and the nutrition search (RAG chain, lookup_nutrition_facts).
+SPECULATIVE_PREFETCH_ENABLED = os.getenv("SPECULATIVE_PREFETCH_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+SPECULATIVE_TOOLS = {"generate_diet_plan", "lookup_nutrition_facts"}
+# How long a consumer waits for an in-flight prefetch before doing the work itself
+SPECULATIVE_WAIT_SECONDS = 15.0
+
+_speculation_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculate")
+current_speculation: ContextVar[Optional["SpeculativePrefetch"]] = ContextVar("current_speculation", default=None)
+speculation_stats: Counter = Counter()
+
+class SpeculativePrefetch:
+    """Prefetches for one /chat turn, consumed through take_speculative_result or discarded by finish()."""
+    def __init__(self, query: str):
+        self.key = query.lower().strip()
+        self.futures: Dict[str, Future] = {
+            "nutrition": _speculation_executor.submit(search_nutrition_data, query, 3)
+        }
+        if rag_retriever is not None:
+            self.futures["retrieval"] = _speculation_executor.submit(rag_retriever.invoke, query)
+        self.used: set = set()
+        self.finished = False
+        speculation_stats["started"] += len(self.futures)
+
+    def take(self, kind: str, query: str, wait: bool = True) -> Optional[Any]:
+        future = self.futures.get(kind)
+        if future is None or self.finished or kind in self.used or query.lower().strip() != self.key:
+            return None
+        if not wait and not future.done():
+            return None
+        self.used.add(kind)
+        try:
+            result = future.result(timeout=SPECULATIVE_WAIT_SECONDS)
+        except Exception as e:
+            logging.warning(f"⚠️ Speculative {kind} unusable, fetching again: {e!r}")
+            speculation_stats["failed"] += 1
+            return None
+        speculation_stats["hits"] += 1
+        speculation_stats[f"hits:{kind}"] += 1
+        return result
+
+    def finish(self):
+        """Cancel whatever was not consumed; work already running is left to finish and counted as waste."""
+        if self.finished:
+            return
+        self.finished = True
+        for kind, future in self.futures.items():
+            if kind in self.used:
+                continue
+            if future.cancel():
+                speculation_stats["cancelled"] += 1
+            else:
+                speculation_stats["wasted"] += 1
+                speculation_stats[f"wasted:{kind}"] += 1
+
+def take_speculative_result(kind: str, query: str, wait: bool = True) -> Optional[Any]:
+    """
+    The current turn's prefetched `kind` result if it was fetched for `query`, else None (do the work).
+    Pass wait=False on the event loop: an unfinished prefetch is then skipped rather than waited for.
+    """
+    speculation = current_speculation.get()
+    return speculation.take(kind, query, wait) if speculation is not None else None
+
+def speculation_report() -> Dict[str, Any]:
+    started = speculation_stats["started"]
+    return {
+        "enabled": SPECULATIVE_PREFETCH_ENABLED,
+        **dict(speculation_stats),
+        "hit_rate": round(speculation_stats["hits"] / started, 4) if started else 0.0,
+        "waste_rate": round(speculation_stats["wasted"] / started, 4) if started else 0.0,
+    }
+
+# --- Diet Plan Context Pipeline ---
+# Seconds each input of the diet-plan merge may take; a branch past its deadline contributes a placeholder
+DIET_PLAN_BRANCH_TIMEOUTS = {
+    "rag": 25.0,
+    "groq": GROQ_DEADLINE_SECONDS + 2.0,
+    "nutrition": 5.0
+}
+
+class PipelineTimings:
+    """Per-branch latency and outcome counts of a concurrent pipeline stage, reported in /health."""
+    def __init__(self):
+        self._branches: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, branch: str, seconds: float, outcome: str):
+        with self._lock:
+            stats = self._branches.setdefault(branch, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0, "outcomes": Counter()})
+            stats["calls"] += 1
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            stats["outcomes"][outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                branch: {
+                    "calls": stats["calls"],
+                    "avg_ms": round(stats["total_seconds"] / stats["calls"] * 1000, 1),
+                    "max_ms": round(stats["max_seconds"] * 1000, 1),
+                    "outcomes": dict(stats["outcomes"]),
+                }
+                for branch, stats in self._branches.items()
+            }
+
+diet_plan_timings = PipelineTimings()
+
+async def _timed_branch(timings: PipelineTimings, branch: str, awaitable, timeout: float, emit=None) -> tuple:
+    """(value, outcome) of one pipeline branch; outcome is "ok", "timeout" or "error". Reported to `emit` when done."""
+    started = time.perf_counter()
+    value, outcome = None, "ok"
+    try:
+        value = await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        logging.warning(f"⏱️ {branch} branch timed out after {timeout:.1f} s")
+    except Exception as e:
+        outcome = "error"
+        logging.error(f"❌ {branch} branch error: {e}", exc_info=True)
+    elapsed = time.perf_counter() - started
+    timings.record(branch, elapsed, outcome)
+    logging.info(f"⏱️ {branch}: {elapsed * 1000:.0f} ms ({outcome})")
+    if emit is not None:
+        await emit("context", {"branch": branch, "outcome": outcome, "ms": round(elapsed * 1000)})
+    return value, outcome
+
+def diet_plan_nutrition_context(user_params: Dict[str, str]) -> str:
+    nutrition_suggestions = get_regional_nutrition_suggestions(
+        user_params["region"], user_params["dietary_type"], user_params["goal"]
+    )
+    nutrition_context = ""
+    if nutrition_suggestions:
+        nutrition_context = "Detailed Nutrition Database Information:\n"
+        for item in nutrition_suggestions[:8]:
+            nutrition_context += format_nutrition_info(item) + "\n"
+    return nutrition_context
+
+async def gather_diet_plan_context(user_query: str, user_params: Dict[str, str], session_id: str,
+                                   emit=None) -> Dict[str, tuple]:
+    """
+    Runs the three independent inputs of the diet-plan merge concurrently, each under its own
+    timeout: the RAG answer, the Groq suggestions and the nutrition database context.
+    Returns {"rag" | "groq" | "nutrition": (value, outcome)}; value is None unless outcome is "ok".
+    """
+    async def rag():
+        return await conversational_qa_chain.ainvoke({
+            "query": user_query,
+            **user_params
+        }, config={
+            "callbacks": [SafeTracer()],
+            "configurable": {"session_id": session_id}
+        })
+
+    async def groq():
+        if not GROQ_API_KEY:
+            return {}
+        return await cached_groq_answers(query=user_query, groq_api_key=GROQ_API_KEY, **user_params)
+
+    branches = {
+        "rag": rag(),
+        "groq": groq(),
+        # In a worker thread, so its deadline holds even while the dataset is being rebuilt
+        "nutrition": asyncio.to_thread(diet_plan_nutrition_context, user_params),
+    }
+    results = await asyncio.gather(*(
+        _timed_branch(diet_plan_timings, name, awaitable, DIET_PLAN_BRANCH_TIMEOUTS[name], emit)
+        for name, awaitable in branches.items()
+    ))
+    return dict(zip(branches, results))
+
 # --- Request/Response Models ---
 class ChatRequest(BaseModel):
     query: str
@@ -1013,19 +4559,91 @@ class MealAnalysisResponse(BaseModel):
     found_dishes: List[Dict[str, Any]]
     not_found_dishes: List[str]
 
+# --- Models for Meal Log Rollup ---
+class LoggedMeal(BaseModel):
+    date: date
+    meal: Optional[str] = Field(default=None, description="Optional label such as 'breakfast' or 'dinner'")
+    dish_names: List[str]
 
-# --- API Endpoints ---
-@app.post("/chat")
-async def chat(chat_request: ChatRequest, request: Request):
-    """Enhanced chat endpoint with nutrition database integration."""
-    user_query = chat_request.query
-    client_session_id = chat_request.session_id
+class MealLogRollupRequest(BaseModel):
+    meals: List[LoggedMeal]
+
+# --- Models for Meal Plan Optimizer ---
+class MealSlotSpec(BaseModel):
+    name: str
+    calorie_share: float = Field(..., gt=0, le=1, description="Share of the day's targets this slot should cover")
+    courses: List[List[str]] = Field(..., description="One dish is picked per course, from the listed categories")
+
+class MealPlanRequest(BaseModel):
+    calories: Optional[float] = Field(default=None, gt=0, description="Day calorie target; defaults by goal")
+    protein_g: Optional[float] = Field(default=None, ge=0)
+    carbs_g: Optional[float] = Field(default=None, ge=0)
+    fat_g: Optional[float] = Field(default=None, ge=0)
+    dietary_type: str = "any"
+    goal: str = "diet"
+    region: str = "Indian"
+    slots: Optional[List[MealSlotSpec]] = Field(default=None, description="Defaults to breakfast, lunch, snack and dinner")
+
+class DishResolveRequest(BaseModel):
+    dish_names: List[str]
 
-    session_id = client_session_id or request.session.get("session_id") or f"session_{os.urandom(8).hex()}"
-    request.session["session_id"] = session_id
+class NutrientRangeFilter(BaseModel):
+    field: str  # "calories", "protein", ... or the column name, e.g. "Calories (kcal)"
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+class NutritionQueryRequest(BaseModel):
+    filters: List[NutrientRangeFilter] = []
+    category: Optional[str] = None
+    region: Optional[str] = None
+    dietary_type: str = "any"
+    sort_by: Optional[str] = None
+    descending: bool = False
+    limit: int = NUTRITION_QUERY_LIMIT
 
-    logging.info(f"📩 Query: '{user_query}' | Session: {session_id}")
+class NutritionDeltaRequest(BaseModel):
+    upsert: List[Dict[str, Any]] = Field(default_factory=list, description="Dish records to insert or replace, matched by 'Dish Name'")
+    delete: List[str] = Field(default_factory=list, description="Dish names to remove")
 
+
+# --- API Endpoints ---
+def llm_cache_key(llm: GoogleGenerativeAI) -> str:
+    """The llm_string LangChain keys an LLM's cache entries on for a call without stop words."""
+    params = llm.dict()
+    params["stop"] = None
+    return str(sorted(params.items()))
+
+async def generate_answer_text(emit, prompt: str, config: Optional[Dict[str, Any]] = None) -> str:
+    """llm_gemini completion of a user-facing answer; with `emit`, streamed to it as "token" events."""
+    if emit is None:
+        return await llm_gemini.ainvoke(prompt, config=config)
+
+    # astream bypasses the LLM's cache, so streamed answers look it up and fill it themselves;
+    # a cached completion is replayed as a single token
+    cache = prompt_completion_cache
+    llm_string = llm_cache_key(llm_gemini) if cache is not None else None
+    cached = await cache.alookup(prompt, llm_string) if cache is not None else None
+    if cached:
+        text = cached[0].text
+        await emit("token", {"text": text})
+        return text
+
+    chunks = []
+    async for chunk in llm_gemini.astream(prompt, config=config):
+        chunks.append(chunk)
+        await emit("token", {"text": chunk})
+    text = "".join(chunks)
+    if cache is not None and text:
+        await cache.aupdate(prompt, llm_string, [Generation(text=text)])
+    return text
+
+async def run_chat_turn(user_query: str, session_id: str, emit=None) -> str:
+    """
+    One /chat turn: local router, semantic cache or orchestrator, then the chosen tool.
+    Returns the answer; the caller records the turn in the session history.
+    `emit`, an optional async callback (event, data), receives progress events ("tool", "context")
+    and the answer text as "token" events while it is generated.
+    """
     response_text = "I'm sorry, I encountered an internal issue. Please try again."
 
     chat_history_lc = get_session_history(session_id).messages
@@ -1040,7 +4658,29 @@ async def chat(chat_request: ChatRequest, request: Request):
     max_agent_iterations = 6
     agent_scratchpad: List[Dict[str, Any]] = []
 
+    answered_by: Optional[str] = None
+    tool_failed = False
+    # The local router is free; the cache lookup embeds the query, so it only runs for unrouted queries
+    local_decision = route_query_locally(user_query)
+    routed_locally = local_decision is not None
+    cache_params = chat_cache_params(user_query) if not routed_locally else None
+    # On later turns, history-dependent answers from other sessions don't apply
+    excluded_tools = CHAT_FIRST_TURN_CACHEABLE_TOOLS if chat_history_lc else ()
+    # Embedding the query may call the model: keep it off the event loop
+    cached_answer = None
+    if cache_params:
+        cached_answer = await asyncio.to_thread(chat_answer_cache.lookup, user_query, cache_params, excluded_tools)
+
+    speculation: Optional[SpeculativePrefetch] = None
+    speculation_token = None
+
     try:
+        if cached_answer is not None:
+            local_decision = AgentAction(thought="Answered from the semantic cache.", final_answer=cached_answer)
+        if local_decision is None and SPECULATIVE_PREFETCH_ENABLED:
+            # Hide retrieval latency behind the orchestrator call
+            speculation = SpeculativePrefetch(user_query)
+            speculation_token = current_speculation.set(speculation)
         for i in range(max_agent_iterations):
             logging.info(f"🔄 Agent Iteration {i+1}/{max_agent_iterations}")
 
@@ -1049,16 +4689,27 @@ async def chat(chat_request: ChatRequest, request: Request):
                 for item in agent_scratchpad
             ])
 
-            orchestrator_decision: AgentAction = await orchestrator_chain.ainvoke({
-                "query": user_query,
-                "chat_history": formatted_chat_history,
-                "agent_scratchpad": scratchpad_str
-            }, config={
-                "callbacks": [SafeTracer()],
-                "configurable": {"session_id": session_id}
-            })
+            if i == 0 and local_decision is not None:
+                orchestrator_decision = local_decision
+            else:
+                orchestrator_decision: AgentAction = await orchestrator_chain.ainvoke({
+                    "query": user_query,
+                    "chat_history": formatted_chat_history,
+                    "agent_scratchpad": scratchpad_str
+                }, config={
+                    "callbacks": [SafeTracer()],
+                    "configurable": {"session_id": session_id}
+                })
 
             logging.info(f"✨ Decision (Iter {i+1}): Tool='{orchestrator_decision.tool_name}', Params={orchestrator_decision.tool_input}")
+            if speculation is not None and orchestrator_decision.tool_name not in SPECULATIVE_TOOLS:
+                speculation.finish()
+            if emit is not None:
+                source = "orchestrator"
+                if i == 0 and local_decision is not None:
+                    source = "cache" if cached_answer is not None else "local"
+                await emit("tool", {"tool": orchestrator_decision.tool_name, "input": orchestrator_decision.tool_input,
+                                    "source": source})
 
             if orchestrator_decision.final_answer:
                 response_text = orchestrator_decision.final_answer
@@ -1068,6 +4719,7 @@ async def chat(chat_request: ChatRequest, request: Request):
             tool_name = orchestrator_decision.tool_name
             tool_input = orchestrator_decision.tool_input if orchestrator_decision.tool_input is not None else {}
             tool_output = "Error: Tool execution failed."
+            answered_by = tool_name
 
             try:
                 if tool_name == "handle_greeting":
@@ -1106,7 +4758,8 @@ async def chat(chat_request: ChatRequest, request: Request):
                             for item in nutrition_suggestions[:5]:
                                 nutrition_context += f"- {item.get('Dish Name', 'Unknown')} ({item.get('Calories (kcal)', 'N/A')} kcal)\n"
 
-                        reformat_response_obj = await llm_gemini.ainvoke(
+                        tool_output = await generate_answer_text(
+                            emit,
                             merge_prompt_template.format(
                                 rag_section=f"Previous Answer to Reformat:\n{last_ai_message_content}",
                                 additional_suggestions_section="",
@@ -1115,7 +4768,6 @@ async def chat(chat_request: ChatRequest, request: Request):
                             ),
                             config={"callbacks": [SafeTracer()], "configurable": {"session_id": session_id}}
                         )
-                        tool_output = reformat_response_obj.content if isinstance(reformat_response_obj, AIMessage) else str(reformat_response_obj)
                         response_text = tool_output
                         break
                     else:
@@ -1132,65 +4784,60 @@ async def chat(chat_request: ChatRequest, request: Request):
                     }
                     wants_table_flag = tool_input.get("wants_table", False)
 
-                    rag_output_content = "Error from RAG."
-                    try:
-                        rag_result = await conversational_qa_chain.ainvoke({
-                            "query": user_query,
-                            **user_params
-                        }, config={
-                            "callbacks": [SafeTracer()],
-                            "configurable": {"session_id": session_id}
-                        })
-                        rag_output_content = str(rag_result)
-                    except Exception as e:
-                        logging.error(f"❌ RAG error: {e}", exc_info=True)
-                        rag_output_content = "Error retrieving from knowledge base."
-
-                    groq_suggestions = {}
-                    if GROQ_API_KEY:
-                        try:
-                            groq_suggestions = cached_groq_answers(
-                                query=user_query,
-                                groq_api_key=GROQ_API_KEY,
-                                **user_params
-                            )
-                        except Exception as e:
-                            logging.error(f"❌ Groq error: {e}", exc_info=True)
-                            groq_suggestions = {"llama": "Error", "gemma": "Error", "mixtral": "Error"}
+                    # RAG, Groq and the nutrition context are independent: fetch them concurrently
+                    context = await gather_diet_plan_context(user_query, user_params, session_id, emit)
 
-                    nutrition_suggestions = get_regional_nutrition_suggestions(
-                        user_params["region"], user_params["dietary_type"], user_params["goal"]
-                    )
-                    nutrition_context = ""
-                    if nutrition_suggestions:
-                        nutrition_context = "Detailed Nutrition Database Information:\n"
-                        for item in nutrition_suggestions[:8]:
-                            nutrition_context += format_nutrition_info(item) + "\n"
+                    rag_result, rag_outcome = context["rag"]
+                    rag_output_content = str(rag_result) if rag_outcome == "ok" else "Error retrieving from knowledge base."
+                    groq_suggestions, groq_outcome = context["groq"]
+                    if groq_outcome != "ok":
+                        groq_suggestions = {"llama": "Error", "gemma": "Error", "mixtral": "Error"}
+                    nutrition_context = context["nutrition"][0] or ""
+                    if rag_outcome != "ok" or groq_outcome != "ok":
+                        tool_failed = True
 
                     merge_prompt_template = merge_prompt_table if wants_table_flag else merge_prompt_default
                     try:
-                        merge_result_obj = await llm_gemini.ainvoke(
+                        tool_output = await generate_answer_text(
+                            emit,
                             merge_prompt_template.format(
                                 rag_section=f"Primary RAG Answer:\n{rag_output_content}",
-                                additional_suggestions_section=(
-                                    f"- LLaMA: {groq_suggestions.get('llama', 'N/A')}\n"
-                                    f"- Gemma: {groq_suggestions.get('gemma', 'N/A')}\n"
-                                    f"- Mixtral: {groq_suggestions.get('mixtral', 'N/A')}"
-                                ),
+                                additional_suggestions_section=format_groq_suggestions(groq_suggestions),
                                 nutrition_section=nutrition_context,
                                 **user_params
                             ),
                             config={"callbacks": [SafeTracer()], "configurable": {"session_id": session_id}}
                         )
-                        tool_output = merge_result_obj.content if isinstance(merge_result_obj, AIMessage) else str(merge_result_obj)
                         response_text = tool_output
                         break
                     except Exception as e:
                         logging.error(f"❌ Merge error: {e}", exc_info=True)
+                        tool_failed = True
                         tool_output = "Error generating comprehensive diet plan."
                         response_text = tool_output
                         break
 
+                elif tool_name == "plan_meals":
+                    plan_text = await tool_plan_meals(tool_input)
+                    # The figures are computed locally; the LLM only writes a short intro around them
+                    intro = ""
+                    try:
+                        intro = await generate_answer_text(
+                            emit,
+                            MEAL_PLAN_INTRO_PROMPT.format(query=user_query, meal_plan=plan_text),
+                            config={"callbacks": [SafeTracer()]}
+                        )
+                    except Exception as e:
+                        logging.error(f"❌ LLM error writing meal plan intro: {e}", exc_info=True)
+                    tool_output = f"{intro.strip()}\n\n{plan_text}".strip()
+                    response_text = tool_output
+                    break
+
+                elif tool_name == "find_similar_dishes":
+                    tool_output = await tool_find_similar_dishes(tool_input)
+                    response_text = tool_output
+                    break
+
                 elif tool_name == "fetch_recipe":
                     tool_output = await tool_fetch_recipe(tool_input.get("recipe_name", "unknown"))
                     response_text = tool_output
@@ -1223,7 +4870,8 @@ async def chat(chat_request: ChatRequest, request: Request):
                     dietary_type = extract_diet_preference(user_query)
                     goal = extract_diet_goal(user_query)
 
-                    suggestion_result_obj = await llm_gemini.ainvoke(
+                    tool_output = await generate_answer_text(
+                        emit,
                         weather_suggestion_prompt.format(
                             **weather_data,
                             dietary_type=dietary_type,
@@ -1232,7 +4880,6 @@ async def chat(chat_request: ChatRequest, request: Request):
                         ),
                         config={"callbacks": [SafeTracer()]}
                     )
-                    tool_output = suggestion_result_obj.content if isinstance(suggestion_result_obj, AIMessage) else str(suggestion_result_obj)
                     response_text = tool_output
                     break
 
@@ -1243,6 +4890,7 @@ async def chat(chat_request: ChatRequest, request: Request):
                     break
 
             except Exception as e:
+                tool_failed = True
                 tool_output = f"Error executing tool '{tool_name}': {e}"
                 logging.error(tool_output, exc_info=True)
                 response_text = tool_output
@@ -1262,9 +4910,36 @@ async def chat(chat_request: ChatRequest, request: Request):
     except ValidationError as e:
         logging.error(f"❌ Pydantic validation error: {e}", exc_info=True)
         response_text = "I received an invalid instruction from my internal system. Please try again."
+        tool_failed = True
     except Exception as e:
         logging.error(f"❌ Global error in /chat endpoint for session {session_id}: {e}", exc_info=True)
         response_text = "I'm experiencing a technical issue. Please try again later."
+        tool_failed = True
+    finally:
+        if speculation is not None:
+            speculation.finish()
+            current_speculation.reset(speculation_token)
+
+    cacheable = answered_by in CHAT_CACHEABLE_TOOLS or (
+        answered_by in CHAT_FIRST_TURN_CACHEABLE_TOOLS and not chat_history_lc)
+    if cache_params and cached_answer is None and cacheable and not tool_failed:
+        await asyncio.to_thread(chat_answer_cache.store, user_query, cache_params, response_text, answered_by)
+
+    return response_text
+
+def resolve_chat_session(chat_request: ChatRequest, request: Request) -> str:
+    session_id = chat_request.session_id or request.session.get("session_id") or f"session_{os.urandom(8).hex()}"
+    request.session["session_id"] = session_id
+    logging.info(f"📩 Query: '{chat_request.query}' | Session: {session_id}")
+    return session_id
+
+@app.post("/chat")
+async def chat(chat_request: ChatRequest, request: Request):
+    """Enhanced chat endpoint with nutrition database integration."""
+    user_query = chat_request.query
+    session_id = resolve_chat_session(chat_request, request)
+
+    response_text = await run_chat_turn(user_query, session_id)
 
     # Add messages to session history
     get_session_history(session_id).add_user_message(user_query)
@@ -1272,6 +4947,67 @@ async def chat(chat_request: ChatRequest, request: Request):
 
     return JSONResponse(content={"answer": response_text, "session_id": session_id})
 
+def format_sse(event: str, data: Dict[str, Any]) -> bytes:
+    return b"event: " + event.encode('utf-8') + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(chat_request: ChatRequest, request: Request):
+    """
+    /chat as server-sent events. Events, in order:
+    - "tool": the tool chosen and where the decision came from ("cache", "local" or "orchestrator")
+    - "context": each diet-plan input (rag, groq, nutrition) as it finishes, with its outcome and timing
+    - "token": answer text as it is generated ({"text": ...}); concatenated they form the answer
+    - "done": {"answer", "session_id"}. `answer` is authoritative: if it doesn't extend the streamed
+      text (a generation failed part-way), clients should show it instead.
+    The turn is written to the session history, as by /chat, once it completes.
+    """
+    user_query = chat_request.query
+    session_id = resolve_chat_session(chat_request, request)
+    queue: asyncio.Queue = asyncio.Queue()
+    streamed: List[str] = []
+
+    async def emit(event: str, data: Dict[str, Any]):
+        if event == "token":
+            streamed.append(data["text"])
+        await queue.put((event, data))
+
+    async def run_turn():
+        response_text = await run_chat_turn(user_query, session_id, emit)
+        # Answers not generated token by token (database lookups, cached answers, the computed
+        # part of a meal plan) follow whatever was streamed
+        streamed_text = "".join(streamed).strip()
+        if response_text.startswith(streamed_text) and len(response_text) > len(streamed_text):
+            await emit("token", {"text": response_text[len(streamed_text):]})
+
+        get_session_history(session_id).add_user_message(user_query)
+        get_session_history(session_id).add_ai_message(response_text)
+        await queue.put(("done", {"answer": response_text, "session_id": session_id}))
+
+    async def events():
+        turn = asyncio.create_task(run_turn())
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, turn}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    # The turn ended without "done": it raised
+                    logging.error(f"❌ Streaming chat turn failed for session {session_id}: {turn.exception()!r}")
+                    yield format_sse("done", {"answer": "I'm experiencing a technical issue. Please try again later.",
+                                              "session_id": session_id})
+                    return
+                event, data = getter.result()
+                yield format_sse(event, data)
+                if event == "done":
+                    return
+        finally:
+            # Client gone: stop generating; the unfinished turn is not added to the history
+            if not turn.done():
+                turn.cancel()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 
 # <<<< --- START: NEW INTEGRATED CODE --- >>>>
 
@@ -1314,26 +5050,15 @@ async def analyze_meal(meal_request: MealAnalysisRequest):
 
     logging.info(f"🔬 Analyzing meal with dishes: {meal_request.dish_names}")
 
-    numeric_columns = ['Calories (kcal)', 'Protein (g)', 'Carbs (g)', 'Sugar (g)', 'Fat (g)', 'Fiber (g)', 'Sodium (mg)']
-    totals = {col: 0.0 for col in numeric_columns}
-    found_dishes_data = []
-    not_found_dishes_names = []
-
-    for dish_name in meal_request.dish_names:
-        # Use the corrected search function to find the best match
-        search_results = search_nutrition_data(dish_name, limit=1)
-        if search_results:
-            match = search_results[0]
-            found_dishes_data.append(match)
-            # Aggregate the nutritional values
-            for col in numeric_columns:
-                value = match.get(col, 0)
-                if pd.notna(value) and isinstance(value, (int, float)):
-                    totals[col] += value
-        else:
-            not_found_dishes_names.append(dish_name)
+    # Resolve every dish to its best match in one batched pass
+    dataset = nutrition_dataset
+    resolved = resolve_dish_rows(dataset, meal_request.dish_names)
+    found_rows = [row for row, _ in resolved if row is not None]
+    not_found_dishes_names = [
+        dish_name for dish_name, (row, _) in zip(meal_request.dish_names, resolved) if row is None
+    ]
 
-    if not found_dishes_data:
+    if not found_rows:
         return MealAnalysisResponse(
             analysis="No dishes from your list were found in our database. We are unable to provide an analysis.",
             totals={},
@@ -1341,9 +5066,13 @@ async def analyze_meal(meal_request: MealAnalysisRequest):
             not_found_dishes=not_found_dishes_names
         )
 
+    # Aggregate the nutritional values: one gather + sum over the nutrient matrix
+    totals = nutrient_totals(dataset, found_rows)
+
     # Prepare context for the LLM
-    dish_list_str = "\n".join([f"- {d.get('Dish Name', 'Unknown')}" for d in found_dishes_data])
-    totals_summary_str = json.dumps({k: round(v, 2) for k, v in totals.items()}, indent=2)
+    name_codes = dataset.store.text_codes('Dish Name')
+    dish_list_str = "\n".join([f"- {dataset.store.strings[int(name_codes[row])] or 'Unknown'}" for row in found_rows])
+    totals_summary_str = json.dumps(totals, indent=2)
     not_found_str = ", ".join(not_found_dishes_names) if not_found_dishes_names else "None"
 
     # Generate the AI analysis
@@ -1359,13 +5088,94 @@ async def analyze_meal(meal_request: MealAnalysisRequest):
         logging.error(f"❌ LLM error during meal analysis: {e}", exc_info=True)
         ai_analysis = "An error occurred while generating the AI analysis for this meal."
 
-    # Return the full response object
-    return MealAnalysisResponse(
-        analysis=ai_analysis.strip(),
-        totals={k: round(v, 2) for k, v in totals.items()},
-        found_dishes=found_dishes_data,
-        not_found_dishes=not_found_dishes_names
-    )
+    # Same shape as MealAnalysisResponse; found_dishes come from the pre-serialized records
+    return NutritionJSONResponse({
+        "analysis": ai_analysis.strip(),
+        "totals": totals,
+        "found_dishes": SerializedRows(dataset, found_rows),
+        "not_found_dishes": not_found_dishes_names
+    })
+
+MAX_ROLLUP_MEALS = 1000
+MAX_ROLLUP_DISHES = 10000
+
+@app.post("/meal-log/rollup", tags=["Meal Analysis"])
+async def rollup_meal_log(rollup_request: MealLogRollupRequest):
+    """
+    Nutrition totals for a whole meal log in one call: per meal, per day and per ISO week.
+    Purely numeric (no LLM call): every dish in the log is resolved in one batched pass and
+    the totals are grouped sums over the gathered nutrient matrix.
+    """
+    meals = rollup_request.meals
+    if not meals:
+        raise HTTPException(status_code=400, detail="The 'meals' list cannot be empty.")
+    if len(meals) > MAX_ROLLUP_MEALS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_ROLLUP_MEALS} meals can be rolled up per request")
+    dish_names = [dish_name for meal in meals for dish_name in meal.dish_names]
+    if len(dish_names) > MAX_ROLLUP_DISHES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_ROLLUP_DISHES} dishes can be rolled up per request")
+    dataset = nutrition_dataset
+    if dataset is None:
+        raise HTTPException(status_code=503, detail="Nutrition database not loaded")
+
+    try:
+        resolved = resolve_dish_rows(dataset, dish_names)
+        found = np.array([row is not None for row, _ in resolved], dtype=bool)
+        meal_of_dish = np.repeat(np.arange(len(meals)), [len(meal.dish_names) for meal in meals])
+
+        # Meals: scatter-add each found dish's nutrient vector into its meal
+        meal_totals = np.zeros((len(meals), len(NUTRITION_NUMERIC_COLUMNS)))
+        np.add.at(meal_totals, meal_of_dish[found], nutrient_matrix(dataset, [row for row, _ in resolved if row is not None]))
+
+        # Days and ISO weeks (starting Monday): the same grouped add one level up
+        days = sorted({meal.date for meal in meals})
+        day_index = {day: i for i, day in enumerate(days)}
+        day_totals = np.zeros((len(days), len(NUTRITION_NUMERIC_COLUMNS)))
+        np.add.at(day_totals, [day_index[meal.date] for meal in meals], meal_totals)
+
+        week_starts = sorted({day - timedelta(days=day.weekday()) for day in days})
+        week_index = {week_start: i for i, week_start in enumerate(week_starts)}
+        week_of_day = [week_index[day - timedelta(days=day.weekday())] for day in days]
+        week_totals = np.zeros((len(week_starts), len(NUTRITION_NUMERIC_COLUMNS)))
+        np.add.at(week_totals, week_of_day, day_totals)
+        days_per_week = np.bincount(week_of_day, minlength=len(week_starts))
+        meals_per_day = np.bincount([day_index[meal.date] for meal in meals], minlength=len(days))
+    except Exception as e:
+        logging.error(f"Error rolling up meal log: {e}")
+        raise HTTPException(status_code=500, detail="Error rolling up meal log")
+
+    per_meal = []
+    position = 0
+    for meal, totals in zip(meals, meal_totals):
+        meal_found = found[position:position + len(meal.dish_names)]
+        per_meal.append({
+            "date": meal.date.isoformat(),
+            "meal": meal.meal,
+            "dishes_found": int(meal_found.sum()),
+            "not_found": [name for name, hit in zip(meal.dish_names, meal_found) if not hit],
+            "totals": _totals_dict(totals)
+        })
+        position += len(meal.dish_names)
+
+    return {
+        "totals": _totals_dict(day_totals.sum(axis=0)),
+        "per_meal": per_meal,
+        "per_day": [
+            {"date": day.isoformat(), "meals": int(count), "totals": _totals_dict(totals)}
+            for day, count, totals in zip(days, meals_per_day, day_totals)
+        ],
+        "per_week": [
+            {
+                "week": f"{week_start.isocalendar()[0]}-W{week_start.isocalendar()[1]:02d}",
+                "week_start": week_start.isoformat(),
+                "days_logged": int(count),
+                "totals": _totals_dict(totals),
+                "daily_average": _totals_dict(totals / count)
+            }
+            for week_start, count, totals in zip(week_starts, days_per_week, week_totals)
+        ],
+        "not_found_dishes": sorted({name for name, hit in zip(dish_names, found) if not hit})
+    }
 
 # <<<< --- END: NEW INTEGRATED CODE --- >>>>
 
@@ -1386,19 +5196,19 @@ async def root():
             "Full meal nutritional analysis"
         ],
         "usage": "Use POST /chat for conversational AI or POST /analyze-meal for meal analysis.",
-        "nutrition_database_records": len(nutrition_data) if nutrition_data else 0
+        "nutrition_database_records": len(nutrition_dataset) if nutrition_dataset else 0
     }
 
 @app.get("/nutrition/search/{food_name}", tags=["Nutrition Database"])
 async def search_nutrition_endpoint(food_name: str, limit: int = 5):
     """Direct endpoint to search nutrition database."""
     try:
-        results = search_nutrition_data(food_name, limit=limit)
-        return {
+        dataset, rows = search_nutrition_rows(food_name, limit=limit)
+        return NutritionJSONResponse({
             "query": food_name,
-            "results_found": len(results),
-            "results": results
-        }
+            "results_found": len(rows),
+            "results": SerializedRows(dataset, rows) if dataset is not None else []
+        })
     except Exception as e:
         logging.error(f"Error in nutrition search endpoint: {e}")
         raise HTTPException(status_code=500, detail="Error searching nutrition database")
@@ -1407,9 +5217,10 @@ async def search_nutrition_endpoint(food_name: str, limit: int = 5):
 async def get_nutrition_categories():
     """Get all available food categories in the nutrition database."""
     try:
-        if nutrition_df is not None and not nutrition_df.empty:
-            categories = nutrition_df['Category'].unique().tolist()
-            category_counts = nutrition_df['Category'].value_counts().to_dict()
+        dataset = nutrition_dataset
+        if dataset is not None and len(dataset) > 0:
+            category_counts = dict(dataset.facets.counts['Category'])
+            categories = list(category_counts)
             return {
                 "total_categories": len(categories),
                 "categories": sorted(categories),
@@ -1423,13 +5234,13 @@ async def get_nutrition_categories():
 
 @app.get("/nutrition/dishes-by-category", tags=["Nutrition Database"])
 async def get_dishes_by_category(category: str, limit: int = 50):
-    """Get all dishes for a specific category using a query parameter."""
+    """Get the first dishes of a category (case-insensitive); page through the rest with /nutrition/browse."""
     try:
-        if nutrition_df is not None and not nutrition_df.empty:
-            # Case-insensitive match for the category
-            category_matches = nutrition_df[nutrition_df['Category'].str.lower() == category.lower()]
-            if not category_matches.empty:
-                return category_matches.head(limit).to_dict('records')
+        dataset = nutrition_dataset
+        if dataset is not None and len(dataset) > 0:
+            category_rows = dataset.facets.value_rows('Category', category)
+            if len(category_rows) > 0:
+                return NutritionJSONResponse(SerializedRows(dataset, category_rows[:limit].tolist()))
             else:
                 raise HTTPException(status_code=404, detail=f"Category '{category}' not found.")
         else:
@@ -1442,18 +5253,95 @@ async def get_dishes_by_category(category: str, limit: int = 50):
 
 
 
+@app.get("/nutrition/facets", tags=["Nutrition Database"])
+async def get_nutrition_facets():
+    """Dish counts per category and per region, precomputed for each dataset version."""
+    dataset = nutrition_dataset
+    if dataset is None:
+        raise HTTPException(status_code=503, detail="Nutrition database not loaded")
+    return {
+        "dataset_version": dataset.version,
+        "categories": dict(sorted(dataset.facets.counts['Category'].items())),
+        "regions": dict(sorted(dataset.facets.counts['Region'].items())),
+    }
+
+@app.get("/nutrition/browse", tags=["Nutrition Database"])
+async def browse_nutrition(category: Optional[str] = None, region: Optional[str] = None,
+                           limit: int = BROWSE_PAGE_SIZE, cursor: Optional[str] = None):
+    """
+    Page through dishes in dataset order, optionally by category (exact) and/or region (substring,
+    e.g. "South" matches "South India"), both case-insensitive.
+    Pass a page's `next_cursor` as `cursor` to get the next one; each page costs O(page).
+    Cursors survive incremental updates, which only append rows, but expire (410) once the dataset is
+    reloaded or compacted; browsing then restarts without a cursor.
+    """
+    if not 1 <= limit <= MAX_BROWSE_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_BROWSE_PAGE_SIZE}")
+    dataset = nutrition_dataset
+    if dataset is None:
+        raise HTTPException(status_code=503, detail="Nutrition database not loaded")
+
+    filters = [(category or "").lower(), (region or "").lower()]
+    after_row = -1
+    if cursor:
+        try:
+            generation, cursor_filters, after_row = decode_browse_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if cursor_filters != filters:
+            raise HTTPException(status_code=400, detail="Cursor belongs to a different category or region")
+        if generation != dataset.generation:
+            raise HTTPException(status_code=410, detail="Cursor expired: the nutrition data was reloaded. Start again without a cursor.")
+
+    try:
+        rows, has_more, total = browse_rows(dataset, category, region, after_row, limit)
+        return {
+            "items": dataset.records(rows.tolist()),
+            "count": len(rows),
+            "total": total,
+            "next_cursor": encode_browse_cursor(dataset.generation, filters, int(rows[-1])) if has_more else None,
+            "dataset_version": dataset.version,
+        }
+    except Exception as e:
+        logging.error(f"Error browsing nutrition data: {e}")
+        raise HTTPException(status_code=500, detail="Error browsing nutrition data")
+
+@app.get("/nutrition/sync", tags=["Nutrition Database"])
+async def sync_nutrition(since: Optional[str] = None):
+    """
+    Records changed since content version `since` (the `version` of the client's last sync), so clients
+    keep a local copy of the dataset without re-downloading it. Omit `since` for a full copy.
+    See nutrition_sync_payload for the format.
+    """
+    dataset = nutrition_dataset
+    if dataset is None:
+        raise HTTPException(status_code=503, detail="Nutrition database not loaded")
+    try:
+        if since is None or since not in {tag for tag, _ in dataset.sync_log}:
+            # Full copies are identical for every client of a version: encode once
+            cache_key = ("sync_full", dataset.content_tag, since, dataset.version)
+            body = nutrition_result_cache.get(cache_key)
+            if body is None:
+                body = orjson.dumps(nutrition_sync_payload(dataset, since))
+                nutrition_result_cache.put(cache_key, body)
+            return Response(content=body, media_type="application/json")
+        return NutritionJSONResponse(nutrition_sync_payload(dataset, since))
+    except Exception as e:
+        logging.error(f"Error building nutrition sync from {since}: {e}")
+        raise HTTPException(status_code=500, detail="Error building nutrition sync")
+
 @app.get("/nutrition/regional/{region}", tags=["Nutrition Database"])
 async def get_regional_foods(region: str, dietary_type: str = "any", goal: str = "diet", limit: int = 10):
     """Get nutrition suggestions for a specific region."""
     try:
-        results = get_regional_nutrition_suggestions(region, dietary_type, goal)
-        return {
+        dataset, rows = regional_suggestion_rows(region, dietary_type, goal)
+        return NutritionJSONResponse({
             "region": region,
             "dietary_type": dietary_type,
             "goal": goal,
-            "suggestions_found": len(results),
-            "suggestions": results[:limit]
-        }
+            "suggestions_found": len(rows),
+            "suggestions": SerializedRows(dataset, rows[:limit]) if dataset is not None else []
+        })
     except Exception as e:
         logging.error(f"Error getting regional foods: {e}")
         raise HTTPException(status_code=500, detail="Error retrieving regional foods")
@@ -1466,10 +5354,10 @@ async def compare_nutrition_endpoint(food_items: List[str]):
             raise HTTPException(status_code=400, detail="At least 2 food items required for comparison")
 
         comparison_data = []
-        for food_item in food_items[:5]: # Limit to 5 items
-            matches = search_nutrition_data(food_item, limit=1)
-            if matches:
-                comparison_data.append(matches[0])
+        food_items = food_items[:5] # Limit to 5 items
+        for food_item, match in zip(food_items, resolve_dishes(food_items)):
+            if match:
+                comparison_data.append(match)
             else:
                 comparison_data.append({
                     "Dish Name": food_item,
@@ -1486,6 +5374,141 @@ async def compare_nutrition_endpoint(food_items: List[str]):
         logging.error(f"Error in nutrition comparison endpoint: {e}")
         raise HTTPException(status_code=500, detail="Error comparing nutrition data")
 
+@app.post("/meal-plan/optimize", tags=["Meal Planning"])
+async def optimize_meal_plan_endpoint(plan_request: MealPlanRequest):
+    """
+    Deterministic day meal plan that meets calorie and macro targets as closely as the database allows.
+    Computed locally in bounded time (no LLM call); the same request on the same dataset version
+    always returns the same plan.
+    """
+    slots = None
+    if plan_request.slots is not None:
+        if not plan_request.slots or len(plan_request.slots) > MAX_MEAL_PLAN_SLOTS:
+            raise HTTPException(status_code=400, detail=f"Provide between 1 and {MAX_MEAL_PLAN_SLOTS} meal slots")
+        if any(not slot.courses or len(slot.courses) > MAX_COURSES_PER_SLOT for slot in plan_request.slots):
+            raise HTTPException(status_code=400, detail=f"Each slot needs between 1 and {MAX_COURSES_PER_SLOT} courses")
+        slots = [slot.model_dump() for slot in plan_request.slots]
+
+    targets = meal_plan_targets(
+        plan_request.goal, plan_request.calories, plan_request.protein_g, plan_request.carbs_g, plan_request.fat_g
+    )
+    try:
+        plan = await asyncio.to_thread(get_meal_plan, targets, plan_request.dietary_type, plan_request.region, slots)
+    except Exception as e:
+        logging.error(f"Error optimizing meal plan: {e}")
+        raise HTTPException(status_code=500, detail="Error building meal plan")
+    if plan is None:
+        raise HTTPException(status_code=503, detail="Nutrition database not loaded")
+    return plan
+
+@app.get("/nutrition/similar/{dish}", tags=["Nutrition Database"])
+async def similar_dishes(
+    dish: str,
+    limit: int = SIMILAR_DISHES_LIMIT,
+    category: Optional[str] = None,
+    same_category: bool = True,
+    region: Optional[str] = None,
+    dietary_type: str = "any",
+    lighter: bool = False,
+):
+    """
+    Nearest dishes by per-serving nutrient profile (calories, protein, carbs, sugar, fat, fiber, sodium).
+    Filter by `category` (defaults to the dish's own unless `same_category=false`), `region` and
+    `dietary_type`; `lighter=true` keeps only dishes with fewer calories than `dish`.
+    """
+    if not 1 <= limit <= MAX_SIMILAR_DISHES:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_SIMILAR_DISHES}")
+    try:
+        result = await asyncio.to_thread(
+            get_similar_dishes, dish, limit=limit, category=category, same_category=same_category,
+            region=region, dietary_type=dietary_type, lighter=lighter,
+        )
+    except LookupError:
+        raise HTTPException(status_code=503, detail="Nutrition database not loaded")
+    except Exception as e:
+        logging.error(f"Error finding dishes similar to '{dish}': {e}")
+        raise HTTPException(status_code=500, detail="Error finding similar dishes")
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Dish '{dish}' not found")
+    return {**result, "count": len(result["similar"])}
+
+@app.post("/nutrition/query", tags=["Nutrition Database"])
+async def query_nutrition_endpoint(query_request: NutritionQueryRequest):
+    """
+    Dishes by numeric ranges, e.g. under 200 kcal with at least 10 g protein in South India:
+    {"filters": [{"field": "calories", "max": 200}, {"field": "protein", "min": 10}], "region": "South"}.
+    Bounds are inclusive; filters on the same field intersect. Also filters by category (exact),
+    region (substring) and dietary_type, sorts by any numeric field and returns up to `limit` dishes.
+    """
+    if not 1 <= query_request.limit <= MAX_NUTRITION_QUERY_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_NUTRITION_QUERY_LIMIT}")
+
+    ranges: Dict[str, tuple] = {}
+    for range_filter in query_request.filters:
+        col = nutrition_query_column(range_filter.field)
+        if col is None:
+            raise HTTPException(status_code=400, detail=f"Unknown field '{range_filter.field}'. "
+                                                        f"Use one of: {', '.join(NUTRITION_QUERY_FIELDS)}")
+        low, high = ranges.get(col, (None, None))
+        if range_filter.min is not None:
+            low = range_filter.min if low is None else max(low, range_filter.min)
+        if range_filter.max is not None:
+            high = range_filter.max if high is None else min(high, range_filter.max)
+        ranges[col] = (low, high)
+
+    sort_by = None
+    if query_request.sort_by:
+        sort_by = nutrition_query_column(query_request.sort_by)
+        if sort_by is None:
+            raise HTTPException(status_code=400, detail=f"Unknown sort field '{query_request.sort_by}'")
+
+    dataset = nutrition_dataset
+    if dataset is None:
+        raise HTTPException(status_code=503, detail="Nutrition database not loaded")
+    try:
+        return query_nutrition(
+            dataset, ranges, query_request.category, query_request.region, query_request.dietary_type,
+            sort_by, query_request.descending, query_request.limit,
+        )
+    except Exception as e:
+        logging.error(f"Error running nutrition query: {e}")
+        raise HTTPException(status_code=500, detail="Error running nutrition query")
+
+MAX_RESOLVE_DISHES = 100
+
+@app.post("/nutrition/resolve", tags=["Nutrition Database"])
+async def resolve_dishes_endpoint(resolve_request: DishResolveRequest):
+    """Resolve a list of dish names (e.g. a mess menu or meal log) to their best database matches in one call."""
+    try:
+        dish_names = resolve_request.dish_names
+        if not dish_names:
+            raise HTTPException(status_code=400, detail="The 'dish_names' list cannot be empty.")
+        if len(dish_names) > MAX_RESOLVE_DISHES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_RESOLVE_DISHES} dishes can be resolved per request")
+
+        dataset = nutrition_dataset
+        resolved = resolve_dish_rows(dataset, dish_names)
+        records = records_for_rows(dataset, [row for row, _ in resolved])
+
+        results = []
+        not_found = []
+        for dish_name, (_, match_type), record in zip(dish_names, resolved, records):
+            if record is None:
+                not_found.append(dish_name)
+            results.append({"query": dish_name, "match_type": match_type, "dish": record})
+
+        return {
+            "items_requested": len(dish_names),
+            "results_found": len(dish_names) - len(not_found),
+            "results": results,
+            "not_found": not_found
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error in nutrition resolve endpoint: {e}")
+        raise HTTPException(status_code=500, detail="Error resolving dishes")
+
 @app.get("/health", tags=["Utilities"])
 async def health_check():
     """Enhanced health check with component status."""
@@ -1493,7 +5516,7 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "components": {
-            "nutrition_database": len(nutrition_data) > 0 if nutrition_data else False,
+            "nutrition_database": len(nutrition_dataset) > 0 if nutrition_dataset else False,
             "vector_database": db is not None,
             "llm_gemini": llm_gemini is not None,
             "llm_orchestrator": llm_orchestrator is not None,
@@ -1501,8 +5524,22 @@ async def health_check():
             "weather_api": bool(OPENWEATHER_API_KEY)
         },
         "database_stats": {
-            "nutrition_records": len(nutrition_data) if nutrition_data else 0,
+            "nutrition_records": len(nutrition_dataset) if nutrition_dataset else 0,
+            "nutrition_dataset_version": nutrition_dataset.version if nutrition_dataset else 0,
             "active_sessions": len(llm_chains_session_store)
+        },
+        "nutrition_cache": nutrition_result_cache.stats(),
+        "chat_answer_cache": chat_answer_cache.stats(),
+        "groq_cache": groq_answer_cache.stats(),
+        "groq_models": groq_model_health.stats(),
+        "diet_plan_pipeline": diet_plan_timings.stats(),
+        "speculative_prefetch": speculation_report(),
+        "embedding_cache": query_embeddings.stats() if query_embeddings else None,
+        "prompt_cache": prompt_completion_cache.stats() if prompt_completion_cache else None,
+        "local_router": {
+            "enabled": LOCAL_ROUTER_ENABLED,
+            "threshold": LOCAL_ROUTER_THRESHOLD,
+            "decisions": dict(local_router_stats)
         }
     }
 
@@ -1522,31 +5559,22 @@ async def upload_nutrition_data(file_content: str):
     """
     try:
         new_data = json.loads(file_content)
-        global nutrition_data, nutrition_df
 
         # Validate the structure of the new data
         if isinstance(new_data, list) and len(new_data) > 0:
-            required_fields = ["Dish Name", "Category", "Calories (kcal)", "Protein (g)"]
+            required_fields = NUTRITION_REQUIRED_FIELDS
             if all(field in new_data[0] for field in required_fields):
-                nutrition_data = new_data
-                nutrition_df = pd.DataFrame(nutrition_data)
-
-                # Re-process the data
-                numeric_columns = ['Calories (kcal)', 'Protein (g)', 'Carbs (g)', 'Sugar (g)',
-                                   'Fat (g)', 'Fiber (g)', 'Sodium (mg)']
-                for col in numeric_columns:
-                    if col in nutrition_df.columns:
-                        nutrition_df[col] = pd.to_numeric(nutrition_df[col], errors='coerce')
-
-                nutrition_df['searchable_text'] = (
-                    nutrition_df['Dish Name'].astype(str).str.lower() + ' ' +
-                    nutrition_df['Category'].astype(str).str.lower()
+                # Build the new store and indexes off the event loop, then swap them in at once;
+                # requests already running keep reading the previous dataset
+                dataset = await asyncio.to_thread(
+                    lambda: build_nutrition_dataset(build_nutrition_store(new_data))
                 )
+                publish_nutrition_dataset(dataset)
 
-                logging.info(f"✅ Nutrition database updated with {len(nutrition_data)} records")
+                logging.info(f"✅ Nutrition database updated with {len(dataset)} records")
                 return {
                     "status": "success",
-                    "records_loaded": len(nutrition_data),
+                    "records_loaded": len(dataset),
                     "message": "Nutrition database updated successfully"
                 }
             else:
@@ -1565,6 +5593,92 @@ async def upload_nutrition_data(file_content: str):
         logging.error(f"Error updating nutrition database: {e}")
         raise HTTPException(status_code=500, detail="Error updating nutrition database")
 
+@app.post("/nutrition/upload/stream", tags=["Utilities"])
+async def upload_nutrition_stream(request: Request, dry_run: bool = False):
+    """
+    Replace the nutrition database with a dataset streamed in the request body, as NDJSON
+    (one record, or one array of records, per line) or as a JSON array.
+    Records are validated and compacted into the columnar store as chunks arrive, so the body is
+    never held in memory whole. Invalid rows are skipped and reported with their line numbers;
+    with dry_run=true nothing is loaded.
+    Note: This is for development/testing. In production, you'd want proper authentication.
+    """
+    decoder = NutritionStreamDecoder()
+    ingest = NutritionIngest()
+    try:
+        async for chunk in request.stream():
+            ingest.add(decoder.feed(chunk))
+        ingest.add(decoder.close())
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Upload must be UTF-8 encoded")
+
+    report = ingest.report()
+    if ingest.accepted == 0:
+        raise HTTPException(status_code=400, detail={"message": "No valid nutrition records in upload", **report})
+    if dry_run:
+        return {"status": "validated", **report}
+
+    try:
+        dataset = await asyncio.to_thread(lambda: build_nutrition_dataset(ingest.builder.build()))
+    except Exception as e:
+        logging.error(f"Error building streamed nutrition dataset: {e}")
+        raise HTTPException(status_code=500, detail="Error updating nutrition database")
+    publish_nutrition_dataset(dataset)
+
+    logging.info(f"✅ Nutrition database streamed in: {ingest.accepted} records loaded, {ingest.rejected} rejected")
+    return {
+        "status": "success",
+        "records_loaded": len(dataset),
+        "version": dataset.version,
+        **report
+    }
+
+@app.post("/nutrition/delta", tags=["Utilities"])
+async def apply_nutrition_delta(delta_request: NutritionDeltaRequest):
+    """
+    Insert, replace or delete individual dishes without re-uploading the whole dataset.
+    Dishes are matched by name (case-insensitive). The change is applied copy-on-write and published
+    as a new dataset version; it lives in memory only and is not written back to the JSON file.
+    Note: This is for development/testing. In production, you'd want proper authentication.
+    """
+    upserts, deletes = delta_request.upsert, delta_request.delete
+    if not upserts and not deletes:
+        raise HTTPException(status_code=400, detail="Nothing to apply: 'upsert' and 'delete' are both empty")
+
+    # Same checks as a validated upload, so a delta can't publish rows the loader would reject
+    rejects = [{"position": i, "error": error} for i, record in enumerate(upserts)
+               if (error := validate_nutrition_record(record))]
+    if rejects:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": "Invalid nutrition records in delta", "rejected": len(rejects),
+                    "rejects": rejects[:MAX_REPORTED_REJECTS]}
+        )
+    if nutrition_dataset is None:
+        raise HTTPException(status_code=503, detail="Nutrition database not loaded")
+
+    def apply():
+        with nutrition_write_lock:
+            updated, summary = apply_nutrition_changes(nutrition_dataset, upserts, deletes)
+            publish_nutrition_dataset(updated)
+        schedule_nutrition_compaction(updated)
+        return updated, summary
+
+    try:
+        updated, summary = await asyncio.to_thread(apply)
+    except Exception as e:
+        logging.error(f"Error applying nutrition delta: {e}")
+        raise HTTPException(status_code=500, detail="Error applying nutrition changes")
+
+    logging.info(f"✅ Nutrition delta applied: {summary['upserted']} upserted, {summary['deleted']} deleted "
+                 f"(version {updated.version})")
+    return {
+        "status": "success",
+        "version": updated.version,
+        "records": len(updated),
+        **summary
+    }
+
 @app.get("/analytics/popular-queries", tags=["Utilities"])
 async def get_popular_queries():
     """Get analytics about popular queries (simplified version)."""
@@ -1573,8 +5687,8 @@ async def get_popular_queries():
         # For now, return session statistics
         return {
             "active_sessions": len(llm_chains_session_store),
-            "total_nutrition_records": len(nutrition_data) if nutrition_data else 0,
-            "database_categories": len(nutrition_df['Category'].unique()) if nutrition_df is not None else 0,
+            "total_nutrition_records": len(nutrition_dataset) if nutrition_dataset else 0,
+            "database_categories": len(nutrition_dataset.facets.counts['Category']) if nutrition_dataset is not None else 0,
             "note": "Detailed analytics would require persistent storage and proper tracking"
         }
     except Exception as e:
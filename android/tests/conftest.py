@@ -0,0 +1,22 @@
+import json
+import os
+import sys
+
+import pytest
+
+ANDROID_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NUTRITION_DATA_PATH = os.path.join(ANDROID_DIR, "..", "public", "nutrition_data.json")
+sys.path.insert(0, ANDROID_DIR)
+
+import main  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def nutrition_records():
+    with open(NUTRITION_DATA_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="session")
+def nutrition_dataset(nutrition_records):
+    return main.build_nutrition_dataset(main.build_nutrition_store(nutrition_records))
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client(monkeypatch, nutrition_dataset):
+    monkeypatch.setattr(main, "nutrition_dataset", nutrition_dataset)
+    return TestClient(main.app)
+
+
+def region_rows(dataset, needle):
+    regions = dataset.store.text_column('Region')
+    return [row for row in range(dataset.store.size)
+            if dataset.store.live[row] and needle.lower() in (regions[row] or "").lower()]
+
+
+def test_region_matches_as_substring(nutrition_dataset):
+    rows, has_more, total = main.browse_rows(nutrition_dataset, None, "South", -1, 10_000)
+    assert rows.tolist() == region_rows(nutrition_dataset, "south")
+    assert total == nutrition_dataset.facets.counts['Region']['South India']
+    assert not has_more
+
+
+def test_region_and_category_combine(nutrition_dataset):
+    rows, _, total = main.browse_rows(nutrition_dataset, "Breads & Roti", "north", -1, 10_000)
+    categories = nutrition_dataset.store.text_column('Category')
+    expected = [row for row in region_rows(nutrition_dataset, "north") if categories[row] == "Breads & Roti"]
+    assert rows.tolist() == expected and total == len(expected) > 0
+
+
+def test_indian_means_every_region(nutrition_dataset):
+    _, _, total = main.browse_rows(nutrition_dataset, None, "Indian", -1, 10)
+    assert total == len(nutrition_dataset.store)
+
+
+def test_pages_cover_the_region(client, nutrition_dataset):
+    names, cursor = [], None
+    while True:
+        params = {"region": "South", "limit": 100}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/nutrition/browse", params=params).json()
+        names.extend(item["Dish Name"] for item in body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    expected = [record["Dish Name"] for record in nutrition_dataset.records(region_rows(nutrition_dataset, "south"))]
+    assert names == expected
+    assert body["total"] == len(expected)
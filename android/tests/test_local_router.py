@@ -0,0 +1,37 @@
+import pytest
+
+import main
+
+
+@pytest.fixture(autouse=True)
+def published_dataset(monkeypatch, nutrition_dataset):
+    monkeypatch.setattr(main, "nutrition_dataset", nutrition_dataset)
+
+
+@pytest.mark.parametrize("query", [
+    "low fat", "high protein", "no sugar", "more protein", "less sodium", "veg protein", "calories in it",
+    "calories in that", "nutrition of this", "low calories",
+])
+def test_modifiers_and_pronouns_are_not_routed(query):
+    assert main.route_query_locally(query) is None
+
+
+@pytest.mark.parametrize("query, food", [
+    ("calories in roti", "roti"),
+    ("paneer tikka nutrition", "paneer tikka"),
+    ("how much protein in a masala dosa", "masala dosa"),
+])
+def test_dish_lookups_are_routed(query, food):
+    action = main.route_query_locally(query)
+    assert action.tool_name == "lookup_nutrition_facts"
+    assert action.tool_input == {"food_item": food}
+
+
+def test_substring_match_stays_below_threshold():
+    tool_name, _, confidence, _ = main.classify_query_intent("calories in dos")
+    assert tool_name == "lookup_nutrition_facts"
+    assert confidence < main.LOCAL_ROUTER_THRESHOLD
+
+
+def test_greetings_are_routed():
+    assert main.route_query_locally("hello aahar").tool_name == "handle_greeting"
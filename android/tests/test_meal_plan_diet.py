@@ -0,0 +1,63 @@
+import re
+
+import numpy as np
+import pytest
+
+import main
+
+MEAT_DISHES = ["Keema Naan", "Keema Kulcha", "Keema Biryani", "Keema Pav", "Tangdi Kebab", "Reshmi Kebab",
+               "Boti Kebab", "Galouti Kebab", "Tunde Ke Kabab", "Chingri Malai Pulao", "Masala Omelette"]
+DAIRY_WORDS = re.compile(r"paneer|ghee|butter|dahi|curd|malai|cheese|milk|lassi|raita|kheer|naan|kulcha", re.I)
+GOALS = ["weight loss", "weight gain", "muscle gain", "maintenance"]
+REGIONS = ["Indian", "North", "South India", "West", "East"]
+
+
+def plan_dishes(plan):
+    return [dish["Dish Name"] for slot in plan["slots"] for dish in slot["dishes"]]
+
+
+def allowed_names(dataset, dietary_type):
+    mask = dataset.ranges.diet_mask(dietary_type)
+    return {record["Dish Name"] for record in dataset.records(np.flatnonzero(mask).tolist())}
+
+
+def test_known_meat_dishes_exist(nutrition_records):
+    names = {record["Dish Name"] for record in nutrition_records}
+    assert set(MEAT_DISHES) <= names
+
+
+@pytest.mark.parametrize("dietary_type", ["vegetarian", "vegan"])
+def test_diet_mask_excludes_meat(nutrition_dataset, dietary_type):
+    assert not set(MEAT_DISHES) & allowed_names(nutrition_dataset, dietary_type)
+
+
+def test_diet_mask_keeps_marked_vegetarian_styles(nutrition_dataset):
+    allowed = allowed_names(nutrition_dataset, "vegetarian")
+    assert {"Veg Seekh Kebab", "Paneer Tikka", "Soya Keema Pav", "Malai Kofta", "Tomato Omelette (Besan)"} <= allowed
+
+
+def test_vegan_is_vegetarian_without_dairy(nutrition_dataset):
+    vegan = nutrition_dataset.ranges.diet_mask("vegan")
+    vegetarian = nutrition_dataset.ranges.diet_mask("vegetarian")
+    assert not (vegan & ~vegetarian).any()
+    assert not [name for name in allowed_names(nutrition_dataset, "vegan") if DAIRY_WORDS.search(name)]
+
+
+@pytest.mark.parametrize("goal", GOALS)
+@pytest.mark.parametrize("region", REGIONS)
+def test_plans_follow_diet(nutrition_dataset, goal, region):
+    targets = main.meal_plan_targets(goal)
+    for dietary_type in ("vegetarian", "vegan"):
+        plan = main.optimize_meal_plan(nutrition_dataset, targets, dietary_type, region)
+        dishes = plan_dishes(plan)
+        assert dishes
+        assert not set(dishes) & set(MEAT_DISHES)
+        assert set(dishes) <= allowed_names(nutrition_dataset, dietary_type)
+        if dietary_type == "vegan":
+            assert not [name for name in dishes if DAIRY_WORDS.search(name)]
+
+
+def test_vegan_plan_meets_calorie_target(nutrition_dataset):
+    targets = main.meal_plan_targets("maintenance")
+    plan = main.optimize_meal_plan(nutrition_dataset, targets, "vegan", "Indian")
+    assert plan["totals"]["Calories (kcal)"] >= 0.85 * targets["Calories (kcal)"]
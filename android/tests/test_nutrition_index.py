@@ -0,0 +1,51 @@
+import numpy as np
+
+import main
+
+
+def test_exact_rows_ignore_case_and_padding(nutrition_dataset):
+    rows = nutrition_dataset.index.exact_rows("masala dosa")
+    assert [record["Dish Name"] for record in nutrition_dataset.records(rows)] == ["Masala Dosa"]
+    assert nutrition_dataset.index.exact_rows("masala dosa ") == []
+    assert nutrition_dataset.index.exact_rows("no such dish") == []
+
+
+def test_hashed_postings_map():
+    postings = main.HashedPostingsMap.from_dict({"dal": [0, 4], "roti": [2]})
+    assert postings.get("dal").tolist() == [0, 4]
+    assert postings.get("naan").tolist() == []
+    added = postings.with_additions({"naan": [7], "dal": [9]})
+    assert added.get("dal").tolist() == [0, 4, 9]
+    assert added.get("naan").tolist() == [7]
+    assert (len(postings), len(added)) == (2, 3)
+
+
+def test_contains_and_fuzzy_read_names_from_the_store(nutrition_dataset):
+    index = nutrition_dataset.index
+    rows = index.contains_rows("paneer tikka")
+    assert rows and all("paneer tikka" in index.name_lower(row) for row in rows)
+    best = index.best_fuzzy_rows(["gulab jamun"])[0]
+    assert index.fuzzy_text(best).startswith("gulab jamun sweets")
+
+
+def test_appended_rows_are_indexed(nutrition_dataset):
+    record = {"Dish Name": "  Test Ragi Dosa ", "Category": "Breakfast Items", "Calories (kcal)": 150,
+              "Protein (g)": 5}
+    updated, _ = main.apply_nutrition_changes(nutrition_dataset, [record], [])
+    rows = updated.index.exact_rows("test ragi dosa")
+    assert len(rows) == 1 and rows[0] >= nutrition_dataset.store.size
+    assert rows[0] in updated.index.contains_rows("ragi dosa")
+    assert nutrition_dataset.index.exact_rows("test ragi dosa") == []
+
+
+def test_snapshot_round_trip(nutrition_dataset, tmp_path):
+    path = str(tmp_path / "nutrition_data.snapshot")
+    main.write_nutrition_snapshot(path, nutrition_dataset, "checksum")
+    loaded = main.load_nutrition_snapshot(path, "checksum")
+    assert loaded is not None
+    for query in ["masala dosa", "roti", "paneer butter masala"]:
+        assert loaded.index.exact_rows(query) == nutrition_dataset.index.exact_rows(query)
+        assert loaded.index.contains_rows(query) == nutrition_dataset.index.contains_rows(query)
+    assert loaded.index.best_fuzzy_rows(["panner tika", "chole bhature"]) == \
+        nutrition_dataset.index.best_fuzzy_rows(["panner tika", "chole bhature"])
+    assert np.array_equal(loaded.index.name_lengths, nutrition_dataset.index.name_lengths)
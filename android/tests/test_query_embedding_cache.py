@@ -0,0 +1,119 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import main
+
+
+class RecordingEmbedder(main.LocalHashingEmbedder):
+    """LocalHashingEmbedder that records the requests it receives and takes a little while to answer."""
+    def __init__(self, delay: float = 0.02):
+        super().__init__()
+        self.delay = delay
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def _record(self, texts):
+        with self._lock:
+            self.requests.append(list(texts))
+        time.sleep(self.delay)
+
+    def embed_query(self, text):
+        self._record([text])
+        return super().embed_query(text)
+
+    def embed_documents(self, texts):
+        self._record(texts)
+        return [super(RecordingEmbedder, self).embed_query(text) for text in texts]
+
+
+def embed_concurrently(cache, texts):
+    results = [None] * len(texts)
+    barrier = threading.Barrier(len(texts))
+
+    def worker(i):
+        barrier.wait()
+        results[i] = cache.embed_query(texts[i])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(texts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def row_count(path):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+
+
+def test_memory_lru():
+    base = RecordingEmbedder(delay=0)
+    cache = main.CachedQueryEmbeddings(base, path=None, memory_entries=2)
+    cache.embed_query("dal")
+    cache.embed_query("roti")
+    assert cache.embed_query("  DAL ") == base.embed_query("dal")
+    cache.embed_query("poha")
+    requests = len(base.requests)
+    cache.embed_query("dal")
+    assert len(base.requests) == requests
+    cache.embed_query("roti")
+    assert len(base.requests) == requests + 1
+    assert cache.stats()["memory_hits"] == 2
+
+
+def test_disk_hit_across_instances(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    first = main.CachedQueryEmbeddings(RecordingEmbedder(delay=0), path=path)
+    vector = first.embed_query("masala dosa")
+
+    base = RecordingEmbedder(delay=0)
+    second = main.CachedQueryEmbeddings(base, path=path)
+    assert second.embed_query("masala dosa") == pytest.approx(vector, abs=1e-6)
+    assert base.requests == []
+    assert second.stats()["disk_hits"] == 1
+
+
+def test_identical_concurrent_misses_share_one_request():
+    base = RecordingEmbedder()
+    cache = main.CachedQueryEmbeddings(base, path=None)
+    results = embed_concurrently(cache, ["paneer tikka"] * 8)
+    assert base.requests == [["paneer tikka"]]
+    assert all(result == results[0] for result in results)
+    assert cache.stats()["coalesced"] == 7
+
+
+def test_distinct_concurrent_misses_are_batched():
+    base = RecordingEmbedder()
+    cache = main.CachedQueryEmbeddings(base, path=None)
+    texts = [f"dish {i}" for i in range(6)]
+    results = embed_concurrently(cache, texts)
+    assert sorted(text for request in base.requests for text in request) == sorted(texts)
+    assert len(base.requests) < len(texts)
+    assert results == [main.LocalHashingEmbedder().embed_query(text) for text in texts]
+
+
+def test_disk_table_is_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "EMBEDDING_CACHE_PRUNE_EVERY", 1)
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = main.CachedQueryEmbeddings(RecordingEmbedder(delay=0), path=path, max_entries=3)
+    for i in range(5):
+        cache.embed_query(f"dish {i}")
+    assert row_count(path) == 3
+
+    later = time.time() + cache.ttl_seconds + 1
+    monkeypatch.setattr(main.time, "time", lambda: later)
+    cache.embed_query("fresh dish")
+    assert row_count(path) == 1
+
+
+def test_tables_from_before_pruning_are_upgraded(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE query_embeddings (key TEXT PRIMARY KEY, created_at REAL NOT NULL, vector BLOB NOT NULL)")
+    cache = main.CachedQueryEmbeddings(RecordingEmbedder(delay=0), path=path)
+    cache.embed_query("idli")
+    assert row_count(path) == 1
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+import main
+
+
+class CountingEmbedder(main.LocalHashingEmbedder):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return super().embed_query(text)
+
+
+@pytest.fixture(autouse=True)
+def published_dataset(monkeypatch, nutrition_dataset):
+    monkeypatch.setattr(main, "nutrition_dataset", nutrition_dataset)
+
+
+@pytest.fixture
+def cache():
+    return main.SemanticAnswerCache(main.LocalHashingEmbedder(), threshold=0.9, ttl_seconds=60, max_entries=2)
+
+
+@pytest.fixture
+def chat_cache(monkeypatch):
+    embedder = CountingEmbedder()
+    cache = main.SemanticAnswerCache(embedder)
+    monkeypatch.setattr(main, "chat_answer_cache", cache)
+    return cache
+
+
+def test_paraphrase_hits(cache):
+    query = "give me a high protein vegetarian diet plan"
+    cache.store(query, main.chat_cache_params(query), "plan A", "generate_diet_plan")
+    paraphrase = "high protein veg meal plan please"
+    assert main.chat_cache_params(paraphrase) == main.chat_cache_params(query)
+    assert cache.lookup(paraphrase, main.chat_cache_params(paraphrase)) == "plan A"
+    assert cache.stats()["hits"] == 1
+
+
+def test_different_dish_misses(cache):
+    query = "similar dishes to masala dosa"
+    cache.store(query, main.chat_cache_params(query), "dosa answer", "find_similar_dishes")
+    other = "similar dishes to rava masala dosa"
+    assert main.chat_cache_params(other) != main.chat_cache_params(query)
+    assert cache.lookup(other, main.chat_cache_params(other)) is None
+    assert cache.lookup("recipe for masala dosa", main.chat_cache_params(query)) is None
+
+
+def test_expired_entries_miss(cache, monkeypatch):
+    params = main.chat_cache_params("calories in samosa")
+    cache.store("calories in samosa", params, "samosa answer", "lookup_nutrition_facts")
+    later = main.time.monotonic() + 61
+    monkeypatch.setattr(main.time, "monotonic", lambda: later)
+    assert cache.lookup("calories in samosa", params) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    queries = ["calories in samosa", "calories in jalebi", "calories in poha"]
+    cache.store(queries[0], main.chat_cache_params(queries[0]), "0", "lookup_nutrition_facts")
+    cache.store(queries[1], main.chat_cache_params(queries[1]), "1", "lookup_nutrition_facts")
+    assert cache.lookup(queries[0], main.chat_cache_params(queries[0])) == "0"
+    cache.store(queries[2], main.chat_cache_params(queries[2]), "2", "lookup_nutrition_facts")
+    assert cache.lookup(queries[1], main.chat_cache_params(queries[1])) is None
+    assert cache.lookup(queries[0], main.chat_cache_params(queries[0])) == "0"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_excluded_tools_are_skipped(cache):
+    query = "vegan weight loss diet plan"
+    cache.store(query, main.chat_cache_params(query), "plan", "generate_diet_plan")
+    assert cache.lookup(query, main.chat_cache_params(query), main.CHAT_FIRST_TURN_CACHEABLE_TOOLS) is None
+
+
+@pytest.mark.parametrize("query", ["reformat the previous plan", "make it vegetarian", "same plan again",
+                                   "what about this one"])
+def test_session_references_bypass(query):
+    assert main.chat_cache_params(query) is None
+
+
+@pytest.mark.parametrize("query", ["is this dosa healthy", "what is the best time to eat breakfast"])
+def test_queries_naming_a_dish_or_without_references_are_cacheable(query):
+    assert main.chat_cache_params(query) is not None
+
+
+def test_locally_routed_queries_skip_the_embedder(chat_cache):
+    answer = asyncio.run(main.run_chat_turn("hello", "test-session-router"))
+    assert answer.startswith("Namaste")
+    assert chat_cache.embedder.calls == 0
+
+
+def test_first_turn_diet_plan_is_served_only_to_fresh_sessions(chat_cache):
+    query = "vegetarian weight loss diet plan"
+    chat_cache.store(query, main.chat_cache_params(query), "cached plan", "generate_diet_plan")
+    assert asyncio.run(main.run_chat_turn(query, "test-session-fresh")) == "cached plan"
+
+    history = main.get_session_history("test-session-ongoing")
+    history.add_messages([HumanMessage(content="hi"), AIMessage(content="Namaste!")])
+    assert asyncio.run(main.run_chat_turn(query, "test-session-ongoing")) != "cached plan"
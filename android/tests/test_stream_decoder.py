@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import main
+
+
+def decode(payload: bytes, chunk_size: int):
+    decoder = main.NutritionStreamDecoder()
+    items = []
+    for start in range(0, len(payload), chunk_size):
+        items.extend(decoder.feed(payload[start:start + chunk_size]))
+    items.extend(decoder.close())
+    return items
+
+
+def records(items):
+    values = []
+    for _, value, error in items:
+        assert error is None
+        values.extend(value if isinstance(value, list) else [value])
+    return values
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 16])
+def test_top_level_array(chunk_size):
+    payload = b'[\n {"Dish Name": "A"},\n {"Dish Name": "B"}\n]\n'
+    items = decode(payload, chunk_size)
+    assert records(items) == [{"Dish Name": "A"}, {"Dish Name": "B"}]
+    assert [line for line, _, _ in items] == [2, 3]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 16])
+def test_ndjson_of_arrays(chunk_size):
+    payload = b'[{"Dish Name": "A"},{"Dish Name": "B"}]\n[{"Dish Name": "C"}]\n{"Dish Name": "D"}\n'
+    items = decode(payload, chunk_size)
+    assert [r["Dish Name"] for r in records(items)] == ["A", "B", "C", "D"]
+    assert [line for line, _, _ in items] == [1, 1, 2, 3]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 1 << 16])
+def test_data_after_array_on_the_same_line_is_rejected(chunk_size):
+    items = decode(b'[{"Dish Name": "A"}] {"Dish Name": "B"} x\n', chunk_size)
+    assert items[0] == (1, {"Dish Name": "A"}, None)
+    assert items[1][0] == 1 and items[1][2].startswith("invalid JSON")
+
+
+def test_unclosed_array_is_reported():
+    items = decode(b'[{"Dish Name": "A"},', 1 << 16)
+    assert items[-1][2] == "unexpected end of input: the JSON array is not closed"
+
+
+def test_ingest_file_of_array_lines(tmp_path):
+    path = tmp_path / "upload.ndjson"
+    path.write_text("\n".join(json.dumps([{"Dish Name": f"Dish {i}"}] * 2) for i in range(3)) + "\n")
+    ingest = main.ingest_nutrition_file(str(path), validate=False, chunk_size=7)
+    assert ingest.report()["accepted"] == 6
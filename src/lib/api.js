@@ -39,6 +39,48 @@ export const sendMessageToBackend = async (message) => {
     }
 };
 
+// Streams a chat answer from /chat/stream (server-sent events).
+// onEvent(event, data) receives "tool", "context" and "token" ({ text }) events as they arrive.
+// Resolves with the complete answer from the final "done" event.
+export const streamMessageToBackend = async (message, onEvent) => {
+    const sessionId = getSessionId();
+    try {
+        const response = await fetch(`${BACKEND_URL}/chat/stream`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ query: message, session_id: sessionId }),
+        });
+        if (!response.ok || !response.body) {
+            throw new Error(`Server error: ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                const event = block.match(/^event: (.*)$/m)?.[1];
+                const data = JSON.parse(block.match(/^data: (.*)$/m)?.[1] || '{}');
+                if (event === 'done') {
+                    return data.answer;
+                }
+                if (event && onEvent) onEvent(event, data);
+            }
+        }
+        throw new Error("Stream ended before the answer was complete");
+    } catch (error) {
+        console.error("Stream Error:", error);
+        throw error;
+    }
+};
+
 export const getChatHistory = async () => {
     const sessionId = getSessionId();
     try {
@@ -52,11 +94,83 @@ export const getChatHistory = async () => {
     }
 };
 
-// Load nutrition data from local JSON file
+const NUTRITION_SYNC_KEY = 'aahar_nutrition_sync';
+const NUTRITION_SYNC_TIMEOUT_MS = 5000;
+
+// Keep a local copy of the nutrition database up to date via /nutrition/sync:
+// only records changed since the stored version are downloaded. Returns the records,
+// or null if the backend is unreachable and nothing is stored yet.
+export const syncNutritionData = async () => {
+    let stored = null;
+    try {
+        stored = JSON.parse(localStorage.getItem(NUTRITION_SYNC_KEY));
+    } catch (error) {
+        stored = null;
+    }
+    const toRecords = (columns, rows) => rows.map(row => Object.fromEntries(columns.map((col, i) => [col, row[i]])));
+
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), NUTRITION_SYNC_TIMEOUT_MS);
+    try {
+        const since = stored?.version ? `?since=${encodeURIComponent(stored.version)}` : '';
+        const response = await fetch(`${BACKEND_URL}/nutrition/sync${since}`, { signal: controller.signal });
+        if (!response.ok) throw new Error(`Server error: ${response.status}`);
+        const sync = await response.json();
+
+        let records = sync.full || !stored ? [] : stored.records;
+        if (!sync.full && (sync.upserts.length || sync.deletes.length)) {
+            const upserts = toRecords(sync.columns, sync.upserts);
+            // Same key as the backend's nutrition_dish_key: trimmed and lowercased
+            const dishKey = item => item["Dish Name"]?.trim().toLowerCase();
+            const changed = new Set([...sync.deletes, ...upserts.map(dishKey)]);
+            records = records.filter(item => !changed.has(dishKey(item))).concat(upserts);
+        } else if (sync.full) {
+            records = toRecords(sync.columns, sync.upserts);
+        }
+
+        try {
+            localStorage.setItem(NUTRITION_SYNC_KEY, JSON.stringify({ version: sync.version, records }));
+        } catch (error) {
+            // Storage full or unavailable: keep the synced copy for this page load only
+        }
+        return records;
+    } catch (error) {
+        console.error("Nutrition Sync Error:", error);
+        return stored?.records || null;
+    } finally {
+        clearTimeout(timer);
+    }
+};
+
+let nutritionSyncPromise = null;
+
+// Sync once per page load in the background; searches pick up the fresh copy when it lands
+const refreshNutritionData = () => {
+    if (typeof window === 'undefined' || nutritionSyncPromise) return;
+    nutritionSyncPromise = syncNutritionData().then(records => {
+        if (records && records.length > 0) {
+            nutritionDataCache = records;
+        }
+    });
+};
+
+// Load nutrition data: the stored synced copy, else the bundled JSON file, served right away
+// while the backend (which may be asleep) is synced in the background
 const loadNutritionData = async () => {
     if (nutritionDataCache) {
         return nutritionDataCache;
     }
+    refreshNutritionData();
+
+    try {
+        const stored = typeof window === 'undefined' ? null : JSON.parse(localStorage.getItem(NUTRITION_SYNC_KEY));
+        if (stored?.records?.length > 0) {
+            nutritionDataCache = stored.records;
+            return nutritionDataCache;
+        }
+    } catch (error) {
+        // Unreadable stored copy: fall back to the bundled file
+    }
 
     try {
         const response = await fetch('/nutrition_data.json');
@@ -64,7 +178,9 @@ const loadNutritionData = async () => {
             console.error('Failed to load nutrition data');
             return [];
         }
-        nutritionDataCache = await response.json();
+        const bundled = await response.json();
+        // The background sync may have landed while the bundled file was loading
+        nutritionDataCache = nutritionDataCache || bundled;
         return nutritionDataCache;
     } catch (error) {
         console.error('Error loading nutrition data:', error);
@@ -103,6 +219,41 @@ export const searchFood = async (query) => {
     }
 };
 
+// meals: [{ date: 'YYYY-MM-DD', meal: 'breakfast', dish_names: [...] }, ...]
+// Returns per-meal, per-day and per-week nutrition totals in one request (no AI analysis)
+export const rollupMealLog = async (meals) => {
+    try {
+        const response = await fetch(`${BACKEND_URL}/meal-log/rollup`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ meals })
+        });
+        if (!response.ok) throw new Error("Meal log rollup failed");
+        return await response.json();
+    } catch (error) {
+        console.error("Rollup Error:", error);
+        throw error;
+    }
+};
+
+// query: { filters: [{ field: 'calories', max: 200 }, { field: 'protein', min: 10 }],
+//          category, region, dietary_type, sort_by, descending, limit }
+// Returns { results, count, has_more, sort_by, descending } straight from the database (no AI)
+export const queryNutrition = async (query) => {
+    try {
+        const response = await fetch(`${BACKEND_URL}/nutrition/query`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(query)
+        });
+        if (!response.ok) throw new Error("Nutrition query failed");
+        return await response.json();
+    } catch (error) {
+        console.error("Nutrition Query Error:", error);
+        throw error;
+    }
+};
+
 export const analyzeMeal = async (dishNames) => {
     try {
         const response = await fetch(`${BACKEND_URL}/analyze-meal`, {